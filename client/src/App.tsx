@@ -13,8 +13,17 @@ interface Ticket {
   [key: string]: any;
 }
 
-interface ProjectIdeaResponse {
-  results: Ticket[];
+interface JobSubmission {
+  job_id: string;
+  status: string;
+  status_url: string;
+  events_url: string;
+}
+
+interface GeneratedTicket {
+  titulo: string;
+  descripcion: string;
+  label: string;
 }
 
 // Simple styling for the chat interface
@@ -150,40 +159,81 @@ export default function App() {
     };
     setMessages((msgs) => [...msgs, placeholderMsg]);
 
+    // Replace the last agent message (the in-progress one) with new text
+    const updateProgressMsg = (text: string) => {
+      setMessages((msgs) => [
+        ...msgs.slice(0, -1),
+        { sender: "agent", text },
+      ]);
+    };
+
     try {
       const resp = await fetch(`${API_BASE}/api/project/idea`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
         },
-        body: JSON.stringify({ idea: trimmed }),
+        body: JSON.stringify({ idea: trimmed, background: true }),
       });
 
       if (!resp.ok) {
         const errorText = await resp.text();
         throw new Error(errorText || resp.statusText);
       }
-      const data: ProjectIdeaResponse = await resp.json();
-      if (!Array.isArray(data.results)) {
+      const job: JobSubmission = await resp.json();
+      if (!job.events_url) {
         throw new Error("Respuesta inválida del servidor");
       }
 
-      // Format the tickets as agent message
-      const formatted = data.results
-        .map((item) => {
-          const lt = item.local_ticket || {};
-          return `• ${lt.titulo} (label: ${lt.label}) – ${lt.descripcion}`;
-        })
-        .join("\n");
+      // Render each ticket as soon as the server reports its result
+      let lines: string[] = [];
+      const events = new EventSource(`${API_BASE}${job.events_url}`);
 
-      setMessages((msgs) => [
-        // Remove the last placeholder agent message before appending result
-        ...msgs.slice(0, -1),
-        {
-          sender: "agent",
-          text: formatted || "No se generaron tickets.",
-        },
-      ]);
+      const pendingLine = (t: GeneratedTicket) =>
+        `⏳ ${t.titulo} (label: ${t.label}) – ${t.descripcion}`;
+
+      // Sent per ticket when the server streams ticket generation
+      events.addEventListener("ticket_generated", (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        lines[data.index] = lines[data.index] || pendingLine(data.ticket);
+        updateProgressMsg(lines.join("\n"));
+      });
+
+      events.addEventListener("tickets_generated", (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        (data.tickets as GeneratedTicket[]).forEach((t, i) => {
+          lines[i] = lines[i] || pendingLine(t);
+        });
+        updateProgressMsg(lines.join("\n") || "No se generaron tickets.");
+      });
+
+      events.addEventListener("ticket_result", (e) => {
+        const data = JSON.parse((e as MessageEvent).data);
+        const item: Ticket = data.result;
+        const lt = item.local_ticket || {};
+        const status = item.agent_output?.status === "error" ? "❌" : "•";
+        lines[data.index] = `${status} ${lt.titulo} (label: ${lt.label}) – ${lt.descripcion}`;
+        updateProgressMsg(lines.join("\n"));
+      });
+
+      events.addEventListener("done", (e) => {
+        events.close();
+        const data = JSON.parse((e as MessageEvent).data);
+        if (data.status === "failed") {
+          updateProgressMsg(
+            "Sorry, an error occurred: " + (data.error || "job failed")
+          );
+        } else if (lines.length === 0) {
+          updateProgressMsg("No se generaron tickets.");
+        }
+      });
+
+      events.onerror = () => {
+        // EventSource reconnects on its own; only give up once it is closed
+        if (events.readyState === EventSource.CLOSED) {
+          updateProgressMsg("Sorry, the connection to the server was lost.");
+        }
+      };
     } catch (err: any) {
       setMessages((msgs) => [
         // Remove the last placeholder agent message before appending error
@@ -1,9 +1,17 @@
 import json
 from abc import ABC, abstractmethod
 
-from ..utils.langchain_helpers import get_llm
-from ..utils.linear_api import LinearAPI
-from ..utils.github_api import GitHubAPI
+from ..utils.langchain_helpers import run_chain, predict
+from ..utils.clients import get_github_api, get_linear_api, get_shared_llm
+from ..utils.llm_router import TASK_CLARIFY, TASK_CLASSIFY, TASK_CODEGEN
+from ..utils import clarity_checker
+from ..utils.metrics import span, timed
+from ..utils.llm_usage import usage_scope
+from ..utils.prompt_budget import fit_to_budget
+from ..utils.structured_output import CODE_GENERATION_SCHEMA, parse_boolean, parse_or_repair
+from ..utils import idempotency
+from ..utils import repo_index
+from ..utils import work_queue
 from langchain.prompts import ChatPromptTemplate
 from langchain.chains import LLMChain
 
@@ -19,45 +27,135 @@ Ticket Description:
 ---
 """
 
+SUFFICIENT_COMMENT = "This ticket is clear and ready for development. I will start working on it."
+FAILURE_COMMENT = "I tried to work on this ticket but encountered an error and could not create a pull request. Please review the details.\n\nError: {error}"
+
+# Idempotency store scope of finished agent runs
+PROCESS_TICKET_SCOPE = "agent.process_ticket"
+# Outcomes that are final for a given ticket content; errors are retried
+FINAL_STATUSES = ("pr_created", "commented")
+
 class BaseAgent(ABC):
+    # Source files ranked first in the repository context, see _repo_context
+    source_extensions: tuple[str, ...] = ()
+
     def __init__(self, agent_type: str):
         self.agent_type = agent_type
-        self.linear_api = LinearAPI()
-        self.github_api = GitHubAPI()
-        self.llm = get_llm()
+        # Clients are process-wide and built on first use, see utils/clients.py
+        self.linear_api = get_linear_api()
+        # Models are routed per task, see utils/llm_router.py
+        self.llm = get_shared_llm(TASK_CODEGEN)
 
         # LLM Chain for analyzing ticket sufficiency
         self.analysis_chain = LLMChain(
-            llm=self.llm,
+            llm=get_shared_llm(TASK_CLASSIFY),
             prompt=ChatPromptTemplate.from_template(ANALYZE_TICKET_PROMPT)
         )
 
+    @timed("sufficiency_analysis")
     def _analyze_ticket_sufficiency(self, ticket: dict) -> dict:
         """
         Uses an LLM to analyze the ticket description.
-        Returns a dictionary with 'sufficient' (bool) and 'comment' (str).
+        Returns a dictionary with 'sufficient' (bool) and 'comment' (str). When the
+        analysis itself fails, 'error' is True and there is no comment to post.
         """
         print(f"[{self.agent_type}] Analyzing ticket: {ticket.get('identifier')}")
         description = ticket.get("description", "")
         
         try:
-            analysis_result = self.analysis_chain.run(description=description).strip().lower()
-            print(f"[{self.agent_type}] Analysis result: {analysis_result}")
+            with usage_scope(self.agent_type, "sufficiency_analysis"):
+                description = fit_to_budget(description)
+                analysis_result = run_chain(self.analysis_chain, description=description)
+            print(f"[{self.agent_type}] Analysis result: {analysis_result.strip()}")
 
-            is_sufficient = analysis_result == "true"
+            # Anything but a clear "true" asks for clarification
+            is_sufficient = parse_boolean(analysis_result) is True
             
             if is_sufficient:
-                return {"sufficient": True, "comment": "This ticket is clear and ready for development. I will start working on it."}
+                return {"sufficient": True, "comment": SUFFICIENT_COMMENT}
             else:
                 # If not sufficient, generate a clarifying question
                 question_prompt = f"The following ticket is not clear enough to start working on it. Please formulate a concise question to the user asking for the specific information that is missing. Ticket description: {description}"
-                clarifying_question = self.llm.predict(question_prompt)
+                with usage_scope(self.agent_type, "clarifying_question"):
+                    clarifying_question = predict(get_shared_llm(TASK_CLARIFY), question_prompt)
                 return {"sufficient": False, "comment": clarifying_question}
 
         except Exception as e:
             print(f"[{self.agent_type}] Error analyzing ticket {ticket.get('identifier')}: {e}")
-            # Fallback comment if analysis fails
-            return {"sufficient": False, "comment": "I encountered an error while analyzing this ticket. Could you please check if the description is clear and formatted correctly?"}
+            # Marked so the run is retried rather than stored as final; there is nothing to tell the ticket
+            return {"sufficient": False, "comment": "", "error": True}
+
+    @property
+    def github_api(self):
+        # Resolved on access so agents that only comment never need GitHub credentials
+        return get_github_api()
+
+    def _repo_context(self, ticket: dict) -> str:
+        """
+        What the target repo already holds that relates to the ticket, within
+        REPO_CONTEXT_TOKEN_BUDGET tokens (see utils/repo_index.py). Returns a
+        placeholder when the index is off or unreachable, so code generation
+        never depends on it.
+        """
+        if not repo_index.repo_index_enabled():
+            return "(not available)"
+        try:
+            with span("repo_context"):
+                context = repo_index.get_repo_index().context(
+                    self.github_api, f"{ticket.get('title', '')}\n{ticket.get('description', '')}",
+                    extensions=self.source_extensions,
+                )
+        except Exception as e:
+            print(f"[{self.agent_type}] Repository index unavailable for {ticket.get('identifier')}: {e}")
+            return "(not available)"
+        return context or "(not available)"
+
+    def _files_from_generation(self, generation_str: str, on_failure=None) -> dict:
+        """
+        Returns {file_path: file_content} from a code-gen reply, which is either
+        {"files": [{"file_path": ..., "file_content": ...}, ...]} or a single
+        top-level "file_path"/"file_content" pair. A malformed reply is repaired
+        (see utils/structured_output.py); raises ValueError if that fails, after
+        calling `on_failure` (e.g. to drop the reply from the response cache).
+        """
+        try:
+            generation = parse_or_repair(generation_str, CODE_GENERATION_SCHEMA, self.llm, on_failure=on_failure)
+        except ValueError as e:
+            raise ValueError(f"LLM failed to provide a valid file_path or file_content: {e}") from e
+        return {entry["file_path"]: entry["file_content"] for entry in generation["files"]}
+
+    def _open_pull_request(self, ticket: dict, files: dict) -> dict:
+        """
+        Opens one PR with all generated files and links it from the Linear ticket.
+        Raises if the PR could not be created.
+        """
+        print(f"[{self.agent_type}] Generated code for files: {', '.join(files)}")
+
+        # Create the Pull Request
+        pr_result = self.github_api.create_pr_files(
+            ticket_id=ticket.get("identifier"),
+            ticket_title=ticket.get("title"),
+            files=files
+        )
+
+        # If PR creation is successful, post a comment on the Linear ticket
+        if pr_result.get("success"):
+            comment_body = f"I've opened a pull request to address this ticket: {pr_result.get('pr_url')}"
+            self.linear_api.add_comment(ticket['id'], comment_body)
+            return {"status": "pr_created", "ticket": ticket.get('identifier'), "pr_url": pr_result.get('pr_url')}
+        else:
+            raise Exception(f"Failed to create PR: {pr_result.get('error')}")
+
+    def _report_failure(self, ticket: dict, error: Exception) -> dict:
+        """
+        Returns the error result of a failed code generation or PR. The ticket is
+        only told about it on the last attempt, so a queued event that is retried
+        does not leave one comment per delivery.
+        """
+        print(f"[{self.agent_type}] An error occurred during code generation or PR creation for {ticket.get('identifier')}: {error}")
+        if work_queue.last_attempt():
+            self.linear_api.add_comment(ticket['id'], FAILURE_COMMENT.format(error=error))
+        return {"status": "error", "ticket": ticket.get('identifier'), "error": str(error)}
 
     @abstractmethod
     def _generate_code_and_create_pr(self, ticket: dict):
@@ -67,13 +165,41 @@ class BaseAgent(ABC):
         """
         pass
 
-    def process_ticket(self, ticket: dict):
+    def process_ticket(self, ticket: dict, analysis: dict = None):
         """
         Main entry point to process a single ticket. It analyzes the ticket,
         and either posts a comment asking for clarification or proceeds
         to generate code and create a pull request.
+        An `analysis` computed up front (see batch_analysis.py) skips the per-ticket LLM analysis.
+        Otherwise the rule-based clarity checker runs first, and only tickets it
+        lets through reach the LLM.
+
+        A ticket is worked on once per content: processing the same ticket again
+        (a retried job, a redelivered webhook) returns the stored result until
+        its title or description changes.
         """
-        analysis = self._analyze_ticket_sufficiency(ticket)
+        if not (idempotency.idempotency_enabled() and ticket.get("id")):
+            return self._process_ticket(ticket, analysis)
+        key = idempotency.idempotency_key(self.agent_type, ticket["id"], ticket.get("title"), ticket.get("description"))
+        return idempotency.get_idempotency_store().run(
+            PROCESS_TICKET_SCOPE,
+            key,
+            lambda: self._process_ticket(ticket, analysis),
+            should_store=lambda result: isinstance(result, dict) and result.get("status") in FINAL_STATUSES,
+        )
+
+    def _process_ticket(self, ticket: dict, analysis: dict = None):
+        if analysis is None:
+            analysis = clarity_checker.prefilter(ticket)
+            if analysis is not None:
+                print(f"[{self.agent_type}] Ticket {ticket.get('identifier')} failed the clarity pre-filter, skipping LLM analysis")
+        if analysis is None:
+            analysis = self._analyze_ticket_sufficiency(ticket)
+
+        if analysis.get("error"):
+            # The ticket was never really analyzed: not final and nothing to tell the ticket, a retry analyzes it again
+            print(f"[{self.agent_type}] Analysis of {ticket.get('identifier')} failed, leaving it for a retry")
+            return {"status": "error", "ticket": ticket.get('identifier'), "error": "sufficiency analysis failed"}
 
         if not analysis.get("sufficient"):
             comment = analysis.get("comment", "This ticket requires more information.")
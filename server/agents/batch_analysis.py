@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import os
+
+from ..utils.clients import get_shared_llm
+from ..utils.llm_router import TASK_CLASSIFY
+from ..utils.llm_usage import estimate_tokens, usage_scope
+from ..utils.prompt_budget import fit_to_budget
+from ..utils.structured_output import VERDICTS_SCHEMA, generate_structured
+from .base_agent import SUFFICIENT_COMMENT
+
+BATCH_ANALYZE_TICKETS_PROMPT = """
+Analyze each of the following software tickets to determine if it's ready for development.
+A ticket is sufficient if it has a clear goal, specific requirements, and no obvious ambiguities.
+For every ticket that is not sufficient, write a concise question to the user asking for the specific information that is missing.
+
+Respond with only a JSON array containing one object per ticket, with these keys:
+1. "index": the ticket index shown below.
+2. "sufficient": true or false.
+3. "question": the clarifying question, or an empty string if the ticket is sufficient.
+
+Tickets:
+{tickets}
+"""
+
+# Max estimated prompt tokens sent in one batch analysis call
+DEFAULT_TOKEN_BUDGET = int(os.environ.get("SUFFICIENCY_BATCH_TOKEN_BUDGET", "6000"))
+
+
+def _render_ticket(index: int, ticket: dict) -> str:
+    return f"### Ticket {index}\nTitle: {ticket.get('title', '')}\nDescription:\n{ticket.get('description', '')}\n"
+
+
+def chunk_by_token_budget(tickets: list[dict], token_budget: int) -> list[list[tuple[int, dict]]]:
+    """
+    Splits tickets into chunks of (index, ticket) whose rendered prompt stays within `token_budget`.
+    A ticket that is larger than the budget on its own gets a chunk to itself.
+    """
+    overhead = estimate_tokens(BATCH_ANALYZE_TICKETS_PROMPT)
+    chunks = []
+    current = []
+    used = overhead
+    for index, ticket in enumerate(tickets):
+        cost = estimate_tokens(_render_ticket(index, ticket))
+        if current and used + cost > token_budget:
+            chunks.append(current)
+            current = []
+            used = overhead
+        current.append((index, ticket))
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def analyze_tickets_batch(tickets: list[dict], llm=None, token_budget: int = None, use_cache=True) -> list[dict | None]:
+    """
+    Analyzes many tickets with one structured LLM call per token-budget chunk.
+    Returns, in input order, {"sufficient": bool, "comment": str} per ticket,
+    the same shape as BaseAgent._analyze_ticket_sufficiency. Entries the model
+    did not answer (or chunks that failed) are None so the agent can fall back
+    to its own per-ticket analysis.
+    """
+    llm = llm or get_shared_llm(TASK_CLASSIFY)
+    results: list[dict | None] = [None] * len(tickets)
+    with usage_scope("OrchestratorAgent", "sufficiency_analysis.batch"):
+        # Budgeted once up front, chunking and rendering both measure the descriptions
+        tickets = [{**ticket, "description": fit_to_budget(ticket.get("description", ""))} for ticket in tickets]
+    for chunk in chunk_by_token_budget(tickets, token_budget or DEFAULT_TOKEN_BUDGET):
+        rendered = "\n".join(_render_ticket(index, ticket) for index, ticket in chunk)
+        prompt = BATCH_ANALYZE_TICKETS_PROMPT.strip().format(tickets=rendered)
+        print(f"[BatchAnalysis] Analyzing {len(chunk)} tickets in one call")
+        try:
+            with usage_scope("OrchestratorAgent", "sufficiency_analysis.batch"):
+                replies = generate_structured(llm, prompt, VERDICTS_SCHEMA, use_cache=use_cache)
+            verdicts = {verdict["index"]: verdict for verdict in replies}
+        except Exception as e:
+            print(f"[BatchAnalysis] Batch analysis failed, agents will analyze these tickets one by one: {e}")
+            continue
+        for index, _ in chunk:
+            verdict = verdicts.get(index)
+            if verdict is None:
+                continue
+            if verdict["sufficient"]:
+                results[index] = {"sufficient": True, "comment": SUFFICIENT_COMMENT}
+            elif (verdict.get("question") or "").strip():
+                results[index] = {"sufficient": False, "comment": verdict["question"].strip()}
+    return results
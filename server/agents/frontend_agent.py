@@ -1,14 +1,24 @@
-import json
 from .base_agent import BaseAgent
+from ..utils.langchain_helpers import forget_chain, run_chain
+from ..utils.metrics import span
+from ..utils.llm_usage import usage_scope
+from ..utils.prompt_budget import fit_to_budget
 from langchain.prompts import ChatPromptTemplate
 from langchain.chains import LLMChain
 
 FRONTEND_CODE_GEN_PROMPT = """
 You are a senior frontend developer specializing in React and TypeScript.
-Based on the following ticket, generate a single file's content to solve the task.
-The output must be a JSON object with two keys:
+Based on the following ticket, generate the content of the files needed to solve the task.
+The output must be a JSON object with a single key "files": a list of objects, each with two keys:
 1. "file_path": A string with the full proposed file path (e.g., "src/components/LoginButton.tsx").
 2. "file_content": A string containing the complete, well-formatted code for the file.
+Keep the change focused: only include the files the ticket actually requires.
+Follow the existing layout below and change existing files instead of adding duplicates.
+
+Existing repository (related paths and key file summaries):
+---
+{repo_context}
+---
 
 Ticket Description:
 ---
@@ -17,6 +27,8 @@ Ticket Description:
 """
 
 class FrontendAgent(BaseAgent):
+    source_extensions = (".ts", ".tsx", ".js", ".jsx", ".css", ".scss", ".html")
+
     def __init__(self):
         super().__init__(agent_type="FrontendAgent")
 
@@ -32,35 +44,12 @@ class FrontendAgent(BaseAgent):
 
         try:
             # Generate code and file path
-            generation_str = self.code_gen_chain.run(description=description)
-            generation = json.loads(generation_str)
-            file_path = generation.get("file_path")
-            file_content = generation.get("file_content")
-
-            if not file_path or not file_content:
-                raise ValueError("LLM failed to provide a valid file_path or file_content.")
-
-            print(f"[{self.agent_type}] Generated code for file: {file_path}")
-
-            # Create the Pull Request
-            pr_result = self.github_api.create_pr(
-                ticket_id=ticket.get("identifier"),
-                ticket_title=ticket.get("title"),
-                file_path=file_path,
-                file_content=file_content
-            )
-
-            # If PR creation is successful, post a comment on the Linear ticket
-            if pr_result.get("success"):
-                comment_body = f"I've opened a pull request to address this ticket: {pr_result.get('pr_url')}"
-                self.linear_api.add_comment(ticket['id'], comment_body)
-                return {"status": "pr_created", "ticket": ticket.get('identifier'), "pr_url": pr_result.get('pr_url')}
-            else:
-                raise Exception(f"Failed to create PR: {pr_result.get('error')}")
+            with span("code_generation"), usage_scope(self.agent_type, "code_generation"):
+                inputs = {"description": fit_to_budget(description), "repo_context": self._repo_context(ticket)}
+                generation_str = run_chain(self.code_gen_chain, **inputs)
+                # An unusable reply is not served again to the retry
+                files = self._files_from_generation(generation_str, on_failure=lambda: forget_chain(self.code_gen_chain, **inputs))
+            return self._open_pull_request(ticket, files)
 
         except Exception as e:
-            error_message = f"An error occurred during code generation or PR creation for {ticket.get('identifier')}: {e}"
-            print(f"[{self.agent_type}] {error_message}")
-            # Post a comment on Linear that something went wrong
-            self.linear_api.add_comment(ticket['id'], f"I tried to work on this ticket but encountered an error and could not create a pull request. Please review the details.\n\nError: {e}")
-            return {"status": "error", "ticket": ticket.get('identifier'), "error": str(e)}
\ No newline at end of file
+            return self._report_failure(ticket, e)
\ No newline at end of file
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import os
+
+from ..utils.clients import get_linear_api
+from .registry import get_agent
+
+# Linear webhook events that hand issues to the agents. /webhooks/linear only
+# verifies and enqueues them; the work queue's workers call handle_issue_event.
+
+ISSUE_EVENT_KIND = "linear.issue"
+# Issue fields whose change makes an updated issue worth another look
+RELEVANT_UPDATE_FIELDS = ("description", "labelIds", "title")
+# Actors (e.g. the integration's own user) whose events are ignored, so the agents don't react to their own changes
+IGNORED_ACTOR_IDS = {actor.strip() for actor in os.environ.get("LINEAR_WEBHOOK_IGNORED_ACTORS", "").split(",") if actor.strip()}
+# Ignores events caused by the API key's own user, such as the issues /api/project/idea creates
+# (they are handed to the agents directly). With a personal API key this includes that person's own edits.
+IGNORE_OWN_EVENTS = os.environ.get("LINEAR_WEBHOOK_IGNORE_OWN_EVENTS", "true").lower() == "true"
+
+
+def ignore_reason(payload: dict) -> str | None:
+    """
+    Returns why a webhook payload needs no work, or None if it should be enqueued.
+    """
+    if payload.get("type") != "Issue":
+        return f"unhandled type {payload.get('type')}"
+    action = payload.get("action")
+    if action not in ("create", "update"):
+        return f"unhandled action {action}"
+    if not (payload.get("data") or {}).get("id"):
+        return "no issue id"
+    if (payload.get("actor") or {}).get("id") in IGNORED_ACTOR_IDS:
+        return "ignored actor"
+    if action == "update" and not set(payload.get("updatedFrom") or {}) & set(RELEVANT_UPDATE_FIELDS):
+        return "no relevant field changed"
+    return None
+
+
+def _label_names(issue: dict) -> list[str]:
+    # The API returns {"nodes": [...]}, webhook payloads a plain list
+    labels = issue.get("labels") or []
+    if isinstance(labels, dict):
+        labels = labels.get("nodes") or []
+    return [label.get("name", "") for label in labels if isinstance(label, dict)]
+
+
+def _is_own_event(payload: dict) -> bool:
+    actor_id = (payload.get("actor") or {}).get("id")
+    if not (IGNORE_OWN_EVENTS and actor_id):
+        return False
+    viewer = get_linear_api().get_viewer()
+    return bool(viewer) and viewer.get("id") == actor_id
+
+
+def handle_issue_event(payload: dict) -> dict:
+    """
+    Re-fetches the issue (the event may have waited in the queue) and hands it to
+    the agent for its label. Raises when Linear can't be reached or the agent run
+    fails, so the queue retries the event and dead-letters it after the last attempt.
+    """
+    issue_id = payload["data"]["id"]
+    if _is_own_event(payload):
+        print(f"[LinearEvents] {payload.get('action')} of {issue_id} was made by this integration, skipping")
+        return {"status": "ignored", "ticket": issue_id, "reason": "own change"}
+    issue = get_linear_api().get_ticket(issue_id)
+    if issue is None:
+        raise RuntimeError(f"Could not fetch Linear issue {issue_id}")
+    for name in _label_names(issue):
+        agent = get_agent(name)
+        if agent:
+            print(f"[LinearEvents] {payload.get('action')} of {issue.get('identifier')} goes to {agent.agent_type}")
+            result = agent.process_ticket(issue)
+            if isinstance(result, dict) and result.get("status") == "error":
+                raise RuntimeError(f"{agent.agent_type} failed on {issue.get('identifier')}: {result.get('error')}")
+            return result
+    print(f"[LinearEvents] No agent handles the labels of {issue.get('identifier')}, skipping")
+    return {"status": "ignored", "ticket": issue.get("identifier"), "reason": "no agent label"}
@@ -1,60 +1,95 @@
+from __future__ import annotations
+
 from ..utils.prompts import ORCHESTRATOR_AGENT_PROMPT, IDEA_TO_TICKETS_PROMPT
-from ..utils.langchain_helpers import get_llm
-import json
+from ..utils.langchain_helpers import forget, stream as stream_llm
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from ..utils.linear_api import LinearAPI
-from .frontend_agent import FrontendAgent
-from .backend_agent import BackendAgent
+from ..utils.linear_queries import PROFILE_MINIMAL
+from ..utils.clients import get_linear_api, get_shared_llm
+from ..utils.llm_router import TASK_PLAN
+from ..utils.json_stream import JSONArrayStreamParser
+from ..utils import clarity_checker
+from ..utils.metrics import bind, get_correlation_id, span, timed
+from ..utils import idempotency
+from ..utils.llm_usage import usage_scope
+from ..utils.structured_output import TICKET_SCHEMA, TICKETS_SCHEMA, StructuredOutputError, generate_structured
+from .registry import AGENT_CLASSES, get_agent
+from .batch_analysis import analyze_tickets_batch
+
+# Max number of tickets handed to the agents at the same time in process_project
+DEFAULT_MAX_WORKERS = int(os.environ.get("ORCHESTRATOR_MAX_WORKERS", "4"))
+# Upper bound on the max_workers a caller can ask for
+MAX_WORKERS_LIMIT = int(os.environ.get("ORCHESTRATOR_MAX_WORKERS_LIMIT", "16"))
+# Whether process_project streams ticket generation by default
+DEFAULT_STREAM_TICKETS = os.environ.get("ORCHESTRATOR_STREAM_TICKETS", "false").lower() == "true"
+# Streamed tickets analyzed together in one batched sufficiency call (stream=True)
+STREAM_ANALYSIS_BATCH = int(os.environ.get("ORCHESTRATOR_STREAM_ANALYSIS_BATCH", "4"))
+# Ideas generated / worked on at the same time in process_projects
+DEFAULT_PIPELINE_DEPTH = int(os.environ.get("ORCHESTRATOR_PIPELINE_DEPTH", "2"))
+# Upper bound on the pipeline_depth a caller can ask for
+MAX_PIPELINE_DEPTH = int(os.environ.get("ORCHESTRATOR_MAX_PIPELINE_DEPTH", "8"))
+# Ideas accepted by one process_projects call
+MAX_IDEAS = int(os.environ.get("ORCHESTRATOR_MAX_IDEAS", "50"))
+
+def _bounded(value: int | None, default: int, limit: int) -> int:
+    return max(1, min(value or default, limit))
 
 class OrchestratorAgent:
     prompt = ORCHESTRATOR_AGENT_PROMPT
 
     def __init__(self):
-        pass
-
-    def _extract_json(self, text):
-        """Extract the first JSON object/array from the text."""
-        import re
-        # Allow both array and object
-        match = re.search(r'(\[.*?\]|\{.*?\})', text, re.DOTALL)
-        if match:
-            json_str = match.group(1)
-            return json_str
-        return None
-
-    def try_json_loads(self, text, max_attempts=2):
-        """Try to extract and parse JSON, fallback to extract_json if fails."""
-        for i in range(max_attempts):
+        self.last_batch_stats = None
+
+    def generate_tickets_from_idea(self, idea: str, use_cache=True):
+        """
+        Returns the tickets for `idea`. A reply that doesn't match the tickets schema
+        is repaired locally or by a short repair call, not regenerated, see utils/structured_output.py.
+        """
+        llm = get_shared_llm(TASK_PLAN)
+        prompt = IDEA_TO_TICKETS_PROMPT.strip() + f"\n\nIDEA:\n{idea.strip()}"
+        with span("ticket_generation"), usage_scope("OrchestratorAgent", "ticket_generation"):
             try:
-                return json.loads(text)
-            except Exception:
-                extracted = self._extract_json(text)
-                if extracted:
-                    try:
-                        return json.loads(extracted)
-                    except Exception:
-                        pass
-        return None
-
-    def generate_tickets_from_idea(self, idea: str, max_attempts=3):
-        llm = get_llm()
+                return generate_structured(llm, prompt, TICKETS_SCHEMA, use_cache=use_cache)
+            except StructuredOutputError as e:
+                raise ValueError(f"No valid JSON array of tickets could be parsed from the LLM's response: {e}") from e
+
+    @staticmethod
+    def _is_valid_ticket(ticket) -> bool:
+        return TICKET_SCHEMA.is_valid(ticket)
+
+    def stream_tickets_from_idea(self, idea: str, use_cache=True):
+        """
+        Streams the idea-to-tickets completion and yields each ticket as soon as
+        its JSON object closes, so callers can start on ticket 1 while the rest
+        is still being generated. Falls back to generate_tickets_from_idea if the
+        stream produced no valid ticket.
+        """
+        llm = get_shared_llm(TASK_PLAN)
         prompt = IDEA_TO_TICKETS_PROMPT.strip() + f"\n\nIDEA:\n{idea.strip()}"
-        for attempt in range(max_attempts):
-            response_message = llm.invoke(prompt)
-            # The response from llm.invoke is an AIMessage object. We need its string content.
-            response_content = response_message.content if hasattr(response_message, 'content') else str(response_message)
-            
-            tickets = self.try_json_loads(response_content)
-            if tickets and isinstance(tickets, list):
-                # Validate ticket objects
-                valid = all(isinstance(t, dict) and {"titulo", "descripcion", "label"} <= set(t.keys()) for t in tickets)
-                if valid:
-                    return tickets
-            # else, try again
-        raise ValueError("No valid JSON array of tickets could be parsed from the LLM's response.")
+        parser = JSONArrayStreamParser()
+        yielded = 0
+        # The stream is read to the end even after the array closes so the full reply gets cached
+        with span("ticket_generation.stream"), usage_scope("OrchestratorAgent", "ticket_generation"):
+            for text in stream_llm(llm, prompt, use_cache=use_cache):
+                for ticket in parser.feed(text):
+                    if self._is_valid_ticket(ticket):
+                        yielded += 1
+                        yield ticket
+                    else:
+                        print(f"[OrchestratorAgent] Skipping invalid streamed ticket: {ticket}")
+        if not yielded:
+            print("[OrchestratorAgent] Streaming produced no valid tickets, regenerating without streaming.")
+            # The unusable streamed reply is cached under the same prompt
+            if use_cache:
+                forget(llm, prompt)
+            yield from self.generate_tickets_from_idea(idea, use_cache=use_cache)
 
     def run(self, ticket_data: dict) -> dict:
         ticket_id = ticket_data.get("id")
-        linear_api = LinearAPI()
+        linear_api = get_linear_api()
        
         team_key = ticket_data.get("team_key")
         team = linear_api.get_team_id_by_key(team_key) if team_key else None
@@ -79,12 +114,17 @@ class OrchestratorAgent:
         linear_ticket = None
         if team_id:
             print(f"[OrchestratorAgent.run] Team ID '{team_id}' found for team_key '{team_key}'. Proceeding to create Linear ticket.")
+            title = ticket_data.get("titulo", "Ticket sin título")
+            description = ticket_data.get("descripcion", "")
+            # Without a client key, retries within this request still create the ticket once
+            job_key = ticket_data.get("idempotency_key") or get_correlation_id() or uuid.uuid4().hex
             linear_ticket = linear_api.create_ticket(
                 team_id=team_id,
-                title=ticket_data.get("titulo", "Ticket sin título"),
-                description=ticket_data.get("descripcion", ""),
+                title=title,
+                description=description,
                 assignee_id=assignee_id,
-                label_ids=label_ids if label_ids is not None else []
+                label_ids=label_ids if label_ids is not None else [],
+                idempotency_key=idempotency.idempotency_key("create_ticket", job_key, team_id, title, description),
             )
         else:
             print(f"[OrchestratorAgent.run] SKIPPING Linear ticket creation because no Team ID was found for team_key '{team_key}'.")
@@ -96,69 +136,341 @@ class OrchestratorAgent:
             "linear_assignee": assignee,
         }
 
-    def process_project(self, idea: str, team_key: str = None):
-        linear_api = LinearAPI()
-        # a) Generate tickets
-        tickets = self.generate_tickets_from_idea(idea)
-        # b) Fetch team and members
+    @timed("agent_handoff")
+    def _handoff_ticket(self, ticket: dict, creation: dict | None, analysis: dict | None = None) -> dict:
+        """
+        Hands one created ticket to its agent and builds its result entry.
+        `analysis` is the ticket's precomputed sufficiency verdict, if any.
+        Errors are caught here so one failing ticket never aborts the batch.
+        """
+        started = time.perf_counter()
+        creation = creation or {}
+        linear_ticket_obj = creation.get("issue")
+        label_name = ticket.get("label", "").lower()
+
+        # e) Call appropriate agent if ticket creation was successful
+        agent_output = None
+        try:
+            if linear_ticket_obj:
+                print(f"[Orchestrator] Handing off ticket {linear_ticket_obj.get('identifier')} to {label_name} agent.")
+                agent = get_agent(label_name)
+                if agent:
+                    agent_output = agent.process_ticket(linear_ticket_obj, analysis=analysis)
+            elif creation.get("error"):
+                print(f"[Orchestrator] Linear ticket creation failed for '{ticket.get('titulo')}': {creation.get('error')}")
+        except Exception as e:
+            identifier = linear_ticket_obj.get("identifier") if linear_ticket_obj else None
+            print(f"[Orchestrator] Agent failed on ticket {identifier}: {e}")
+            agent_output = {"status": "error", "ticket": identifier, "error": str(e)}
+
+        return {
+            "local_ticket": {**ticket, "label": label_name},
+            "linear_ticket": {k: linear_ticket_obj.get(k) for k in ["id", "identifier", "url"]} if linear_ticket_obj else None,
+            "agent_output": agent_output,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    @timed("team_context")
+    def _resolve_team_context(self, linear_api: LinearAPI, team_key: str = None) -> dict:
+        """
+        Looks up the team, its members and the label name → id map used for every ticket.
+        """
         team = None
         members = []
         if team_key:
             team = linear_api.get_team_id_by_key(team_key)
             if team and "id" in team:
-                team_id = team["id"]
-                # get team members (simulate GraphQL as in main.py)
-                team_members = linear_api.get_team_members(team_id)
-                if team_members:
-                    members = team_members
-        assignees = []
-        if members:
-            n = len(members)
-            for i, _ in enumerate(tickets):
-                assignees.append(members[i % n])
-        else:
-            assignees = [None] * len(tickets)
+                try:
+                    members = linear_api.get_team_members(team["id"])
+                except Exception as e:
+                    # Tickets can still be created, just without assignees
+                    print(f"[Orchestrator] Could not list the members of team {team_key}: {e}")
+
+        # Generated tickets only carry agent labels, so look those up by name instead of listing every label
+        label_map = {}
+        for name in AGENT_CLASSES:
+            label = linear_api.get_label_by_name(name)
+            if label:
+                label_map[name.lower()] = label["id"]
+        return {
+            "team_key": team_key,
+            "team_id": team["id"] if team and "id" in team else None,
+            "members": members,
+            "label_map": label_map,
+        }
+
+    @staticmethod
+    def _ticket_input(ticket: dict, idx: int, context: dict, job_key: str) -> dict:
+        """
+        Builds the create_ticket arguments for a generated ticket, assigning team members round-robin.
+        The idempotency key ties the ticket to its job, so resubmitting the job creates no duplicates.
+        """
+        members = context["members"]
+        assignee = members[idx % len(members)] if members else None
+        label_id = context["label_map"].get(ticket.get("label", "").lower())
+        title = ticket.get("titulo", "Ticket sin título")
+        description = ticket.get("descripcion", "")
+        return {
+            "team_id": context["team_id"],
+            "title": title,
+            "description": description,
+            "assignee_id": assignee["id"] if assignee else None,
+            "label_ids": [label_id] if label_id else [],
+            "idempotency_key": idempotency.idempotency_key("create_ticket", job_key, context["team_id"], idx, title, description),
+        }
 
-        # c) Get labels from Linear, map label name (case-insensitive) → id
-        labels = linear_api.get_labels()
-        label_map = {l['name'].lower(): l['id'] for l in labels} if labels else {}
+    @staticmethod
+    def _with_local_fields(creation: dict | None, ticket_input: dict, ticket: dict) -> dict | None:
+        """
+        Tickets are created with the minimal field profile (id, identifier, url), so
+        the issue handed to the agents takes its title, description, labels and
+        assignee from what was sent rather than from Linear's reply.
+        """
+        issue = (creation or {}).get("issue")
+        if not issue:
+            return creation
+        label_name = (ticket.get("label") or "").lower()
+        labels = [{"id": label_id, "name": label_name} for label_id in ticket_input["label_ids"]]
+        if not labels and label_name:
+            # The workspace has no such label, but its name still routes the ticket to an agent
+            labels = [{"name": label_name}]
+        local = {
+            "title": ticket_input["title"],
+            "description": ticket_input["description"],
+            "labels": {"nodes": labels},
+        }
+        if ticket_input.get("assignee_id"):
+            local["assignee"] = {"id": ticket_input["assignee_id"]}
+        return {**creation, "issue": {**local, **issue}}
 
-        results = []
+    @timed("sufficiency_analysis.batch")
+    def _analyze_created_tickets(self, tickets: list[dict], creations: list) -> list[dict | None]:
+        """
+        Runs the batched sufficiency analysis over the created tickets that an agent handles.
+        Returns one analysis (or None) per ticket, aligned with `tickets`.
+        """
+        analyses = [None] * len(tickets)
+        pending = []
         for idx, ticket in enumerate(tickets):
-            # Assign round-robin
-            assignee = assignees[idx]
-            ticket_data = {
-                "titulo": ticket["titulo"],
-                "descripcion": ticket["descripcion"],
-                "team_key": team_key,
-                "assignee_email": assignee["email"] if assignee else None,
-            }
-            # Find label id
-            label_name = ticket.get("label", "").lower()
-            label_id = label_map.get(label_name)
-            if label_id:
-                ticket_data["labelIds"] = [label_id]
-            # d) Create Linear ticket
-            linear_ticket_response = self.run(ticket_data)
-            linear_ticket_obj = linear_ticket_response.get("linear_ticket", {}).get("issue")
-
-            # e) Call appropriate agent if ticket creation was successful
-            agent_output = None
-            if linear_ticket_obj:
-                label_name = ticket.get("label", "").lower()
-                print(f"[Orchestrator] Handing off ticket {linear_ticket_obj.get('identifier')} to {label_name} agent.")
-                if label_name == "frontend":
-                    agent_output = FrontendAgent().process_ticket(linear_ticket_obj)
-                elif label_name == "backend":
-                    agent_output = BackendAgent().process_ticket(linear_ticket_obj)
-            
-            results.append({
-                "local_ticket": {**ticket, "label": label_name},
-                "linear_ticket": {k: linear_ticket_obj.get(k) for k in ["id", "identifier", "url"]} if linear_ticket_obj else None,
-                "agent_output": agent_output
-            })
+            issue = (creations[idx] or {}).get("issue")
+            if not issue or not get_agent(ticket.get("label", "")):
+                continue
+            # Obviously unclear tickets get their clarifying comment without an LLM call
+            analyses[idx] = clarity_checker.prefilter(issue)
+            if analyses[idx] is None:
+                pending.append(idx)
+        if not pending:
+            return analyses
+        try:
+            batch = analyze_tickets_batch([creations[idx]["issue"] for idx in pending])
+        except Exception as e:
+            print(f"[Orchestrator] Batch analysis failed, agents will analyze tickets one by one: {e}")
+            return analyses
+        for idx, analysis in zip(pending, batch):
+            analyses[idx] = analysis
+        return analyses
+
+    def _create_and_analyze(self, linear_api: LinearAPI, tickets: list[dict], context: dict, job_key: str) -> tuple[list, list]:
+        """
+        Creates all Linear tickets in as few requests as possible, then analyzes
+        every ticket an agent will handle with as few LLM calls as possible.
+        """
+        creations = [None] * len(tickets)
+        if context["team_id"]:
+            ticket_inputs = [self._ticket_input(ticket, idx, context, job_key) for idx, ticket in enumerate(tickets)]
+            with span("ticket_creation"):
+                creations = linear_api.create_tickets_bulk(ticket_inputs, profile=PROFILE_MINIMAL)
+            creations = [self._with_local_fields(*entry) for entry in zip(creations, ticket_inputs, tickets)]
+        else:
+            print(f"[OrchestratorAgent.process_project] SKIPPING Linear ticket creation because no Team ID was found for team_key '{context['team_key']}'.")
+        return creations, self._analyze_created_tickets(tickets, creations)
+
+    def _hand_off_all(self, tickets: list[dict], creations: list, analyses: list, executor: ThreadPoolExecutor | None = None, emit=None) -> list[dict]:
+        """
+        Hands every ticket to its agent, on `executor` if given. Results are in ticket order.
+        """
+        def handoff(idx):
+            result = self._handoff_ticket(tickets[idx], creations[idx], analyses[idx])
+            if emit:
+                emit("ticket_result", {"index": idx, "result": result})
+            return result
+
+        if executor is None:
+            return [handoff(idx) for idx in range(len(tickets))]
+        # map keeps the submission order, so results line up with the tickets
+        return list(executor.map(bind(handoff), range(len(tickets))))
+
+    @timed("process_project")
+    def process_project(self, idea: str, team_key: str = None, concurrent: bool = True, max_workers: int = None, on_event=None, stream: bool = None,
+                        idempotency_key: str = None):
+        """
+        Turns an idea into Linear tickets and hands each one to its agent.
+        With `concurrent`, up to `max_workers` tickets are worked on at once;
+        results are always returned in the generated ticket order.
+        With `stream`, each ticket is created as soon as the LLM finishes writing
+        it, and handed off once STREAM_ANALYSIS_BATCH tickets (or the last ones)
+        have been analyzed together, instead of after the whole batch is generated.
+        `on_event(event, data)` is called with "ticket_generated" for each ticket
+        (streaming only), "tickets_generated" once all tickets are known and
+        "ticket_result" as each ticket finishes.
+        Calls with the same `idempotency_key` (default: the request/job correlation id)
+        reuse the Linear tickets the first call created.
+        """
+        def emit(event, data):
+            if on_event:
+                on_event(event, data)
+
+        batch_started = time.perf_counter()
+        stream = DEFAULT_STREAM_TICKETS if stream is None else stream
+        max_workers = _bounded(max_workers, DEFAULT_MAX_WORKERS, MAX_WORKERS_LIMIT)
+        linear_api = get_linear_api()
+        job_key = idempotency_key or get_correlation_id() or uuid.uuid4().hex
+
+        if stream:
+            # a+b) Resolve team metadata first so every streamed ticket can be created right away
+            context = self._resolve_team_context(linear_api, team_key)
+            if not context["team_id"]:
+                print(f"[OrchestratorAgent.process_project] SKIPPING Linear ticket creation because no Team ID was found for team_key '{team_key}'.")
+
+            def create(idx, ticket):
+                # d) Create the Linear ticket
+                if not context["team_id"]:
+                    return None
+                ticket_input = self._ticket_input(ticket, idx, context, job_key)
+                return self._with_local_fields(linear_api.create_ticket(**ticket_input, profile=PROFILE_MINIMAL), ticket_input, ticket)
+
+            def handoff(idx, ticket, creation, analysis):
+                # e) Hand it to its agent
+                result = self._handoff_ticket(ticket, creation, analysis)
+                emit("ticket_result", {"index": idx, "result": result})
+                return result
+
+            def analyze_and_hand_off(group):
+                # One batched sufficiency analysis per group of streamed tickets, so agents don't analyze them one by one
+                indexes, group_tickets, creations = zip(*[(idx, ticket, created.result()) for idx, ticket, created in group])
+                analyses = self._analyze_created_tickets(list(group_tickets), list(creations))
+                return [executor.submit(bind(handoff), *entry) for entry in zip(indexes, group_tickets, creations, analyses)]
+
+            tickets = []
+            group = []
+            groups = []
+            executor = ThreadPoolExecutor(max_workers=max_workers if concurrent else 1, thread_name_prefix="ticket")
+            # Separate thread: it waits on creations running in `executor`
+            analysis = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ticket-analysis")
+            agents_started = time.perf_counter()
+            try:
+                for idx, ticket in enumerate(self.stream_tickets_from_idea(idea)):
+                    tickets.append(ticket)
+                    emit("ticket_generated", {"index": idx, "ticket": ticket})
+                    group.append((idx, ticket, executor.submit(bind(create), idx, ticket)))
+                    if len(group) >= STREAM_ANALYSIS_BATCH:
+                        groups.append(analysis.submit(bind(analyze_and_hand_off), group))
+                        group = []
+                if group:
+                    groups.append(analysis.submit(bind(analyze_and_hand_off), group))
+                emit("tickets_generated", {"total": len(tickets), "tickets": tickets})
+                results = [future.result() for handoffs in groups for future in handoffs.result()]
+            finally:
+                analysis.shutdown(wait=True)
+                executor.shutdown(wait=True)
+        else:
+            # a) Generate tickets
+            tickets = self.generate_tickets_from_idea(idea)
+            emit("tickets_generated", {"total": len(tickets), "tickets": tickets})
+            # b+c) Fetch team, members and labels
+            context = self._resolve_team_context(linear_api, team_key)
+            # d+e) Create the Linear tickets and analyze them
+            creations, analyses = self._create_and_analyze(linear_api, tickets, context, job_key)
+
+            # f) Hand every ticket to its agent
+            agents_started = time.perf_counter()
+            if concurrent and len(tickets) > 1:
+                with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ticket") as executor:
+                    results = self._hand_off_all(tickets, creations, analyses, executor, emit)
+            else:
+                results = self._hand_off_all(tickets, creations, analyses, None, emit)
+
+        self.last_batch_stats = {
+            "tickets": len(tickets),
+            "concurrent": concurrent,
+            "streamed": stream,
+            # Batched sufficiency analysis calls (streaming analyzes tickets in groups as they arrive)
+            "analysis_batches": len(groups) if stream else 1,
+            "max_workers": max_workers if concurrent else 1,
+            "agents_latency_ms": round((time.perf_counter() - agents_started) * 1000, 1),
+            "batch_latency_ms": round((time.perf_counter() - batch_started) * 1000, 1),
+        }
+        print(f"[Orchestrator] Processed {len(tickets)} tickets in {self.last_batch_stats['batch_latency_ms']} ms (agents: {self.last_batch_stats['agents_latency_ms']} ms)")
         return results
 
+    def process_projects(self, ideas: list[str], team_key: str = None, concurrent: bool = True, max_workers: int = None,
+                         pipeline_depth: int = None, idempotency_key: str = None):
+        """
+        Runs many ideas as a pipeline and yields one entry per idea as it finishes:
+        {"index", "idea", "results", "batch"} or {"index", "idea", "error"}.
+
+        Team metadata and labels are resolved once for the batch. Tickets are
+        generated for up to `pipeline_depth` ideas at a time, independently of the
+        later stages, so generating idea N+1 overlaps with creating and handing off
+        the tickets of idea N. All ideas share one pool of `max_workers` agent threads.
+        """
+        if len(ideas) > MAX_IDEAS:
+            raise ValueError(f"At most {MAX_IDEAS} ideas can be processed at once, got {len(ideas)}")
+        batch_started = time.perf_counter()
+        max_workers = _bounded(max_workers, DEFAULT_MAX_WORKERS, MAX_WORKERS_LIMIT)
+        depth = _bounded(pipeline_depth, DEFAULT_PIPELINE_DEPTH, MAX_PIPELINE_DEPTH)
+        linear_api = get_linear_api()
+        job_key = idempotency_key or get_correlation_id() or uuid.uuid4().hex
+        context = self._resolve_team_context(linear_api, team_key)
+
+        generation = ThreadPoolExecutor(max_workers=depth, thread_name_prefix="idea-gen")
+        pipeline = ThreadPoolExecutor(max_workers=depth, thread_name_prefix="idea")
+        agents = ThreadPoolExecutor(max_workers=max_workers if concurrent else 1, thread_name_prefix="ticket")
+
+        @timed("idea_pipeline")
+        def run_idea(index, generated):
+            started = time.perf_counter()
+            tickets = generated.result()
+            creations, analyses = self._create_and_analyze(linear_api, tickets, context, f"{job_key}:{index}")
+            results = self._hand_off_all(tickets, creations, analyses, agents)
+            return {
+                "index": index,
+                "idea": ideas[index],
+                "results": results,
+                "batch": {"tickets": len(tickets), "latency_ms": round((time.perf_counter() - started) * 1000, 1)},
+            }
+
+        completed = 0
+        tickets = 0
+        try:
+            generated = [generation.submit(bind(self.generate_tickets_from_idea), idea) for idea in ideas]
+            futures = {pipeline.submit(bind(run_idea), index, future): index for index, future in enumerate(generated)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    print(f"[Orchestrator] Idea {index} failed: {e}")
+                    entry = {"index": index, "idea": ideas[index], "error": str(e)}
+                else:
+                    completed += 1
+                    tickets += entry["batch"]["tickets"]
+                yield entry
+        finally:
+            # A consumer that stops early (e.g. a disconnected client) cancels the ideas not started yet
+            for executor in (generation, pipeline, agents):
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        self.last_batch_stats = {
+            "ideas": len(ideas),
+            "completed": completed,
+            "tickets": tickets,
+            "pipeline_depth": depth,
+            "max_workers": max_workers if concurrent else 1,
+            "batch_latency_ms": round((time.perf_counter() - batch_started) * 1000, 1),
+        }
+        print(f"[Orchestrator] Processed {len(ideas)} ideas ({tickets} tickets) in {self.last_batch_stats['batch_latency_ms']} ms")
+
 if __name__ == "__main__":
     import sys
     import json as _json
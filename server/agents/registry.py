@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from ..utils.clients import Registry
+from .base_agent import BaseAgent
+from .backend_agent import BackendAgent
+from .frontend_agent import FrontendAgent
+
+# Agent class for each ticket label
+AGENT_CLASSES = {
+    "frontend": FrontendAgent,
+    "backend": BackendAgent,
+}
+
+agents = Registry()
+
+
+def get_agent(label: str) -> BaseAgent | None:
+    """
+    Returns the shared agent that handles tickets with `label`, building it on first use.
+    Returns None for labels no agent handles.
+    """
+    agent_class = AGENT_CLASSES.get((label or "").lower())
+    if agent_class is None:
+        return None
+    return agents.get(agent_class.__name__, agent_class)
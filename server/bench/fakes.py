@@ -0,0 +1,408 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Local stand-ins for Linear, GitHub and the chat model, used by the benchmark harness.
+
+
+class FaultProfile:
+    """
+    Latency, jitter and error-rate injection for one fake upstream.
+    `latency` and `jitter` are seconds; each call sleeps latency + uniform(0, jitter)
+    and fails with probability `error_rate`.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int | None = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        with self._lock:
+            return self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def should_fail(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def to_dict(self) -> dict:
+        return {"latency": self.latency, "jitter": self.jitter, "error_rate": self.error_rate}
+
+
+class CallCounter:
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+class _FakeServer:
+    """
+    Threaded HTTP server on 127.0.0.1 with a random free port.
+    """
+
+    def __init__(self, faults: FaultProfile | None = None):
+        self.faults = faults or FaultProfile()
+        self.calls = CallCounter()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, method: str, path: str, body: Any) -> tuple[int, Any]:
+        raise NotImplementedError
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes; without TCP_NODELAY keep-alive calls stall on delayed ACKs
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                body = json.loads(raw) if raw else None
+                time.sleep(fake.faults.delay())
+                if fake.faults.should_fail():
+                    fake.calls.add("injected_error")
+                    status, payload = 503, {"message": "Injected failure"}
+                else:
+                    status, payload = fake.handle(method, self.path, body)
+                out = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+        return Handler
+
+
+class FakeLinearServer(_FakeServer):
+    """
+    Answers the GraphQL operations LinearAPI sends, keyed by operation name.
+    Every team key resolves to a team with `members` members and the frontend/backend labels.
+    """
+
+    _OPERATION = re.compile(r"\b(query|mutation)\s+(\w+)")
+
+    def __init__(self, faults: FaultProfile | None = None, members: int = 3):
+        super().__init__(faults)
+        self.members = [{"id": f"user-{i}", "name": f"User {i}", "email": f"user{i}@bench.local"} for i in range(members)]
+        self.labels = [
+            {"id": "label-frontend", "name": "frontend", "color": "#00f"},
+            {"id": "label-backend", "name": "backend", "color": "#f00"},
+        ]
+        self.issues: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _page(nodes: list) -> dict:
+        return {"nodes": nodes, "pageInfo": {"hasNextPage": False, "endCursor": None}}
+
+    @staticmethod
+    def _selected_fields(query: str, key: str = "issue") -> set[str] | None:
+        """
+        Top-level fields selected on `key`, so replies are as large as the query's profile asks for.
+        """
+        match = re.search(key + r"(?:\([^)]*\))?\s*\{", query)
+        if not match:
+            return None
+        depth, fields, name = 1, set(), ""
+        for char in query[match.end():]:
+            if char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    break
+            if depth == 1 and (char.isalnum() or char == "_"):
+                name += char
+                continue
+            if name and depth <= 2:
+                fields.add(name)
+            name = ""
+        return fields | ({name} if name else set())
+
+    @staticmethod
+    def _select(payload: dict | None, fields: set[str] | None, key: str = "issue") -> dict | None:
+        if not payload or fields is None or not payload.get(key):
+            return payload
+        return {**payload, key: {k: v for k, v in payload[key].items() if k in fields}}
+
+    def _create_issue(self, issue_input: dict) -> dict | None:
+        """
+        Returns the issueCreate payload, or None when the client-chosen id is taken (Linear answers with an error).
+        """
+        with self._lock:
+            issue_id = issue_input.get("id") or str(uuid.uuid4())
+            if issue_id in self.issues:
+                return None
+            number = len(self.issues) + 1
+            issue = {
+                "id": issue_id,
+                "identifier": f"BEN-{number}",
+                "title": issue_input.get("title"),
+                "description": issue_input.get("description"),
+                "assignee": next((m for m in self.members if m["id"] == issue_input.get("assigneeId")), None),
+                "url": f"https://linear.bench.local/issue/BEN-{number}",
+                "labels": {"nodes": [l for l in self.labels if l["id"] in (issue_input.get("labelIds") or [])]},
+            }
+            self.issues[issue["id"]] = issue
+        return {"success": True, "issue": issue}
+
+    def handle(self, method, path, body):
+        query = (body or {}).get("query", "")
+        variables = (body or {}).get("variables") or {}
+        match = self._OPERATION.search(query)
+        operation = match.group(2) if match else "anonymous"
+        self.calls.add(operation)
+
+        if operation == "TeamByKey":
+            data = {"teams": {"nodes": [{"id": f"team-{variables['key']}", "name": "Bench", "key": variables["key"]}]}}
+        elif operation == "Teams":
+            data = {"teams": self._page([{"id": "team-BEN", "name": "Bench", "key": "BEN"}])}
+        elif operation == "TeamMembers":
+            data = {"team": {"members": self._page(self.members)}}
+        elif operation == "IssueLabels":
+            data = {"issueLabels": self._page(self.labels)}
+        elif operation == "LabelByName":
+            name = variables.get("name", "").lower()
+            data = {"issueLabels": {"nodes": [l for l in self.labels if l["name"] == name]}}
+        elif operation == "UserByEmail":
+            data = {"users": {"nodes": [m for m in self.members if m["email"] == variables.get("email")]}}
+        elif operation in ("IssueCreate", "BulkIssueCreate"):
+            aliases = {"issueCreate": variables.get("input")} if operation == "IssueCreate" else {
+                f"t{i}": variables[f"input{i}"] for i in range(len([k for k in variables if k.startswith("input")]))
+            }
+            fields = self._selected_fields(query)
+            data = {alias: self._select(self._create_issue(issue_input), fields) for alias, issue_input in aliases.items()}
+            errors = [{"message": "Entity already exists", "path": [alias]} for alias, payload in data.items() if payload is None]
+            if errors:
+                return 200, {"data": data, "errors": errors}
+        elif operation == "IssueCommentCreate":
+            comment = {"id": str(uuid.uuid4()), "body": variables["input"]["body"], "createdAt": "2024-01-01T00:00:00Z"}
+            data = {"commentCreate": self._select({"success": True, "comment": comment}, self._selected_fields(query, "comment"), "comment")}
+        elif operation == "IssueById":
+            data = self._select({"issue": self.issues.get(variables.get("id"))}, self._selected_fields(query))
+        else:
+            return 200, {"errors": [{"message": f"Unknown operation {operation}"}]}
+        return 200, {"data": data}
+
+
+class FakeGitHubServer(_FakeServer):
+    """
+    The REST endpoints GitHubAPI.create_pr_files and the repository index
+    use: git ref, git commit, trees, blobs, commits, refs and pulls. The
+    base tree holds the files in REPO_FILES.
+    """
+
+    _ROUTES = [
+        ("GET", re.compile(r"^/repos/([^/]+/[^/]+)/git/ref/heads/(.+)$"), "get_ref"),
+        ("GET", re.compile(r"^/repos/([^/]+/[^/]+)/git/commits/(\w+)$"), "get_commit"),
+        ("GET", re.compile(r"^/repos/([^/]+/[^/]+)/git/trees/(\w+)$"), "get_tree"),
+        ("GET", re.compile(r"^/repos/([^/]+/[^/]+)/git/blobs/(\w+)$"), "get_blob"),
+        ("POST", re.compile(r"^/repos/([^/]+/[^/]+)/git/trees$"), "create_tree"),
+        ("POST", re.compile(r"^/repos/([^/]+/[^/]+)/git/commits$"), "create_commit"),
+        ("POST", re.compile(r"^/repos/([^/]+/[^/]+)/git/refs$"), "create_ref"),
+        ("POST", re.compile(r"^/repos/([^/]+/[^/]+)/pulls$"), "create_pull"),
+    ]
+
+    BASE_SHA = "b" * 40
+    BASE_TREE_SHA = "c" * 40
+    REPO_FILES = {
+        "README.md": "# Bench app\n## Running\n",
+        "requirements.txt": "fastapi\nsqlalchemy\n",
+        "server/main.py": "from fastapi import FastAPI\napp = FastAPI()\n\n@app.get('/health')\ndef health():\n    return {}\n",
+        "server/models.py": "class Account:\n    pass\n",
+        "src/App.tsx": "export default function App() {\n  return null;\n}\n",
+        "package.json": '{"name": "bench-app", "dependencies": {"react": "^18.0.0"}}',
+    }
+
+    def __init__(self, faults: FaultProfile | None = None):
+        super().__init__(faults)
+        self.pulls = 0
+        self._lock = threading.Lock()
+        self._blobs = {hashlib.sha1(content.encode()).hexdigest(): content for content in self.REPO_FILES.values()}
+
+    @staticmethod
+    def _sha() -> str:
+        return uuid.uuid4().hex + uuid.uuid4().hex[:8]
+
+    def handle(self, method, path, body):
+        path = path.split("?", 1)[0]
+        for route_method, pattern, name in self._ROUTES:
+            match = pattern.match(path) if route_method == method else None
+            if match:
+                break
+        else:
+            self.calls.add("not_found")
+            return 404, {"message": "Not Found"}
+        self.calls.add(name)
+        repo = match.group(1)
+        api = f"{self.url}/repos/{repo}"
+
+        if name == "get_ref":
+            return 200, {"ref": f"refs/heads/{match.group(2)}", "url": f"{api}/git/refs/heads/{match.group(2)}",
+                         "object": {"sha": self.BASE_SHA, "type": "commit", "url": f"{api}/git/commits/{self.BASE_SHA}"}}
+        if name == "get_commit":
+            return 200, {"sha": match.group(2), "url": f"{api}/git/commits/{match.group(2)}", "message": "base",
+                         "tree": {"sha": self.BASE_TREE_SHA, "url": f"{api}/git/trees/{self.BASE_TREE_SHA}"}, "parents": []}
+        if name == "get_tree":
+            tree = [
+                {"path": path, "mode": "100644", "type": "blob", "sha": hashlib.sha1(content.encode()).hexdigest(),
+                 "size": len(content.encode())}
+                for path, content in self.REPO_FILES.items()
+            ]
+            return 200, {"sha": match.group(2), "url": f"{api}/git/trees/{match.group(2)}", "tree": tree, "truncated": False}
+        if name == "get_blob":
+            if match.group(2) not in self._blobs:
+                return 404, {"message": "Not Found"}
+            content = self._blobs[match.group(2)].encode()
+            return 200, {"sha": match.group(2), "size": len(content), "encoding": "base64",
+                         "content": base64.b64encode(content).decode()}
+        if name == "create_tree":
+            sha = self._sha()
+            return 201, {"sha": sha, "url": f"{api}/git/trees/{sha}", "tree": body.get("tree", [])}
+        if name == "create_commit":
+            sha = self._sha()
+            return 201, {"sha": sha, "url": f"{api}/git/commits/{sha}", "message": body.get("message"),
+                         "tree": {"sha": body.get("tree"), "url": f"{api}/git/trees/{body.get('tree')}"}, "parents": []}
+        if name == "create_ref":
+            return 201, {"ref": body["ref"], "url": f"{api}/git/{body['ref']}", "object": {"sha": body["sha"], "type": "commit"}}
+        with self._lock:
+            self.pulls += 1
+            number = self.pulls
+        return 201, {"id": number, "number": number, "state": "open", "title": body.get("title"),
+                     "url": f"{api}/pulls/{number}", "html_url": f"https://github.bench.local/{repo}/pull/{number}"}
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that recognises the prompts this app sends (idea-to-tickets,
+    sufficiency analysis, batch analysis, code generation) and answers each
+    with a well-formed canned reply after the configured latency.
+    """
+
+    model_name: str = "fake-chat"
+    temperature: float = 0.0
+    tickets_per_idea: int = 3
+    faults: Any = None
+    calls: Any = None
+    chunk_size: int = 64
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.faults = self.faults or FaultProfile()
+        self.calls = self.calls or CallCounter()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @staticmethod
+    def _tickets(count: int) -> list[dict]:
+        tickets = []
+        for i in range(count):
+            label = "backend" if i % 2 == 0 else "frontend"
+            tickets.append({
+                "titulo": f"Bench {label} task {i + 1}",
+                "descripcion": f"Implement the {label} part {i + 1} of the benchmark idea end to end.\nAC: part {i + 1} works and is covered by tests.",
+                "label": label,
+            })
+        return tickets
+
+    def _reply(self, prompt: str) -> tuple[str, str]:
+        if "IDEA:" in prompt:
+            return "generate_tickets", json.dumps(self._tickets(self.tickets_per_idea), ensure_ascii=False)
+        if "one object per ticket" in prompt:
+            indexes = [int(i) for i in re.findall(r"### Ticket (\d+)", prompt)]
+            return "batch_analysis", json.dumps([{"index": i, "sufficient": True, "question": ""} for i in indexes])
+        if 'Respond with only "true"' in prompt:
+            return "analysis", "true"
+        if '"files"' in prompt:
+            path = "server/bench_generated.py" if "backend" in prompt else "src/BenchGenerated.tsx"
+            return "code_generation", json.dumps({"files": [{"file_path": path, "file_content": "# generated\n"}]})
+        if "not clear enough" in prompt:
+            return "clarifying_question", "Could you describe the expected behaviour in more detail?"
+        return "other", "ok"
+
+    def _respond(self, messages) -> tuple[str, float]:
+        prompt = "\n".join(str(m.content) for m in messages)
+        kind, text = self._reply(prompt)
+        self.calls.add(kind)
+        if self.faults.should_fail():
+            self.calls.add("injected_error")
+            raise RuntimeError("Injected LLM failure")
+        return text, self.faults.delay()
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text, delay = self._respond(messages)
+        time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        text, delay = self._respond(messages)
+        chunks = [text[start:start + self.chunk_size] for start in range(0, len(text), self.chunk_size)] or [""]
+        # The latency is spread over the chunks, like tokens arriving from a real model
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from .fakes import FakeChatModel, FakeGitHubServer, FakeLinearServer, FaultProfile
+
+# Offline benchmark for OrchestratorAgent.process_project and /api/project/idea.
+#
+#   python -m server.bench.run --tickets 1 10 50 --runs 3 --output bench.json
+#
+# Linear, GitHub and the LLM are replaced by the local fakes in fakes.py; every
+# fake takes its own latency (ms), jitter (ms) and error rate.
+
+TEAM_KEY = "BEN"
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    """
+    Nearest-rank percentile; None for an empty list.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _configure_environment(linear_url: str, github_url: str, llm_cache: bool):
+    """
+    Points the app at the fakes. Must run before any client is built.
+    """
+    state_dir = tempfile.mkdtemp(prefix="bench-")
+    os.environ.update({
+        "LINEAR_API_URL": f"{linear_url}/graphql",
+        "LINEAR_DEVELOPER_TOKEN": "bench-token",
+        "GITHUB_API_URL": github_url,
+        "GITHUB_TOKEN": "bench-token",
+        "GITHUB_REPO": "bench/repo",
+        "OPENAI_API_KEY": "bench-key",
+        "LLM_CACHE_ENABLED": "true" if llm_cache else "false",
+        "METADATA_CACHE_BACKEND": "lru",
+        # Fresh stores so results and indexes from earlier benchmark runs are never reused
+        "IDEMPOTENCY_STORE_PATH": os.path.join(state_dir, "idempotency.sqlite3"),
+        "REPO_INDEX_PATH": os.path.join(state_dir, "repo_index.sqlite3"),
+    })
+    if "GITHUB_SECONDS_BETWEEN_REQUESTS" not in os.environ:
+        os.environ["GITHUB_SECONDS_BETWEEN_REQUESTS"] = "0"
+        os.environ["GITHUB_SECONDS_BETWEEN_WRITES"] = "0"
+
+
+def _run_once(args, correlation_id: str, idea: str):
+    """
+    Runs one idea through the orchestrator (or the HTTP endpoint) and returns its results.
+    """
+    from ..utils import metrics
+
+    if args.via_api:
+        from fastapi.testclient import TestClient
+        from ..main import app
+
+        client = TestClient(app)
+        response = client.post(
+            "/api/project/idea",
+            json={"idea": idea, "team_key": TEAM_KEY, "concurrent": not args.sequential,
+                  "max_workers": args.max_workers, "stream": args.stream},
+            headers={"X-Request-ID": correlation_id},
+        )
+        response.raise_for_status()
+        return response.json()["results"]
+
+    from ..agents.orchestrator_agent import OrchestratorAgent
+
+    with metrics.correlation(correlation_id):
+        return OrchestratorAgent().process_project(
+            idea, team_key=TEAM_KEY, concurrent=not args.sequential, max_workers=args.max_workers, stream=args.stream
+        )
+
+
+def run_scenario(args, tickets: int, linear: FakeLinearServer, github: FakeGitHubServer, llm: FakeChatModel) -> dict:
+    from ..utils import metrics
+    from ..utils.linear_queries import payload_stats
+    from ..utils.llm_usage import get_usage_tracker
+    from ..utils.metadata_cache import get_metadata_cache
+
+    llm.tickets_per_idea = tickets
+    wall_times = []
+    stages = defaultdict(list)
+    outcomes = defaultdict(int)
+    tokens = defaultdict(int)
+    payloads_before = {}
+    for run in range(args.warmup + args.runs):
+        if run == args.warmup:
+            # Only measured runs count towards the per-upstream call totals
+            for counter in (linear.calls, github.calls, llm.calls):
+                counter.reset()
+            payloads_before = payload_stats.snapshot()
+        if not args.warm_cache:
+            get_metadata_cache().invalidate()
+        correlation_id = f"bench-{tickets}-{run}-{time.time_ns()}"
+        started = time.perf_counter()
+        results = _run_once(args, correlation_id, f"Benchmark idea with {tickets} tickets (run {run})")
+        elapsed = time.perf_counter() - started
+        if run < args.warmup:
+            continue
+        wall_times.append(elapsed)
+        for result in results:
+            output = result.get("agent_output") or {}
+            outcomes[output.get("status", "no_agent")] += 1
+        for span in metrics.traces.get(correlation_id) or []:
+            stages[span["stage"]].append(span["duration_ms"] / 1000)
+        usage = get_usage_tracker().summary(correlation_id) or {}
+        for kind in ("prompt_tokens", "completion_tokens"):
+            tokens[kind] += usage.get(kind, 0)
+
+    linear_bytes = {
+        operation: stats["response_bytes"] - payloads_before.get(operation, {}).get("response_bytes", 0)
+        for operation, stats in payload_stats.snapshot().items()
+    }
+    return {
+        "tickets": tickets,
+        "runs": args.runs,
+        "wall_time_s": summarize(wall_times),
+        "tickets_per_second": round(tickets * len(wall_times) / sum(wall_times), 3) if wall_times else None,
+        "stages_s": {stage: summarize(values) for stage, values in sorted(stages.items())},
+        "calls": {
+            "linear": linear.calls.snapshot(),
+            "github": github.calls.snapshot(),
+            "llm": llm.calls.snapshot(),
+        },
+        "llm_tokens": dict(tokens),
+        "linear_response_bytes": {operation: size for operation, size in linear_bytes.items() if size},
+        "outcomes": dict(outcomes),
+    }
+
+
+def _print_report(report: dict):
+    for scenario in report["scenarios"]:
+        wall = scenario["wall_time_s"]
+        print(f"\n== {scenario['tickets']} tickets x {scenario['runs']} runs: wall p50={wall['p50']:.3f}s p95={wall['p95']:.3f}s p99={wall['p99']:.3f}s ({scenario['tickets_per_second']} tickets/s)")
+        for stage, stats in scenario["stages_s"].items():
+            print(f"   {stage:<40} n={stats['count']:<5} p50={stats['p50'] * 1000:8.1f}ms p95={stats['p95'] * 1000:8.1f}ms p99={stats['p99'] * 1000:8.1f}ms")
+        for upstream, calls in scenario["calls"].items():
+            print(f"   calls[{upstream}] total={sum(calls.values())} {calls}")
+        print(f"   llm tokens {scenario['llm_tokens']}")
+        print(f"   linear response bytes {scenario['linear_response_bytes']}")
+        print(f"   outcomes {scenario['outcomes']}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Offline benchmark with fake Linear, GitHub and LLM upstreams")
+    parser.add_argument("--tickets", type=int, nargs="+", default=[1, 10, 50], help="Tickets per idea, one scenario each")
+    parser.add_argument("--runs", type=int, default=3, help="Measured runs per scenario")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured runs per scenario")
+    parser.add_argument("--output", default="bench-results.json", help="Where to write the JSON report")
+    parser.add_argument("--via-api", action="store_true", help="Go through POST /api/project/idea instead of calling the orchestrator")
+    parser.add_argument("--stream", action="store_true", help="Use streaming ticket generation")
+    parser.add_argument("--sequential", action="store_true", help="Hand tickets to agents one at a time")
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--warm-cache", action="store_true", help="Keep Linear metadata cached between runs")
+    parser.add_argument("--llm-cache", action="store_true", help="Enable the LLM response cache")
+    parser.add_argument("--seed", type=int, default=1234)
+    for name, latency in (("linear", 40), ("github", 60), ("llm", 300)):
+        parser.add_argument(f"--{name}-latency", type=float, default=latency, help=f"{name} latency in ms")
+        parser.add_argument(f"--{name}-jitter", type=float, default=latency / 2, help=f"{name} jitter in ms")
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0, help=f"{name} failure probability per call")
+    return parser
+
+
+def _faults(args, name: str) -> FaultProfile:
+    return FaultProfile(
+        latency=getattr(args, f"{name}_latency") / 1000,
+        jitter=getattr(args, f"{name}_jitter") / 1000,
+        error_rate=getattr(args, f"{name}_error_rate"),
+        seed=args.seed,
+    )
+
+
+def main(argv=None) -> dict:
+    args = build_parser().parse_args(argv)
+
+    with FakeLinearServer(_faults(args, "linear")) as linear, FakeGitHubServer(_faults(args, "github")) as github:
+        _configure_environment(linear.url, github.url, args.llm_cache)
+        # Imported only now so module-level settings see the fake endpoints
+        from ..agents.registry import agents
+        from ..utils import metrics
+        from ..utils.clients import clients
+        from ..utils.langchain_helpers import set_llm_factory
+
+        llm = FakeChatModel(faults=_faults(args, "llm"))
+        set_llm_factory(lambda: llm)
+        clients.reset()
+        agents.reset()
+        # Keep every span of a 50-ticket run in its trace
+        metrics.traces.max_spans = 100_000
+
+        report = {
+            "meta": {
+                "commit": _git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "python": platform.python_version(),
+                "config": {k: v for k, v in vars(args).items() if k != "output"},
+                "faults": {name: _faults(args, name).to_dict() for name in ("linear", "github", "llm")},
+            },
+            "scenarios": [run_scenario(args, tickets, linear, github, llm) for tickets in args.tickets],
+        }
+        set_llm_factory(None)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    _print_report(report)
+    print(f"\nWrote {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
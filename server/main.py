@@ -1,12 +1,38 @@
-from fastapi import FastAPI, HTTPException, Query
+import asyncio
+import json
+import os
+import time
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Optional, List
-from .agents.orchestrator_agent import OrchestratorAgent
-from .utils.linear_api import LinearAPI
+from .agents.orchestrator_agent import MAX_IDEAS, MAX_PIPELINE_DEPTH, MAX_WORKERS_LIMIT, OrchestratorAgent
+from .utils.linear_api import AsyncLinearAPI, close_async_http_client, close_http_session
+from .utils.metadata_cache import get_metadata_cache
+from .utils.jobs import get_job_manager
+from .utils.llm_cache import get_llm_cache
+from .utils import clarity_checker
+from .utils.retry import get_service_stats
+from .utils.linear_queries import payload_stats
+from .utils import metrics
+from .utils.llm_usage import get_usage_tracker
+from .utils.llm_router import route_stats
+from .utils.linear import get_linear_webhook_secret, verify_linear_webhook
+from .utils.idempotency import get_idempotency_store
+from .utils.repo_index import get_repo_index, repo_index_enabled
+from .utils.clients import get_github_api
+from .utils.work_queue import QueueWorkerPool, get_work_queue
+from .agents.linear_events import ISSUE_EVENT_KIND, handle_issue_event, ignore_reason
 
 app = FastAPI()
 
+# Threads draining the webhook work queue; 0 leaves draining to another process
+QUEUE_WORKERS = int(os.environ.get("WORK_QUEUE_WORKERS", "2"))
+# Max age of a webhook delivery before it is rejected as a replay
+LINEAR_WEBHOOK_TOLERANCE_SECONDS = float(os.environ.get("LINEAR_WEBHOOK_TOLERANCE_SECONDS", "60"))
+queue_workers: Optional[QueueWorkerPool] = None
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
@@ -15,6 +41,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def correlation_id_middleware(request: Request, call_next):
+    # Tag logs, spans and traces with the caller's X-Request-ID (or a fresh id) and echo it back
+    with metrics.correlation(request.headers.get("X-Request-ID")) as correlation_id:
+        started_at, started = time.time(), time.perf_counter()
+        response = await call_next(request)
+        # The route template (not the raw path) keeps job ids out of the stage label
+        route = request.scope.get("route")
+        stage = f"http {request.method} {route.path if route else 'unmatched'}"
+    response.headers["X-Request-ID"] = correlation_id
+    body = response.body_iterator
+
+    async def timed_body():
+        # Timed to the last byte: streamed routes (NDJSON, SSE) send their headers long before they finish
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            with metrics.correlation(correlation_id):
+                metrics.record_span(stage, started_at, time.perf_counter() - started)
+
+    response.body_iterator = timed_body()
+    return response
+
+@app.on_event("startup")
+def start_queue_workers():
+    global queue_workers
+    if QUEUE_WORKERS > 0:
+        queue_workers = QueueWorkerPool(get_work_queue(), {ISSUE_EVENT_KIND: handle_issue_event}, workers=QUEUE_WORKERS)
+        queue_workers.start()
+
+@app.on_event("startup")
+def warm_repo_index():
+    # Indexes the target repo in the background so code generation never waits for it
+    if repo_index_enabled() and os.environ.get("GITHUB_TOKEN") and os.environ.get("GITHUB_REPO"):
+        get_repo_index().warm(get_github_api)
+
+@app.on_event("shutdown")
+async def close_linear_clients():
+    close_http_session()
+    await close_async_http_client()
+    get_job_manager().shutdown()
+    if queue_workers:
+        queue_workers.stop()
+
 class TicketRequest(BaseModel):
     descripcion: str
     team_key: Optional[str] = None
@@ -26,27 +97,63 @@ class TicketRequest(BaseModel):
 class IdeaRequest(BaseModel):
     idea: str
     team_key: Optional[str] = None
+    concurrent: bool = True
+    max_workers: Optional[int] = Field(None, ge=1, le=MAX_WORKERS_LIMIT)
+    background: bool = False
+    stream: Optional[bool] = None
 
 @app.post("/create_ticket")
-def create_ticket(ticket: TicketRequest):
+def create_ticket(ticket: TicketRequest, idempotency_key: Optional[str] = Header(None)):
+    # A resubmit with the same Idempotency-Key header returns the ticket created the first time
     try:
         print(f"[main.py] Received ticket data: {ticket.dict()}")
         agent = OrchestratorAgent()
-        result = agent.run(ticket.dict())
+        result = agent.run({**ticket.dict(), "idempotency_key": idempotency_key})
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _run_project_job(job, request: IdeaRequest, team_key: str, idempotency_key: Optional[str] = None):
+    agent = OrchestratorAgent()
+    results = agent.process_project(
+        request.idea,
+        team_key,
+        concurrent=request.concurrent,
+        max_workers=request.max_workers,
+        on_event=job.publish,
+        stream=request.stream,
+        idempotency_key=idempotency_key,
+    )
+    return {"results": results, "batch": agent.last_batch_stats, "usage": get_usage_tracker().summary(job.id)}
+
 @app.post("/api/project/idea")
-def project_idea(request: IdeaRequest):
+def project_idea(request: IdeaRequest, idempotency_key: Optional[str] = Header(None)):
+    # Resubmits with the same Idempotency-Key header reuse the Linear tickets already created
     try:
         # Use a default team key if the frontend doesn't provide one.
         # This ensures that tickets can always be created in Linear.
         team_key_to_use = request.team_key or "CHA"
         print(f"[project_idea] idea='{request.idea[:80]}...' team_key='{team_key_to_use}'")
 
+        if request.background:
+            job = get_job_manager().submit("project_idea", _run_project_job, request, team_key_to_use, idempotency_key)
+            print(f"[project_idea] submitted background job {job.id}")
+            return JSONResponse(status_code=202, content={
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": f"/api/jobs/{job.id}",
+                "events_url": f"/api/jobs/{job.id}/events",
+            })
+
         agent = OrchestratorAgent()
-        results = agent.process_project(request.idea, team_key_to_use)
+        results = agent.process_project(
+            request.idea,
+            team_key_to_use,
+            concurrent=request.concurrent,
+            max_workers=request.max_workers,
+            stream=request.stream,
+            idempotency_key=idempotency_key,
+        )
 
         print(f"[project_idea] generated {len(results)} tickets")
         for t in results:
@@ -55,66 +162,225 @@ def project_idea(request: IdeaRequest):
             status = f"✅ Created ({lnt.get('identifier')})" if (lnt and lnt.get('success')) else "❌ Failed"
             print(f"   - {lt.get('titulo')} [{lt.get('label')}] - {status}")
 
-        return {"results": results}
+        usage = get_usage_tracker().summary(metrics.get_correlation_id())
+        return {"results": results, "batch": agent.last_batch_stats, "usage": usage}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/linear/teams")
-def get_linear_teams():
-    api = LinearAPI()
-    # Fetch all teams
-    query = """
-    query {
-      teams {
-        nodes {
-          id
-          name
-          key
-        }
-      }
-    }
+class IdeasRequest(BaseModel):
+    ideas: List[str] = Field(..., max_length=MAX_IDEAS)
+    team_key: Optional[str] = None
+    concurrent: bool = True
+    max_workers: Optional[int] = Field(None, ge=1, le=MAX_WORKERS_LIMIT)
+    pipeline_depth: Optional[int] = Field(None, ge=1, le=MAX_PIPELINE_DEPTH)
+
+@app.post("/api/project/ideas")
+def project_ideas(request: IdeasRequest, idempotency_key: Optional[str] = Header(None)):
     """
-    response = api._LinearAPI__raw_query(query)
-    return response.get("data", {}).get("teams", {}).get("nodes", [])
+    Runs many ideas as a pipeline and streams one NDJSON line per idea as it
+    finishes (in completion order, with its "index"), then a final {"done": true} line.
+    """
+    if not request.ideas:
+        raise HTTPException(status_code=400, detail="No ideas given")
+    team_key_to_use = request.team_key or "CHA"
+    correlation_id = metrics.get_correlation_id()
+    print(f"[project_ideas] {len(request.ideas)} ideas team_key='{team_key_to_use}'")
+    agent = OrchestratorAgent()
 
-@app.get("/linear/team_members")
-def get_linear_team_members(team_key: str = Query(...)):
-    api = LinearAPI()
-    # Fetch all teams and find the one with the matching key
-    query_teams = """
-    query {
-      teams {
-        nodes {
-          id
-          name
-          key
-        }
-      }
-    }
+    def lines():
+        try:
+            for entry in agent.process_projects(
+                request.ideas,
+                team_key_to_use,
+                concurrent=request.concurrent,
+                max_workers=request.max_workers,
+                pipeline_depth=request.pipeline_depth,
+                idempotency_key=idempotency_key,
+            ):
+                yield json.dumps(entry, default=str) + "\n"
+        except Exception as e:
+            # The 200 status is already sent, so a failure of the whole batch (e.g. resolving the team) is reported in-band
+            print(f"[project_ideas] batch failed: {e}")
+            yield json.dumps({"error": str(e)}) + "\n"
+            return
+        yield json.dumps({"done": True, "batch": agent.last_batch_stats, "usage": get_usage_tracker().summary(correlation_id)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+def _get_job_or_404(job_id: str):
+    job = get_job_manager().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str, include_events: bool = False):
+    return _get_job_or_404(job_id).to_dict(include_events=include_events)
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
     """
-    teams_response = api._LinearAPI__raw_query(query_teams)
-    teams = teams_response.get("data", {}).get("teams", {}).get("nodes", [])
-    team = next((t for t in teams if t["key"] == team_key), None)
+    Server-Sent Events stream of a job's progress. Reconnecting clients resume
+    after the id in the Last-Event-ID header.
+    """
+    job = _get_job_or_404(job_id)
+    try:
+        last_id = max(0, int(request.headers.get("last-event-id") or 0))
+    except ValueError:
+        # A malformed header replays from the start rather than failing the stream
+        last_id = 0
+
+    async def event_stream():
+        nonlocal last_id
+        while True:
+            for event in job.events_after(last_id):
+                last_id = event["id"]
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+                if event["event"] == "done":
+                    return
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/webhooks/linear")
+async def linear_webhook(request: Request):
+    # Only verifies and enqueues; the queue workers run the agents
+    secret = get_linear_webhook_secret()
+    if not secret:
+        raise HTTPException(status_code=503, detail="Linear webhooks are not configured")
+    body = await request.body()
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    if not isinstance(payload, dict) or not verify_linear_webhook(
+        body, request.headers.get("Linear-Signature"), secret, payload.get("webhookTimestamp"), LINEAR_WEBHOOK_TOLERANCE_SECONDS
+    ):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    reason = ignore_reason(payload)
+    if reason:
+        return {"queued": False, "reason": reason}
+    # Linear redelivers with the same Linear-Delivery id, which the queue deduplicates
+    message_id = get_work_queue().enqueue(ISSUE_EVENT_KIND, payload, dedupe_key=request.headers.get("Linear-Delivery"))
+    return JSONResponse(status_code=202, content={"queued": message_id is not None, "message_id": message_id})
+
+@app.get("/queue/stats")
+def get_queue_stats():
+    return get_work_queue().stats()
+
+@app.get("/queue/dead")
+def get_dead_letters(limit: int = 50):
+    return get_work_queue().dead_letters(limit)
+
+@app.post("/queue/dead/{message_id}/requeue")
+def requeue_dead_letter(message_id: int):
+    if not get_work_queue().requeue(message_id):
+        raise HTTPException(status_code=404, detail=f"No dead letter {message_id}")
+    return {"requeued": message_id}
+
+@app.get("/linear/teams")
+async def get_linear_teams():
+    api = AsyncLinearAPI()
+    return await api.get_teams()
+
+@app.get("/linear/team_members")
+async def get_linear_team_members(team_key: str = Query(...)):
+    api = AsyncLinearAPI()
+    team = await api.get_team_id_by_key(team_key)
     if not team:
         return []
-    # Fetch members of the team
-    query_members = f"""
-    query {{
-      team(id: \"{team['id']}\") {{
-        members {{
-          nodes {{
-            id
-            name
-            email
-          }}
-        }}
-      }}
-    }}
-    """
-    members_response = api._LinearAPI__raw_query(query_members)
-    return members_response.get("data", {}).get("team", {}).get("members", {}).get("nodes", [])
+    return await api.get_team_members(team["id"])
 
 @app.get("/linear/labels")
-def get_linear_labels():
-    api = LinearAPI()
-    return api.get_labels()
+async def get_linear_labels(name: Optional[str] = None):
+    api = AsyncLinearAPI()
+    if name:
+        label = await api.get_label_by_name(name)
+        return [label] if label else []
+    return await api.get_labels()
+
+@app.get("/linear/payloads")
+def get_linear_payload_stats():
+    # Calls, request document bytes and response bytes per GraphQL operation since startup
+    return payload_stats.snapshot()
+
+@app.get("/linear/cache")
+def get_linear_cache_stats():
+    return get_metadata_cache().stats()
+
+@app.delete("/linear/cache")
+def invalidate_linear_cache(entity: Optional[str] = None, key: Optional[str] = None):
+    get_metadata_cache().invalidate(entity, key)
+    return {"invalidated": True, "entity": entity, "key": key}
+
+@app.get("/llm/cache")
+def get_llm_cache_stats():
+    return get_llm_cache().stats()
+
+@app.delete("/llm/cache")
+def clear_llm_cache():
+    get_llm_cache().clear()
+    return {"cleared": True}
+
+@app.get("/llm/usage")
+def get_llm_usage():
+    # Tokens and estimated cost since startup, by model, agent and stage
+    return get_usage_tracker().summary()
+
+@app.get("/llm/usage/{correlation_id}")
+def get_llm_usage_for(correlation_id: str):
+    usage = get_usage_tracker().summary(correlation_id)
+    if usage is None:
+        raise HTTPException(status_code=404, detail="No LLM usage recorded for this id")
+    return usage
+
+@app.get("/llm/routes")
+def get_llm_routes():
+    # Model, fallback and timeout of each task route, with its latency percentiles and fallback counts
+    return route_stats()
+
+@app.get("/idempotency")
+def get_idempotency_stats():
+    return get_idempotency_store().stats()
+
+@app.delete("/idempotency")
+def clear_idempotency_store():
+    get_idempotency_store().clear()
+    return {"cleared": True}
+
+@app.get("/repo/index")
+def get_repo_index_stats():
+    # Indexed branches with their commit, and the stored file and summary counts
+    return get_repo_index().stats()
+
+@app.delete("/repo/index")
+def clear_repo_index():
+    get_repo_index().clear()
+    return {"cleared": True}
+
+@app.get("/agents/clarity/stats")
+def get_clarity_stats():
+    return clarity_checker.get_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/traces/{correlation_id}")
+def get_trace(correlation_id: str):
+    # correlation_id is a request's X-Request-ID or a background job id
+    spans = metrics.traces.get(correlation_id)
+    if spans is None:
+        raise HTTPException(status_code=404, detail="No trace recorded for this id")
+    return {"correlation_id": correlation_id, "spans": spans}
+
+@app.get("/network/stats")
+def get_network_stats():
+    # Per-service call/retry counts and circuit breaker state
+    return get_service_stats()
@@ -0,0 +1,55 @@
+from __future__ import annotations
+import json
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from server.agents.base_agent import SUFFICIENT_COMMENT
+from server.agents.batch_analysis import BATCH_ANALYZE_TICKETS_PROMPT, analyze_tickets_batch, chunk_by_token_budget
+from server.utils.llm_usage import estimate_tokens
+
+
+def ticket(n: int, words: int = 20) -> dict:
+    return {"title": f"Ticket {n}", "description": " ".join(["word"] * words)}
+
+
+def test_chunks_stay_within_the_budget_and_keep_the_order():
+    tickets = [ticket(n) for n in range(6)]
+    overhead = estimate_tokens(BATCH_ANALYZE_TICKETS_PROMPT)
+
+    chunks = chunk_by_token_budget(tickets, overhead + 60)
+
+    assert len(chunks) > 1
+    assert [index for chunk in chunks for index, _ in chunk] == list(range(6))
+    assert chunk_by_token_budget(tickets, 10**6) == [list(enumerate(tickets))]
+    # A ticket larger than the budget on its own still gets a chunk
+    assert chunk_by_token_budget([ticket(0, words=500), ticket(1)], overhead + 60) == [[(0, ticket(0, words=500))], [(1, ticket(1))]]
+
+
+def test_verdicts_map_to_analyses_and_unanswered_tickets_fall_back():
+    verdicts = [
+        {"index": 0, "sufficient": True, "question": ""},
+        {"index": 1, "sufficient": False, "question": "  Which login providers?  "},
+        # Not sufficient but no question: the agent analyzes it itself
+        {"index": 2, "sufficient": False, "question": ""},
+    ]
+    llm = FakeListChatModel(responses=[json.dumps(verdicts)])
+
+    results = analyze_tickets_batch([ticket(n) for n in range(4)], llm=llm, use_cache=False)
+
+    assert results == [
+        {"sufficient": True, "comment": SUFFICIENT_COMMENT},
+        {"sufficient": False, "comment": "Which login providers?"},
+        None,
+        None,
+    ]
+
+
+def test_a_failed_chunk_leaves_only_its_tickets_to_the_agents():
+    overhead = estimate_tokens(BATCH_ANALYZE_TICKETS_PROMPT)
+    # First chunk: an unusable reply and an unusable repair; second chunk: a verdict
+    llm = FakeListChatModel(responses=["no idea", "still no idea", json.dumps([{"index": 1, "sufficient": True, "question": ""}])])
+
+    results = analyze_tickets_batch([ticket(0, words=200), ticket(1, words=200)], llm=llm, token_budget=overhead + 100, use_cache=False)
+
+    assert results == [None, {"sufficient": True, "comment": SUFFICIENT_COMMENT}]
@@ -0,0 +1,60 @@
+from __future__ import annotations
+import pytest
+
+from server.utils.cassette import (
+    MODE_RECORD,
+    MODE_REPLAY,
+    Cassette,
+    CassetteMiss,
+    RecordedError,
+    RecordedResponse,
+    http_request,
+)
+
+def record(path, service, request, response=None, error=None):
+    cassette = Cassette(str(path), MODE_RECORD)
+
+    def perform():
+        if error:
+            raise error
+        return response
+    if error is None:
+        return cassette.play(service, request, perform)
+    # Recording re-raises the upstream error after storing it
+    with pytest.raises(type(error)):
+        cassette.play(service, request, perform)
+
+def test_replays_recorded_responses_in_order(tmp_path):
+    path = tmp_path / "c.jsonl"
+    request = http_request("POST", "https://api.linear.app/graphql", {"query": "q"})
+    record(path, "linear", request, RecordedResponse(200, {"X-Test": "1"}, '{"n": 1}'))
+    record(path, "linear", request, RecordedResponse(200, {}, '{"n": 2}'))
+
+    replay = Cassette(str(path), MODE_REPLAY, speed=0)
+    # Matched on the path only, so another host replays the same cassette
+    other_host = http_request("POST", "http://127.0.0.1:9/graphql", {"query": "q"})
+    first = replay.play("linear", other_host, lambda: pytest.fail("replay must not call upstream"))
+    assert first.json() == {"n": 1}
+    assert first.headers["x-test"] == "1"
+    assert replay.play("linear", other_host, None).json() == {"n": 2}
+    # Once exhausted, the last recording is reused
+    assert replay.play("linear", other_host, None).json() == {"n": 2}
+
+def test_recorded_errors_and_misses(tmp_path):
+    path = tmp_path / "c.jsonl"
+    record(path, "linear", http_request("POST", "/graphql", {"query": "down"}), error=ConnectionError("refused"))
+    replay = Cassette(str(path), MODE_REPLAY, speed=0)
+    with pytest.raises(RecordedError):
+        replay.play("linear", http_request("POST", "/graphql", {"query": "down"}), None)
+    with pytest.raises(CassetteMiss):
+        replay.play("llm", {"messages": [["human", "never recorded"]]}, None)
+
+def test_falls_back_to_closest_request_on_same_endpoint(tmp_path):
+    path = tmp_path / "c.jsonl"
+    recorded = http_request("POST", "/repos/o/r/git/commits", {"message": "feat(X-1)", "tree": "aaa"})
+    record(path, "github", recorded, RecordedResponse(201, {}, '{"sha": "c1"}'))
+    replay = Cassette(str(path), MODE_REPLAY, speed=0)
+    # The tree SHA came from a response replayed out of order
+    drifted = http_request("POST", "/repos/o/r/git/commits", {"message": "feat(X-1)", "tree": "bbb"})
+    assert replay.play("github", drifted, None).json() == {"sha": "c1"}
+    assert replay.stats["fuzzy"] == 1
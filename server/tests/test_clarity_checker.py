@@ -61,4 +61,77 @@ def test_missing_acceptance_criteria():
     }
     is_clear, missing = clarity_checker.analyze(ticket)
     assert not is_clear
-    assert any("criterio de aceptación" in m.lower() for m in missing)
\ No newline at end of file
+    assert any("criterio de aceptación" in m.lower() for m in missing)
+def test_generated_label_is_used_when_the_issue_has_no_labels():
+    ticket = {
+        "title": "Nueva API para login de usuarios",
+        "description": "Implementar endpoint RESTful para permitir login usando JWT. AC: Usuario puede iniciar sesión.",
+        "labels": {"nodes": []},
+        "label": "Backend",
+    }
+    assert clarity_checker.analyze(ticket) == (True, [])
+
+UNCLEAR = {"id": "issue-2", "identifier": "ENG-2", "title": "Login", "description": "Hacer login.", "label": "backend"}
+CLEAR = {
+    "id": "issue-1",
+    "identifier": "ENG-1",
+    "title": "Nueva API para login de usuarios",
+    "description": "Implementar endpoint RESTful para permitir login usando JWT. AC: Usuario puede iniciar sesión.",
+    "label": "backend",
+}
+
+def test_prefilter_rejects_unclear_tickets_and_counts_the_saved_calls():
+    before = clarity_checker.get_stats()
+
+    assert clarity_checker.prefilter(CLEAR) is None
+    analysis = clarity_checker.prefilter(UNCLEAR)
+
+    assert analysis["sufficient"] is False
+    assert analysis["comment"].startswith("Antes de empezar")
+    assert "- Falta el criterio de aceptación (por ejemplo introducido con 'AC:')." in analysis["comment"]
+    after = clarity_checker.get_stats()
+    assert after["checked"] == before["checked"] + 2
+    assert after["rejected"] == before["rejected"] + 1
+    assert after["llm_calls_saved"] == before["llm_calls_saved"] + clarity_checker.LLM_CALLS_PER_ANALYSIS
+
+class RecordingLinear:
+    def __init__(self):
+        self.comments = []
+
+    def add_comment(self, issue_id, body):
+        self.comments.append((issue_id, body))
+
+def test_rejected_tickets_skip_the_llm_analysis():
+    from server.agents.backend_agent import BackendAgent
+
+    agent = BackendAgent.__new__(BackendAgent)
+    agent.agent_type = "BackendAgent"
+    agent.linear_api = RecordingLinear()
+    agent._analyze_ticket_sufficiency = lambda ticket: pytest.fail("the LLM analysis must not run")
+
+    result = agent._process_ticket(UNCLEAR)
+
+    assert result["status"] == "commented"
+    assert agent.linear_api.comments == [("issue-2", result["comment"])]
+
+def test_rejected_tickets_are_left_out_of_the_batch(monkeypatch):
+    from server.agents import orchestrator_agent
+    from server.agents.orchestrator_agent import OrchestratorAgent
+
+    batched = []
+
+    def analyze_tickets_batch(issues):
+        batched.extend(issues)
+        return [{"sufficient": True, "comment": "ok"} for _ in issues]
+
+    monkeypatch.setattr(orchestrator_agent, "analyze_tickets_batch", analyze_tickets_batch)
+    monkeypatch.setattr(orchestrator_agent, "get_agent", lambda label: object() if label == "backend" else None)
+    tickets = [CLEAR, UNCLEAR, {**CLEAR, "label": "design"}]
+    creations = [{"success": True, "issue": ticket} for ticket in tickets]
+
+    analyses = OrchestratorAgent.__new__(OrchestratorAgent)._analyze_created_tickets(tickets, creations)
+
+    assert batched == [CLEAR]
+    assert analyses[0] == {"sufficient": True, "comment": "ok"}
+    assert analyses[1]["sufficient"] is False and analyses[1]["comment"].startswith("Antes de empezar")
+    assert analyses[2] is None
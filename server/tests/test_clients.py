@@ -0,0 +1,63 @@
+from __future__ import annotations
+import threading
+import time
+
+import pytest
+
+from server.agents import registry
+from server.utils.clients import Registry
+
+
+def test_instances_are_built_once_even_under_concurrent_first_use():
+    clients = Registry()
+    built = []
+
+    def factory():
+        time.sleep(0.05)
+        built.append(object())
+        return built[-1]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(clients.get("linear_api", factory))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1 and all(result is built[0] for result in results)
+
+
+def test_failed_factories_are_retried_and_reset_rebuilds():
+    clients = Registry()
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ValueError("GITHUB_TOKEN and GITHUB_REPO environment variables must be set.")
+        return object()
+
+    with pytest.raises(ValueError):
+        clients.get("github_api", flaky)
+    first = clients.get("github_api", flaky)
+    assert clients.get("github_api", flaky) is first
+
+    other = clients.get("llm:classify", object)
+    clients.reset("github_api")
+    assert clients.get("github_api", flaky) is not first
+    assert clients.get("llm:classify", object) is other
+    clients.reset()
+    assert clients.get("llm:classify", object) is not other
+
+
+class FakeAgent:
+    pass
+
+
+def test_one_agent_per_label(monkeypatch):
+    monkeypatch.setattr(registry, "agents", Registry())
+    monkeypatch.setattr(registry, "AGENT_CLASSES", {"backend": FakeAgent})
+
+    agent = registry.get_agent("Backend")
+    assert isinstance(agent, FakeAgent) and registry.get_agent("backend") is agent
+    assert registry.get_agent("design") is None and registry.get_agent(None) is None
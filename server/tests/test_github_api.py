@@ -0,0 +1,94 @@
+from __future__ import annotations
+import threading
+from types import SimpleNamespace
+
+import pytest
+from github import GithubException
+
+from server.utils import idempotency
+from server.utils.github_api import GitHubAPI
+from server.utils.idempotency import IdempotencyStore
+
+
+class FakeRepo:
+    def __init__(self):
+        self.calls = []
+        self.trees = []
+        self.refs = {"heads/main": "base-sha"}
+        self.fail_pull = False
+
+    def get_git_ref(self, ref):
+        self.calls.append("get_git_ref")
+        return SimpleNamespace(object=SimpleNamespace(sha=self.refs[ref]), edit=lambda sha, force: self.refs.update({ref: sha}))
+
+    def get_git_commit(self, sha):
+        self.calls.append("get_git_commit")
+        return SimpleNamespace(sha=sha, tree=SimpleNamespace(sha="base-tree"))
+
+    def create_git_tree(self, elements, base_tree):
+        self.calls.append("create_git_tree")
+        self.trees.append({element._identity["path"]: element._identity["content"] for element in elements})
+        return SimpleNamespace(sha="tree-sha")
+
+    def create_git_commit(self, message, tree, parents):
+        self.calls.append("create_git_commit")
+        return SimpleNamespace(sha=f"commit-{len(self.trees)}")
+
+    def create_git_ref(self, ref, sha):
+        self.calls.append("create_git_ref")
+        name = ref.removeprefix("refs/")
+        if name in self.refs:
+            raise GithubException(422, {"message": "Reference already exists"}, None)
+        self.refs[name] = sha
+
+    def create_pull(self, title, body, head, base):
+        self.calls.append("create_pull")
+        if self.fail_pull:
+            raise GithubException(422, {"message": "A pull request already exists"}, None)
+        return SimpleNamespace(html_url=f"https://github.com/acme/app/pull/{len(self.trees)}")
+
+
+@pytest.fixture
+def github(tmp_path, monkeypatch):
+    monkeypatch.setattr(idempotency, "_store", IdempotencyStore(str(tmp_path / "idempotency.sqlite3")))
+    github = GitHubAPI.__new__(GitHubAPI)
+    github.repo = FakeRepo()
+    github.repo_name = "acme/app"
+    github._base_commits = {}
+    github._base_commits_lock = threading.Lock()
+    return github
+
+
+def test_create_pr_files_commits_every_file_once(github):
+    files = {"server/api/auth.py": "def login(): ...\n", "server/tests/test_auth.py": "def test_login(): ...\n"}
+
+    result = github.create_pr_files("ENG-1", "Add login", files)
+
+    assert result == {
+        "success": True,
+        "pr_url": "https://github.com/acme/app/pull/1",
+        "branch": "feature/ENG-1-add-login",
+        "commit_sha": "commit-1",
+        "files": list(files),
+    }
+    assert github.repo.trees == [files]
+    # A repeat is served by the idempotency store, and the base head is cached
+    assert github.create_pr_files("ENG-1", "Add login", files) == result
+    assert github.create_pr_files("ENG-2", "Add logout", {"a.py": "x = 1\n"})["success"]
+    assert github.repo.calls.count("create_pull") == 2
+    assert github.repo.calls.count("get_git_ref") == 1
+    assert github.repo.refs["heads/feature/ENG-1-add-login"] == "commit-1"
+
+
+def test_create_pr_files_reports_errors_and_drops_the_base_head(github):
+    assert github.create_pr_files("ENG-1", "Add login", {}) == {"success": False, "error": "No files to commit."}
+
+    github.repo.fail_pull = True
+    result = github.create_pr_files("ENG-1", "Add login", {"a.py": "x = 1\n"})
+    assert result == {"success": False, "error": "GitHub API error: A pull request already exists"}
+    assert github._base_commits == {}
+
+    # Failures are not stored: the retry moves the branch the failed attempt created and opens the PR
+    github.repo.fail_pull = False
+    assert github.create_pr_files("ENG-1", "Add login", {"a.py": "x = 1\n"})["success"]
+    assert github.repo.refs["heads/feature/ENG-1-add-login"] == "commit-2"
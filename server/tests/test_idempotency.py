@@ -0,0 +1,86 @@
+from __future__ import annotations
+import uuid
+
+import pytest
+
+from server.utils import idempotency
+from server.utils.idempotency import IdempotencyStore, deterministic_uuid, idempotency_key
+from server.utils.linear_api import LinearAPI
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+        self.text = str(body)
+
+    def json(self):
+        return self.body
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = IdempotencyStore(str(tmp_path / "idempotency.sqlite3"))
+    monkeypatch.setattr(idempotency, "_store", store)
+    return store
+
+def test_run_stores_only_successful_results(store):
+    calls = []
+
+    def create():
+        calls.append(1)
+        return {"success": len(calls) > 1, "n": len(calls)}
+
+    key = idempotency_key("job-1", "ticket title")
+    assert store.run("scope", key, create, should_store=lambda r: r["success"]) == {"success": False, "n": 1}
+    assert store.run("scope", key, create, should_store=lambda r: r["success"]) == {"success": True, "n": 2}
+    assert store.run("scope", key, create, should_store=lambda r: r["success"]) == {"success": True, "n": 2}
+    assert len(calls) == 2
+    assert store.get("other-scope", key) is None
+
+def test_deterministic_uuid_is_a_stable_v4_uuid():
+    issue_id = deterministic_uuid("key")
+    assert issue_id == deterministic_uuid("key") != deterministic_uuid("other")
+    assert uuid.UUID(issue_id).version == 4
+
+def test_create_ticket_recovers_an_issue_created_by_a_lost_attempt(store):
+    api = LinearAPI.__new__(LinearAPI)
+    key = idempotency_key("job-1", 0, "Login page")
+    operation = api._create_ticket_op("team-1", "Login page", "Build it", idempotency_key=key)
+    payload = next(operation)
+    assert payload["variables"]["input"]["id"] == deterministic_uuid(key)
+    # The first attempt created the issue but its response was lost, so the retry is refused
+    lookup = operation.send(FakeResponse({"data": {"issueCreate": None}, "errors": [{"message": "Entity already exists"}]}))
+    assert lookup["variables"] == {"id": deterministic_uuid(key)}
+    issue = {"id": deterministic_uuid(key), "identifier": "ENG-1"}
+    with pytest.raises(StopIteration) as stop:
+        operation.send(FakeResponse({"data": {"issue": issue}}))
+    assert stop.value.value == {"success": True, "issue": issue}
+
+    # Repeats are answered from the store without a request
+    with pytest.raises(StopIteration) as stop:
+        next(api._create_ticket_op("team-1", "Login page", "Build it", idempotency_key=key))
+    assert stop.value.value["issue"]["identifier"] == "ENG-1"
+
+class FailingChain:
+    def run(self, **inputs):
+        raise TimeoutError("model timed out")
+
+class RecordingLinear:
+    def __init__(self):
+        self.comments = []
+
+    def add_comment(self, issue_id, body):
+        self.comments.append(body)
+
+def test_failed_sufficiency_analysis_is_retried(store, monkeypatch):
+    from server.agents.backend_agent import BackendAgent
+
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "false")
+    agent = BackendAgent.__new__(BackendAgent)
+    agent.agent_type = "BackendAgent"
+    agent.linear_api = RecordingLinear()
+    agent.analysis_chain = FailingChain()
+    ticket = {"id": "issue-1", "identifier": "ENG-1", "title": "Add login", "description": "Email login. AC: users can log in", "labels": {"nodes": [{"name": "backend"}]}}
+
+    assert agent.process_ticket(ticket)["status"] == "error"
+    # Not stored as final: the redelivery analyzes the ticket again, without commenting each time
+    assert agent.process_ticket(ticket)["status"] == "error"
+    assert len(agent.linear_api.comments) <= 1
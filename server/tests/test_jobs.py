@@ -0,0 +1,61 @@
+from __future__ import annotations
+import json
+
+import pytest
+
+from server.utils.jobs import JOB_COMPLETED, JOB_FAILED, JobManager
+
+
+def wait(job, timeout=5.0):
+    import time
+
+    deadline = time.monotonic() + timeout
+    while not job.done and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert job.done
+
+
+def test_jobs_publish_progress_and_keep_their_outcome():
+    manager = JobManager(max_workers=1)
+
+    def work(job, n):
+        job.publish("ticket_result", {"index": 0})
+        return {"n": n}
+
+    def broken(job):
+        raise RuntimeError("boom")
+
+    ok, failed = manager.submit("ok", work, 3), manager.submit("broken", broken)
+    wait(ok)
+    wait(failed)
+    manager.shutdown()
+
+    assert ok.status == JOB_COMPLETED and ok.result == {"n": 3}
+    assert [event["event"] for event in ok.events_after()] == ["status", "status", "ticket_result", "done"]
+    assert [event["id"] for event in ok.events_after(2)] == [3, 4]
+    assert failed.status == JOB_FAILED and failed.error == "boom"
+    assert failed.events_after(2)[-1]["data"] == {"status": JOB_FAILED, "error": "boom"}
+    assert manager.get(ok.id) is ok and manager.get("missing") is None
+
+
+def _event_ids(body: str) -> list[int]:
+    return [int(line[len("id: "):]) for line in body.splitlines() if line.startswith("id: ")]
+
+
+@pytest.mark.parametrize("last_event_id, expected", [(None, [1, 2, 3, 4]), ("2", [3, 4]), ("not-a-number", [1, 2, 3, 4]), ("-1", [1, 2, 3, 4])])
+def test_event_stream_resumes_after_last_event_id(monkeypatch, last_event_id, expected):
+    from fastapi.testclient import TestClient
+
+    from server import main
+
+    manager = JobManager(max_workers=1)
+    monkeypatch.setattr(main, "get_job_manager", lambda: manager)
+    job = manager.submit("ok", lambda job: job.publish("ticket_result", {"index": 0}))
+    wait(job)
+
+    headers = {"Last-Event-ID": last_event_id} if last_event_id else {}
+    response = TestClient(main.app).get(f"/api/jobs/{job.id}/events", headers=headers)
+
+    assert response.status_code == 200
+    assert _event_ids(response.text) == expected
+    assert json.loads(response.text.rstrip().splitlines()[-1][len("data: "):])["status"] == JOB_COMPLETED
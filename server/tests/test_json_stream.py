@@ -0,0 +1,36 @@
+from __future__ import annotations
+import json
+import pytest
+
+from server.utils.json_stream import JSONArrayStreamParser, iter_json_array
+
+TICKETS = [
+    {"titulo": "Login [API]", "descripcion": "Uses \"JWT\" tokens, e.g. {\"sub\": 1}.", "label": "backend"},
+    {"titulo": "Login page", "descripcion": "Form with ] and } in text", "label": "frontend"},
+]
+
+def test_emits_each_object_as_soon_as_it_closes():
+    text = json.dumps(TICKETS)
+    parser = JSONArrayStreamParser()
+    first_end = text.index("}, {") + 1
+    assert parser.feed(text[:first_end - 1]) == []
+    assert parser.feed(text[first_end - 1:first_end]) == [TICKETS[0]]
+    assert parser.feed(text[first_end:]) == [TICKETS[1]]
+    assert parser.done
+
+def test_character_by_character_stream():
+    text = json.dumps(TICKETS, indent=2)
+    assert list(iter_json_array(iter(text))) == TICKETS
+
+def test_skips_prose_and_code_fences():
+    text = "Here are the tickets:\n```json\n" + json.dumps(TICKETS) + "\n```\nLet me know [if] you need more."
+    chunks = [text[i:i + 7] for i in range(0, len(text), 7)]
+    assert list(iter_json_array(chunks)) == TICKETS
+
+def test_nested_arrays_inside_elements():
+    tickets = [{"titulo": "A", "subtasks": [["x", "y"], []], "label": "backend"}]
+    assert list(iter_json_array([json.dumps(tickets)])) == tickets
+
+def test_malformed_element_is_dropped():
+    text = '[{"titulo": "ok"}, {"titulo": bad}, {"titulo": "also ok"}]'
+    assert list(iter_json_array([text])) == [{"titulo": "ok"}, {"titulo": "also ok"}]
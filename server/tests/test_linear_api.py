@@ -0,0 +1,198 @@
+from __future__ import annotations
+import asyncio
+import threading
+
+import pytest
+
+from server.utils.linear_api import AsyncLinearAPI, LinearAPI
+from server.utils.metadata_cache import LRUBackend, MetadataCache
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+        self.text = str(body)
+
+    def json(self):
+        return self.body
+
+
+def drive(operation, *bodies):
+    """
+    Runs a sans-IO operation, answering its requests with `bodies` in order.
+    Returns (the payloads it sent, its result).
+    """
+    payloads = [next(operation)]
+    try:
+        for body in bodies:
+            payloads.append(operation.send(FakeResponse(body)))
+    except StopIteration as stop:
+        return payloads, stop.value
+    pytest.fail(f"operation sent more requests than expected: {payloads[-1]}")
+
+
+def ticket(n):
+    return {"team_id": "team-1", "title": f"Ticket {n}", "description": "AC: works", "label_ids": ["label-1"]}
+
+
+def test_bulk_create_sends_one_aliased_mutation_per_chunk():
+    api = LinearAPI.__new__(LinearAPI)
+    issues = [{"id": f"issue-{n}", "identifier": f"ENG-{n}"} for n in range(3)]
+
+    payloads, results = drive(
+        api._create_tickets_bulk_op([ticket(n) for n in range(3)], chunk_size=2),
+        {"data": {"t0": {"success": True, "issue": issues[0]}, "t1": {"success": True, "issue": issues[1]}}},
+        {"data": {"t0": {"success": True, "issue": issues[2]}}},
+    )
+
+    assert len(payloads) == 2
+    assert payloads[0]["query"].count("issueCreate(") == 2 and payloads[1]["query"].count("issueCreate(") == 1
+    assert payloads[0]["variables"]["input1"]["title"] == "Ticket 1"
+    assert payloads[1]["variables"]["input0"]["labelIds"] == ["label-1"]
+    assert [result["issue"]["identifier"] for result in results] == ["ENG-0", "ENG-1", "ENG-2"]
+
+
+def test_bulk_create_maps_errors_to_their_ticket():
+    api = LinearAPI.__new__(LinearAPI)
+    issue = {"id": "issue-0", "identifier": "ENG-0"}
+
+    _, results = drive(
+        api._create_tickets_bulk_op([ticket(n) for n in range(3)], chunk_size=3),
+        {
+            "data": {"t0": {"success": True, "issue": issue}, "t1": None, "t2": {"success": False}},
+            "errors": [{"message": "Title is too long", "path": ["t1"]}],
+        },
+    )
+
+    assert results[0] == {"success": True, "issue": issue}
+    assert results[1] == {"success": False, "error": "Title is too long"}
+    assert results[2] == {"success": False, "error": "issueCreate did not succeed"}
+
+    # A response that can't be read fails every ticket of its chunk
+    _, results = drive(api._create_tickets_bulk_op([ticket(0), ticket(1)], chunk_size=2), "<html>Bad gateway</html>")
+    assert [result["success"] for result in results] == [False, False]
+
+
+
+def page(path, nodes, end_cursor=None):
+    connection = {"nodes": nodes, "pageInfo": {"hasNextPage": end_cursor is not None, "endCursor": end_cursor}}
+    for key in reversed(path):
+        connection = {key: connection}
+    return {"data": connection}
+
+
+def answer(operation, pages, requests, payload=None):
+    """
+    Runs one page operation, answering it with the page for its `after` cursor.
+    """
+    payload = payload or next(operation)
+    requests.append(payload["variables"])
+    try:
+        operation.send(FakeResponse(pages[payload["variables"]["after"]]))
+    except StopIteration as stop:
+        return stop.value
+
+
+def paged_api(pages):
+    api = LinearAPI.__new__(LinearAPI)
+    api.page_size = 50
+    api.cache = MetadataCache(LRUBackend())
+    api.requests = []
+    api.next_page_fetched = threading.Event()
+
+    def execute(operation):
+        result = answer(operation, pages, api.requests)
+        if len(api.requests) > 1:
+            api.next_page_fetched.set()
+        return result
+    api._execute = execute
+    return api
+
+
+MEMBERS = {
+    None: page(("team", "members"), [{"id": "u1"}, {"id": "u2"}], end_cursor="c1"),
+    "c1": page(("team", "members"), [{"id": "u3"}]),
+}
+
+
+def test_iterators_follow_the_end_cursor_with_the_requested_page_size():
+    api = paged_api(MEMBERS)
+
+    assert list(api.iter_team_members("team-1", page_size=2, prefetch=False)) == [{"id": "u1"}, {"id": "u2"}, {"id": "u3"}]
+    assert api.requests == [{"id": "team-1", "first": 2, "after": None}, {"id": "team-1", "first": 2, "after": "c1"}]
+    # The cached lookup is built on the same iterator, with the client's page size
+    assert api.get_team_members("team-1") == [{"id": "u1"}, {"id": "u2"}, {"id": "u3"}]
+    assert api.requests[-1]["first"] == 50
+
+
+def test_next_page_is_prefetched_while_the_current_one_is_consumed():
+    api = paged_api(MEMBERS)
+    members = api.iter_team_members("team-1")
+
+    assert next(members) == {"id": "u1"}
+    # Only the first node was consumed, yet the second page is fetched
+    assert api.next_page_fetched.wait(5)
+    assert [request["after"] for request in api.requests] == [None, "c1"]
+    assert list(members) == [{"id": "u2"}, {"id": "u3"}]
+
+
+@pytest.mark.parametrize("failed_page", [
+    {"errors": [{"message": "Internal error"}]},
+    "<html>Bad gateway</html>",
+])
+def test_a_failed_page_raises_and_nothing_is_cached(failed_page):
+    api = paged_api({None: page(("issueLabels",), [{"id": "l1"}], end_cursor="c1"), "c1": failed_page})
+
+    with pytest.raises((ValueError, AttributeError)):
+        list(api.iter_labels(prefetch=False))
+    with pytest.raises((ValueError, AttributeError)):
+        api.get_labels()
+    assert api.cache.get("labels", "", None) is None
+
+
+def test_async_prefetch_is_cancelled_when_the_consumer_stops_early():
+    api = AsyncLinearAPI.__new__(AsyncLinearAPI)
+    api.page_size = 2
+    requests, cancelled = [], []
+
+    async def execute(operation):
+        payload = next(operation)
+        if payload["variables"]["after"] is not None:
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.append(payload["variables"]["after"])
+                raise
+        return answer(operation, MEMBERS, requests, payload)
+    api._execute = execute
+
+    async def consume():
+        members = api.iter_team_members("team-1")
+        async for member in members:
+            # Let the prefetch start before stopping
+            await asyncio.sleep(0)
+            break
+        await members.aclose()
+        await asyncio.sleep(0)
+        return member
+
+    assert asyncio.run(consume()) == {"id": "u1"}
+    assert cancelled == ["c1"]
+
+
+def test_async_requests_carry_the_linear_timeouts(monkeypatch):
+    import httpx
+
+    monkeypatch.setenv("LINEAR_CONNECT_TIMEOUT", "2")
+    monkeypatch.setenv("LINEAR_READ_TIMEOUT", "7")
+    posts = []
+
+    class InjectedClient:
+        async def post(self, url, **kwargs):
+            posts.append(kwargs)
+            return httpx.Response(200, json={"data": {}})
+
+    api = AsyncLinearAPI(client=InjectedClient(), cache=MetadataCache(LRUBackend()))
+    asyncio.run(api._safe_post(api.api_url, json={"query": "q"}))
+
+    assert posts[0]["timeout"] == httpx.Timeout(7, connect=2)
@@ -0,0 +1,46 @@
+from __future__ import annotations
+import pytest
+
+from server.agents.orchestrator_agent import OrchestratorAgent
+from server.utils.linear_queries import bulk_issue_create, minify, operation_name, queries
+
+
+def test_minify_keeps_names_apart_and_strings_intact():
+    document = """
+    query LabelByName($name: String!) {
+      issueLabels(filter: {name: {eq: "needs  triage"}}, first: 1) { nodes { id name } }
+    }
+    """
+    assert minify(document) == 'query LabelByName($name:String!){issueLabels(filter:{name:{eq:"needs  triage"}},first:1){nodes{id name}}}'
+    assert operation_name(minify(document)) == "LabelByName"
+
+
+def test_profiles_select_fewer_fields():
+    minimal = queries.document("IssueCreate", "minimal")
+    standard = queries.document("IssueCreate", "standard")
+    assert minimal.endswith("issue{id identifier url}}}")
+    assert "description" in standard and len(minimal) < len(standard)
+    # Comments are only fetched on request
+    assert "comments" not in queries.document("IssueById")
+    assert "comments" in queries.document("IssueById", "full")
+    assert bulk_issue_create(2, "minimal").count("issueCreate(") == 2
+    with pytest.raises(ValueError):
+        queries.document("IssueById", "everything")
+
+
+def test_minimal_creation_is_completed_from_the_local_ticket():
+    ticket = {"titulo": "Add login", "descripcion": "AC: works", "label": "Backend"}
+    ticket_input = {"title": "Add login", "description": "AC: works", "label_ids": ["label-1"], "assignee_id": "user-1"}
+    creation = {"success": True, "issue": {"id": "issue-1", "identifier": "ENG-1", "url": "https://linear.app/ENG-1"}}
+
+    issue = OrchestratorAgent._with_local_fields(creation, ticket_input, ticket)["issue"]
+
+    assert issue["identifier"] == "ENG-1"
+    assert issue["description"] == "AC: works"
+    assert issue["labels"] == {"nodes": [{"id": "label-1", "name": "backend"}]}
+    assert issue["assignee"] == {"id": "user-1"}
+    assert OrchestratorAgent._with_local_fields({"success": False, "error": "boom"}, ticket_input, ticket) == {"success": False, "error": "boom"}
+
+    # Without a matching label in the workspace the local label still routes the ticket
+    unlabeled = OrchestratorAgent._with_local_fields(creation, {**ticket_input, "label_ids": []}, ticket)["issue"]
+    assert unlabeled["labels"] == {"nodes": [{"name": "backend"}]}
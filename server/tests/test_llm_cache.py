@@ -0,0 +1,71 @@
+from __future__ import annotations
+import pytest
+
+from server.utils.llm_cache import LLMResponseCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_key_depends_on_model_template_and_inputs():
+    key = LLMResponseCache.make_key("gpt-4o-mini@0", "T {description}", {"description": "a"})
+    assert key == LLMResponseCache.make_key("gpt-4o-mini@0", "T {description}", {"description": "a"})
+    assert key != LLMResponseCache.make_key("gpt-4o@0", "T {description}", {"description": "a"})
+    assert key != LLMResponseCache.make_key("gpt-4o-mini@0", "U {description}", {"description": "a"})
+    assert key != LLMResponseCache.make_key("gpt-4o-mini@0", "T {description}", {"description": "b"})
+
+def test_hit_and_miss_counters(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"))
+    assert cache.get("k") is None
+    cache.set("k", "true")
+    assert cache.get("k") == "true"
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+    assert stats["entries"] == 1
+
+def test_entries_expire_after_ttl(tmp_path):
+    clock = FakeClock()
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"), ttl_seconds=60, clock=clock)
+    cache.set("k", "value")
+    clock.now += 61
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+def test_size_based_lru_eviction(tmp_path):
+    clock = FakeClock()
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"), max_bytes=10, clock=clock)
+    cache.set("a", "aaaa")
+    clock.now += 1
+    cache.set("b", "bbbb")
+    clock.now += 1
+    assert cache.get("a") == "aaaa"
+    clock.now += 1
+    cache.set("c", "cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.get("c") == "cccc"
+    assert cache.stats()["bytes"] <= 10
+
+def test_replies_that_fail_validation_are_not_served_again(tmp_path, monkeypatch):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    from server.utils import llm_cache
+    from server.utils.structured_output import TICKETS_SCHEMA, StructuredOutputError, generate_structured
+
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "true")
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"))
+    monkeypatch.setattr(llm_cache, "_cache", cache)
+    ticket = '[{"titulo": "Add login", "descripcion": "AC: users can log in", "label": "backend"}]'
+    # The reply and its repair are both unusable, the retry gets a good reply
+    llm = FakeListChatModel(responses=['[{"titulo": "Add login"}]', "no idea", ticket])
+
+    with pytest.raises(StructuredOutputError):
+        generate_structured(llm, "IDEA: login", TICKETS_SCHEMA, max_repairs=1)
+    assert cache.stats()["entries"] == 0
+    assert generate_structured(llm, "IDEA: login", TICKETS_SCHEMA, max_repairs=1)[0]["titulo"] == "Add login"
+    assert cache.stats()["entries"] == 1
@@ -0,0 +1,86 @@
+from __future__ import annotations
+import time
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from server.utils import llm_router
+from server.utils.llm_router import RoutedChatModel, build_routed_model, get_route_stats, load_route
+
+
+class SlowModel(BaseChatModel):
+    model_name: str
+    delay: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.model_name))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.delay)
+        for part in ("from ", self.model_name):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=part))
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats():
+    llm_router.reset_route_stats()
+    yield
+    llm_router.reset_route_stats()
+
+
+def routed(primary_delay: float, timeout: float = 0.1) -> RoutedChatModel:
+    primary = SlowModel(model_name="big", delay=primary_delay)
+    return RoutedChatModel(route="codegen", model_name="big", primary=primary, fallback=SlowModel(model_name="small"), timeout=timeout)
+
+
+def test_route_config_comes_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_ROUTE_CLASSIFY_MODEL", "gpt-4o")
+    monkeypatch.setenv("LLM_ROUTE_CLASSIFY_FALLBACK", "")
+    monkeypatch.setenv("LLM_ROUTE_CLASSIFY_TIMEOUT", "0")
+    route = load_route("classify")
+    assert (route.model, route.fallback, route.timeout) == ("gpt-4o", None, None)
+    assert load_route("unknown-task").model == llm_router.DEFAULT_ROUTES["default"][0]
+
+    built = build_routed_model("codegen", lambda model, timeout: SlowModel(model_name=model))
+    assert built.model_name == "gpt-4.1"
+    assert built.fallback.model_name == "gpt-4o-mini"
+
+
+def test_slow_primary_falls_back_and_is_counted():
+    assert routed(0).invoke("hi").content == "big"
+    assert routed(0.5).invoke("hi").content == "small"
+
+    summary = get_route_stats("codegen").summary(load_route("codegen"))
+    assert summary["calls"] == 2
+    assert summary["fallbacks"] == summary["timeouts"] == 1
+    # The fallback call is answered well before the slow primary would have been
+    assert summary["latency_ms"]["max"] < 400
+
+
+def test_stream_falls_back_only_before_the_first_chunk():
+    assert "".join(chunk.content for chunk in routed(0.5).stream("hi")) == "from small"
+    assert "".join(chunk.content for chunk in routed(0).stream("hi")) == "from big"
+    assert get_route_stats("codegen").summary(load_route("codegen"))["fallbacks"] == 1
+
+
+def test_fallback_replies_are_not_cached(tmp_path, monkeypatch):
+    from server.utils import langchain_helpers, llm_cache
+    from server.utils.llm_cache import LLMResponseCache
+
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "true")
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"))
+    monkeypatch.setattr(llm_cache, "_cache", cache)
+
+    assert langchain_helpers.predict(routed(0.5), "hi") == "small"
+    assert "".join(langchain_helpers.stream(routed(0.5), "hi")) == "from small"
+    assert cache.stats()["entries"] == 0
+    # Only the primary's reply is stored under its name
+    assert langchain_helpers.predict(routed(0), "hi") == "big"
+    assert langchain_helpers.predict(routed(0.5), "hi") == "big"
@@ -0,0 +1,52 @@
+from __future__ import annotations
+import uuid
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from server.utils.llm_usage import UsageCallbackHandler, UsageTracker, estimate_tokens, usage_scope
+from server.utils.metrics import correlation
+from server.utils.prompt_budget import fit_to_budget, truncate_to_budget
+
+PRICING = {"gpt-4o-mini": (0.15, 0.60)}
+
+def test_records_reported_usage_by_scope_and_correlation_id():
+    handler = UsageCallbackHandler(UsageTracker(PRICING))
+    result = LLMResult(
+        generations=[[ChatGeneration(message=AIMessage(content="true"))]],
+        llm_output={"model_name": "gpt-4o-mini-2024-07-18", "token_usage": {"prompt_tokens": 1_000_000, "completion_tokens": 1000}},
+    )
+    with correlation("job-1"), usage_scope("BackendAgent", "sufficiency_analysis"):
+        handler.on_llm_end(result, run_id=uuid.uuid4())
+    handler.on_llm_end(result, run_id=uuid.uuid4())
+
+    job = handler.tracker.summary("job-1")
+    assert job["calls"] == 1
+    # Dated model versions use the base model's price
+    assert job["cost_usd"] == pytest.approx(0.15 + 0.0006)
+    assert job["by_stage"][0]["agent"] == "BackendAgent"
+    assert job["by_stage"][0]["stage"] == "sufficiency_analysis"
+    assert handler.tracker.summary()["calls"] == 2
+    assert handler.tracker.summary("unknown-job") is None
+
+def test_estimates_usage_when_the_model_reports_none():
+    tracker = UsageTracker(PRICING)
+    llm = FakeListChatModel(responses=["false"], callbacks=[UsageCallbackHandler(tracker)])
+    with usage_scope("FrontendAgent", "clarifying_question"):
+        llm.invoke("Is this ticket clear?")
+    summary = tracker.summary()
+    assert summary["calls"] == summary["estimated_calls"] == 1
+    assert summary["prompt_tokens"] == estimate_tokens("Is this ticket clear?")
+    assert summary["by_stage"][0]["stage"] == "clarifying_question"
+
+def test_truncation_keeps_head_and_tail():
+    text = "Goal: build the login page. " + "filler " * 2000 + "AC: user can log in."
+    cut = truncate_to_budget(text, 100)
+    assert cut.startswith("Goal: build the login page.")
+    assert cut.endswith("AC: user can log in.")
+    assert "tokens truncated" in cut
+    assert estimate_tokens(cut) < 130
+    assert fit_to_budget("short", 100) == "short"
+    assert fit_to_budget(text, 0) == text
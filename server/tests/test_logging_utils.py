@@ -0,0 +1,54 @@
+from __future__ import annotations
+import pytest
+
+from server.utils.logging_utils import AlertDispatcher, lazy, truncate
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def make_dispatcher(clock, **kwargs):
+    dispatcher = AlertDispatcher("https://hooks.example/x", clock=clock, **kwargs)
+    sent = []
+    dispatcher._send = lambda message, extra, suppressed: sent.append((message, suppressed))
+    return dispatcher, sent
+
+def drain(dispatcher):
+    dispatcher.queue.join()
+
+def test_identical_alerts_are_deduplicated_within_window():
+    clock = FakeClock()
+    dispatcher, sent = make_dispatcher(clock, dedup_window=60)
+    assert dispatcher.submit("Linear down")
+    assert not dispatcher.submit("Linear down")
+    assert not dispatcher.submit("Linear down")
+    assert dispatcher.submit("GitHub down")
+    clock.now += 61
+    assert dispatcher.submit("Linear down")
+    drain(dispatcher)
+    assert sent == [("Linear down", 0), ("GitHub down", 0), ("Linear down", 2)]
+    assert dispatcher.stats["deduplicated"] == 2
+
+def test_delivery_is_rate_limited_per_minute():
+    clock = FakeClock()
+    dispatcher, sent = make_dispatcher(clock, dedup_window=0, rate_limit=2)
+    for i in range(5):
+        dispatcher.submit(f"error {i}")
+    drain(dispatcher)
+    assert [m for m, _ in sent] == ["error 0", "error 1"]
+    assert dispatcher.stats["rate_limited"] == 3
+
+def test_truncate_caps_long_payloads():
+    text = truncate("x" * 50, 10)
+    assert text.startswith("x" * 10)
+    assert "40 more chars" in text
+
+def test_lazy_only_evaluates_when_formatted():
+    calls = []
+    value = lazy(lambda: calls.append(1) or "payload", 3)
+    assert calls == []
+    assert str(value).startswith("pay")
+    assert calls == [1]
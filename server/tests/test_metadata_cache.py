@@ -0,0 +1,86 @@
+from __future__ import annotations
+import pytest
+
+from server.utils.metadata_cache import DiskBackend, LRUBackend, MetadataCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_get_or_load_caches_and_counts():
+    cache = MetadataCache(LRUBackend())
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return [{"id": "t1", "key": "CHA"}]
+
+    assert cache.get_or_load("teams", "", loader) == [{"id": "t1", "key": "CHA"}]
+    assert cache.get_or_load("teams", "", loader) == [{"id": "t1", "key": "CHA"}]
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert stats["hits"] == {"teams": 1}
+    assert stats["misses"] == {"teams": 1}
+
+def test_empty_results_are_not_cached():
+    cache = MetadataCache(LRUBackend())
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return []
+
+    cache.get_or_load("labels", "", loader)
+    cache.get_or_load("labels", "", loader)
+    assert len(calls) == 2
+
+def test_per_entity_ttl_expiry():
+    clock = FakeClock()
+    cache = MetadataCache(LRUBackend(), ttls={"user": 10, "labels": 100}, clock=clock)
+    cache.set("user", "a@b.c", {"id": "u1"})
+    cache.set("labels", "", [{"id": "l1"}])
+    clock.now += 11
+    assert cache.get("user", "a@b.c") is None
+    assert cache.get("labels", "") == [{"id": "l1"}]
+
+def test_invalidate_entity_and_key():
+    cache = MetadataCache(LRUBackend())
+    cache.set("team", "CHA", {"id": "t1"})
+    cache.set("team", "ENG", {"id": "t2"})
+    cache.set("labels", "", [{"id": "l1"}])
+    cache.invalidate("team", "CHA")
+    assert cache.get("team", "CHA") is None
+    assert cache.get("team", "ENG") == {"id": "t2"}
+    cache.invalidate("team")
+    assert cache.get("team", "ENG") is None
+    assert cache.get("labels", "") == [{"id": "l1"}]
+    cache.invalidate()
+    assert cache.get("labels", "") is None
+
+def test_lru_evicts_least_recently_used():
+    backend = LRUBackend(max_entries=2)
+    cache = MetadataCache(backend)
+    cache.set("user", "a", {"id": "a"})
+    cache.set("user", "b", {"id": "b"})
+    cache.get("user", "a")
+    cache.set("user", "c", {"id": "c"})
+    assert cache.get("user", "b") is None
+    assert cache.get("user", "a") == {"id": "a"}
+
+def test_lru_returns_copies():
+    cache = MetadataCache(LRUBackend())
+    cache.set("labels", "", [{"id": "l1"}])
+    cache.get("labels", "").append({"id": "l2"})
+    assert cache.get("labels", "") == [{"id": "l1"}]
+
+def test_disk_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first = MetadataCache(DiskBackend(path))
+    second = MetadataCache(DiskBackend(path))
+    first.set("team_members", "t1", [{"id": "u1", "email": "a@b.c"}])
+    assert second.get("team_members", "t1") == [{"id": "u1", "email": "a@b.c"}]
+    second.invalidate("team_members")
+    assert first.get("team_members", "t1") is None
@@ -0,0 +1,42 @@
+from __future__ import annotations
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from server.utils import metrics
+from server.utils.metrics import MetricsRegistry
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_calls_total", "Calls.", ("service",))
+    histogram = registry.histogram("test_latency_seconds", "Latency.", ("stage",), buckets=(0.1, 1))
+    counter.inc(service="linear")
+    counter.inc(2, service="linear")
+    histogram.observe(0.05, stage="llm")
+    histogram.observe(0.5, stage="llm")
+    text = registry.render()
+    assert "# TYPE test_calls_total counter" in text
+    assert 'test_calls_total{service="linear"} 3' in text
+    assert 'test_latency_seconds_bucket{stage="llm",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{stage="llm",le="+Inf"} 2' in text
+    assert 'test_latency_seconds_count{stage="llm"} 2' in text
+
+def test_span_records_trace_and_failures():
+    failures_before = metrics.STAGE_FAILURES.value(stage="test.fails")
+    with metrics.correlation("trace-1"):
+        with metrics.span("test.ok"):
+            pass
+        with pytest.raises(RuntimeError):
+            with metrics.span("test.fails"):
+                raise RuntimeError("boom")
+    spans = metrics.traces.get("trace-1")
+    assert [s["stage"] for s in spans] == ["test.ok", "test.fails"]
+    assert spans[1]["error"]
+    assert metrics.STAGE_FAILURES.value(stage="test.fails") == failures_before + 1
+
+def test_bind_carries_correlation_id_into_threads():
+    with metrics.correlation("trace-2"):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            ids = list(executor.map(metrics.bind(lambda _: metrics.get_correlation_id()), range(3)))
+    assert ids == ["trace-2"] * 3
+    assert metrics.get_correlation_id() is None
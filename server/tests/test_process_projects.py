@@ -0,0 +1,132 @@
+from __future__ import annotations
+import pytest
+
+from server.agents import orchestrator_agent
+from server.agents.orchestrator_agent import OrchestratorAgent
+
+@pytest.fixture
+def agent(monkeypatch):
+    agent = OrchestratorAgent()
+    calls = {"context": 0}
+
+    def resolve(linear_api, team_key=None):
+        calls["context"] += 1
+        return {"team_key": team_key, "team_id": "team-1", "members": [], "label_map": {}}
+
+    def generate(idea):
+        if idea == "broken":
+            raise ValueError("No valid JSON array of tickets could be parsed from the LLM's response.")
+        return [{"titulo": f"{idea} {n}", "descripcion": "", "label": "backend"} for n in range(2)]
+
+    monkeypatch.setattr(orchestrator_agent, "get_linear_api", lambda: None)
+    monkeypatch.setattr(agent, "_resolve_team_context", resolve)
+    monkeypatch.setattr(agent, "generate_tickets_from_idea", generate)
+    monkeypatch.setattr(agent, "_create_and_analyze", lambda api, tickets, context, job_key: ([job_key] * len(tickets), [None] * len(tickets)))
+    monkeypatch.setattr(agent, "_handoff_ticket", lambda ticket, creation, analysis: {"title": ticket["titulo"], "job_key": creation})
+    agent.calls = calls
+    return agent
+
+def test_process_projects_yields_every_idea_and_resolves_context_once(agent):
+    entries = list(agent.process_projects(["a", "broken", "c"], team_key="ENG", idempotency_key="batch-1"))
+
+    assert agent.calls["context"] == 1
+    by_index = {entry["index"]: entry for entry in entries}
+    assert sorted(by_index) == [0, 1, 2]
+    assert [r["title"] for r in by_index[0]["results"]] == ["a 0", "a 1"]
+    # Every idea gets its own idempotency key within the batch
+    assert by_index[2]["results"][0]["job_key"] == "batch-1:2"
+    assert "No valid JSON" in by_index[1]["error"]
+    assert agent.last_batch_stats["completed"] == 2
+    assert agent.last_batch_stats["tickets"] == 4
+
+def test_process_project_bounds_max_workers(agent):
+    results = agent.process_project("a", team_key="ENG", max_workers=10_000, idempotency_key="batch-1")
+
+    assert [r["title"] for r in results] == ["a 0", "a 1"]
+    assert agent.last_batch_stats["max_workers"] == orchestrator_agent.MAX_WORKERS_LIMIT
+
+def test_ideas_endpoint_bounds_requests_and_reports_a_failed_batch(monkeypatch):
+    import json
+
+    from fastapi.testclient import TestClient
+
+    from server import main
+
+    def fail(self, ideas, team_key=None, **kwargs):
+        raise RuntimeError("Linear is down")
+        yield
+
+    monkeypatch.setattr(OrchestratorAgent, "process_projects", fail)
+    client = TestClient(main.app)
+    response = client.post("/api/project/ideas", json={"ideas": ["a"]})
+    assert response.status_code == 200
+    assert json.loads(response.text.splitlines()[-1]) == {"error": "Linear is down"}
+
+    assert client.post("/api/project/ideas", json={"ideas": ["a"], "pipeline_depth": 1000}).status_code == 422
+    too_many = ["idea"] * (orchestrator_agent.MAX_IDEAS + 1)
+    assert client.post("/api/project/ideas", json={"ideas": too_many}).status_code == 422
+
+def test_streamed_tickets_are_analyzed_in_batches(agent, monkeypatch):
+    groups = []
+
+    def analyze(tickets, creations):
+        groups.append([ticket["titulo"] for ticket in tickets])
+        return [{"sufficient": True, "comment": "ok"} for _ in tickets]
+
+    monkeypatch.setattr(orchestrator_agent, "STREAM_ANALYSIS_BATCH", 2)
+    monkeypatch.setattr(agent, "_resolve_team_context", lambda linear_api, team_key=None: {"team_key": team_key, "team_id": None})
+    monkeypatch.setattr(agent, "stream_tickets_from_idea", lambda idea: iter({"titulo": f"{idea} {n}", "label": "backend"} for n in range(5)))
+    monkeypatch.setattr(agent, "_analyze_created_tickets", analyze)
+    monkeypatch.setattr(agent, "_handoff_ticket", lambda ticket, creation, analysis: {"title": ticket["titulo"], "analysis": analysis})
+
+    results = agent.process_project("a", stream=True, max_workers=4)
+
+    assert groups == [["a 0", "a 1"], ["a 2", "a 3"], ["a 4"]]
+    assert [r["title"] for r in results] == [f"a {n}" for n in range(5)]
+    assert all(r["analysis"] == {"sufficient": True, "comment": "ok"} for r in results)
+    assert agent.last_batch_stats["analysis_batches"] == 3
+
+def test_one_failing_ticket_leaves_the_rest_of_the_batch_in_order(agent, monkeypatch):
+    import time
+
+    class SlowAgent:
+        def process_ticket(self, issue, analysis=None):
+            index = issue["index"]
+            if index == 1:
+                raise RuntimeError("model timed out")
+            # Later tickets finish first
+            time.sleep(0.01 * (5 - index))
+            return {"status": "pr_created", "ticket": issue["identifier"]}
+
+    tickets = [{"titulo": f"a {n}", "label": "backend"} for n in range(5)]
+    creations = [{"success": True, "issue": {"index": n, "id": f"issue-{n}", "identifier": f"ENG-{n}"}} for n in range(5)]
+    monkeypatch.setattr(agent, "generate_tickets_from_idea", lambda idea: tickets)
+    monkeypatch.setattr(agent, "_create_and_analyze", lambda api, tickets, context, job_key: (creations, [None] * 5))
+    monkeypatch.delattr(agent, "_handoff_ticket")
+    monkeypatch.setattr(orchestrator_agent, "get_agent", lambda label: SlowAgent())
+
+    results = agent.process_project("a", max_workers=4)
+
+    assert [r["linear_ticket"]["identifier"] for r in results] == [f"ENG-{n}" for n in range(5)]
+    assert results[1]["agent_output"] == {"status": "error", "ticket": "ENG-1", "error": "model timed out"}
+    assert [r["agent_output"]["status"] for r in results] == ["pr_created", "error", "pr_created", "pr_created", "pr_created"]
+
+def test_streamed_responses_are_timed_until_their_last_line(monkeypatch):
+    import time
+
+    from fastapi.testclient import TestClient
+
+    from server import main
+    from server.utils import metrics
+
+    def slow(self, ideas, team_key=None, **kwargs):
+        for index, idea in enumerate(ideas):
+            time.sleep(0.1)
+            yield {"index": index, "idea": idea, "results": []}
+
+    monkeypatch.setattr(OrchestratorAgent, "process_projects", slow)
+    response = TestClient(main.app).post("/api/project/ideas", json={"ideas": ["a", "b"]}, headers={"X-Request-ID": "ideas-timing"})
+
+    assert response.status_code == 200
+    [span] = [span for span in metrics.traces.get("ideas-timing") if span["stage"] == "http POST /api/project/ideas"]
+    assert span["duration_ms"] >= 200
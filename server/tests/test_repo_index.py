@@ -0,0 +1,83 @@
+from __future__ import annotations
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+
+from server.utils.llm_usage import estimate_tokens
+from server.utils.repo_index import RepoIndex, summarize_file
+
+
+class FakeGitHub:
+    repo_name = "acme/app"
+
+    def __init__(self, files: dict[str, str]):
+        self.files = dict(files)
+        self.head = 0
+        self.tree_calls = 0
+        self.blob_calls = []
+
+    @staticmethod
+    def _sha(content: str) -> str:
+        return hashlib.sha1(content.encode()).hexdigest()
+
+    def get_base_commit(self, base_branch="main"):
+        return SimpleNamespace(sha=f"{self.head:040d}", tree=SimpleNamespace(sha=f"tree-{self.head}"))
+
+    def get_tree(self, tree_sha):
+        self.tree_calls += 1
+        return [{"path": p, "type": "blob", "sha": self._sha(c), "size": len(c)} for p, c in self.files.items()], False
+
+    def get_blob_text(self, sha):
+        self.blob_calls.append(sha)
+        return next(c for c in self.files.values() if self._sha(c) == sha)
+
+
+FILES = {
+    "README.md": "# Shop\n## Payments\n",
+    "server/main.py": "from fastapi import FastAPI\napp = FastAPI()\n\n@app.get('/health')\ndef health():\n    return {}\n",
+    "server/payments/stripe_client.py": "import stripe\n",
+    "src/App.tsx": "export default function App() {}\n",
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    return RepoIndex(str(tmp_path / "repo_index.sqlite3"))
+
+
+def test_snapshot_is_rebuilt_in_the_background_only_when_the_branch_moves(index, tmp_path):
+    github = FakeGitHub(FILES)
+    index.warm(lambda: github).result()
+    index.snapshot(github, wait=True)
+    assert index.snapshot(github).commit_sha == f"{0:040d}"
+    assert github.tree_calls == 1 and len(github.blob_calls) == 3
+
+    # One key file changed: the old snapshot is served while the tree is fetched again, with only its blob
+    github.files["server/main.py"] += "\ndef orders():\n    pass\n"
+    github.head += 1
+    assert index.snapshot(github).commit_sha == f"{0:040d}"
+    snapshot = index.snapshot(github, wait=True)
+    assert github.tree_calls == 2 and len(github.blob_calls) == 4
+    assert "def orders()" in snapshot.summaries["server/main.py"]
+
+    # A restarted process loads the stored snapshot instead of fetching it
+    assert RepoIndex(index.path).snapshot(github).summaries == snapshot.summaries
+    assert github.tree_calls == 2
+
+
+def test_context_ranks_related_files_within_the_budget(index):
+    github = FakeGitHub(FILES)
+    # Nothing to offer until the first build is done
+    assert index.context(github, "Retry failed Stripe payments") == ""
+    context = index.context(github, "Retry failed Stripe payments", extensions=(".py",), wait=True)
+    assert context.index("server/payments/stripe_client.py") < context.index("src/App.tsx")
+
+    small = index.context(github, "Retry failed Stripe payments", token_budget=40)
+    assert estimate_tokens(small) <= 40 and "stripe_client.py" in small
+    assert index.context(github, "anything", token_budget=0) == ""
+
+
+def test_summaries_keep_definitions_and_dependencies():
+    assert summarize_file("server/main.py", FILES["server/main.py"]) == "@app.get('/health')\ndef health()"
+    assert summarize_file("package.json", '{"name": "shop", "dependencies": {"react": "18"}}') == "name: shop\ndependencies: react"
@@ -0,0 +1,130 @@
+from __future__ import annotations
+import asyncio
+import json
+
+import pytest
+
+from server.utils.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    TokenBucket,
+    classify_error,
+    classify_response,
+    retry_after_from_headers,
+)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.text = json.dumps(body) if body is not None else ""
+        self.parsed = 0
+
+    def json(self):
+        if self.body is None:
+            raise ValueError("no body")
+        self.parsed += 1
+        return self.body
+
+def test_graphql_ratelimited_in_200_is_retryable():
+    response = FakeResponse(200, {"errors": [{"message": "slow down", "extensions": {"code": "RATELIMITED"}}]})
+    classification = classify_response(response, graphql=True)
+    assert classification.retryable
+    assert classification.reason == "GraphQL RATELIMITED"
+    # GraphQL errors are only checked when the caller asks for it
+    assert classify_response(response) is None
+
+def test_client_errors_and_success_go_back_to_caller():
+    success = FakeResponse(200, {"data": {"issue": {"title": "Add login"}}})
+    assert classify_response(success, graphql=True) is None
+    # A body without a rate-limit code is left for the caller to parse
+    assert success.parsed == 0
+    assert classify_response(FakeResponse(400, {"errors": [{"extensions": {"code": "BAD_USER_INPUT"}}]}), graphql=True) is None
+    assert classify_response(FakeResponse(503)).retryable
+
+def test_transport_errors_are_retryable_but_bugs_are_not():
+    class ReadTimeout(OSError):
+        pass
+    assert classify_error(ReadTimeout()).retryable
+    assert classify_error(ConnectionResetError()).retryable
+    assert not classify_error(ValueError("bad json")).retryable
+
+def test_wait_comes_from_headers():
+    assert retry_after_from_headers(FakeResponse(headers={"Retry-After": "7"})) == 7.0
+    now = 1_700_000_000.0
+    # Linear sends the reset as epoch milliseconds, GitHub as epoch seconds
+    linear = FakeResponse(headers={"X-RateLimit-Requests-Remaining": "0", "X-RateLimit-Requests-Reset": str(int((now + 12) * 1000))})
+    assert retry_after_from_headers(linear, now=now) == pytest.approx(12.0)
+    github = FakeResponse(headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(int(now + 5))})
+    assert retry_after_from_headers(github, now=now) == pytest.approx(5.0)
+    not_exhausted = FakeResponse(headers={"X-RateLimit-Remaining": "10", "X-RateLimit-Reset": str(int(now + 5))})
+    assert retry_after_from_headers(not_exhausted, now=now) is None
+
+def test_full_jitter_stays_within_cap():
+    policy = RetryPolicy(base_delay=1.0, max_delay=4.0)
+    waits = [policy.backoff(attempt) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= wait <= 4.0 for wait in waits)
+    assert policy.wait_time(0, retry_after=3.5) == 3.5
+
+def test_token_bucket_spaces_out_bursts():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5)
+    clock.now += 10
+    assert bucket.reserve() == 0
+
+def test_circuit_breaker_opens_then_half_opens():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30, clock=clock)
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 31
+    breaker.before_call()
+    # Only one trial call is let through while half-open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_cancelled_half_open_trial_frees_the_trial_slot():
+    from server.utils.logging_utils import network_guard
+    from server.utils.retry import get_service_guard
+
+    clock = FakeClock()
+    guard = get_service_guard("half-open-test")
+    guard.breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30, clock=clock)
+    guard.breaker.record_failure()
+    clock.now += 31
+
+    @network_guard(max_retries=0, service="half-open-test")
+    async def call(hang):
+        if hang:
+            await asyncio.Event().wait()
+        return FakeResponse(200, {"data": {}})
+
+    async def scenario():
+        trial = asyncio.ensure_future(call(True))
+        await asyncio.sleep(0)
+        assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+        # e.g. the client disconnected while the trial was in flight
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        return await call(False)
+
+    assert asyncio.run(scenario()).status_code == 200
+    assert guard.breaker.state == CircuitBreaker.CLOSED
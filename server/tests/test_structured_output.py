@@ -0,0 +1,82 @@
+from __future__ import annotations
+import json
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from server.utils.structured_output import (
+    CODE_GENERATION_SCHEMA,
+    STRUCTURED_OUTPUT,
+    TICKETS_SCHEMA,
+    StructuredOutputError,
+    parse_or_repair,
+    parse_structured,
+    repair_json,
+)
+
+TICKET = {"titulo": "Add login", "descripcion": "AC: users can log in", "label": "backend"}
+
+
+@pytest.mark.parametrize("reply", [
+    # Fenced, with prose around it and a trailing comma
+    'Here are the tickets:\n```json\n[{"titulo": "Add login", "descripcion": "AC: users can log in", "label": "backend"},]\n```\nLet me know!',
+    # Nested arrays survive, unlike a non-greedy regex
+    '[{"titulo": "Add login", "descripcion": "AC: users can log in", "label": "backend", "tags": ["a", ["b"]]}] done',
+    # Cut off in the middle of the second ticket
+    '[{"titulo": "Add login", "descripcion": "AC: users can log in", "label": "backend"}, {"titulo": "Add log',
+])
+def test_replies_are_repaired_locally(reply):
+    tickets, repaired = parse_structured(reply, TICKETS_SCHEMA)
+    assert repaired
+    assert [{key: ticket[key] for key in TICKET} for ticket in tickets] == [TICKET]
+
+
+def test_repair_closes_unterminated_strings_and_keeps_inner_fences():
+    assert json.loads(repair_json('{"tickets": [{"titulo": "Add login", "descripcion": "AC: wor')) == {
+        "tickets": [{"titulo": "Add login", "descripcion": "AC: wor"}]
+    }
+    reply = json.dumps({"files": [{"file_path": "README.md", "file_content": "```python\nx = 1\n```"}]})
+    generation, repaired = parse_structured(reply, CODE_GENERATION_SCHEMA)
+    assert not repaired
+    assert generation["files"][0]["file_content"].startswith("```python")
+
+
+@pytest.mark.parametrize("reply", [
+    # Cut off inside the only file
+    '{"files": [{"file_path": "server/api/auth.py", "file_content": "def login(user):\\n    if user.',
+    # Cut off inside the second file, after a complete first one
+    '{"files": [{"file_path": "a.py", "file_content": "x = 1"}, {"file_path": "b.py", "file_content": "y =',
+])
+def test_cut_off_code_generation_is_never_completed_locally(reply):
+    with pytest.raises(StructuredOutputError, match="cut off"):
+        parse_structured(reply, CODE_GENERATION_SCHEMA)
+
+    complete = {"files": [{"file_path": "a.py", "file_content": "x = 1"}, {"file_path": "b.py", "file_content": "y = 2"}]}
+    llm = FakeListChatModel(responses=[json.dumps(complete)])
+    assert parse_or_repair(reply, CODE_GENERATION_SCHEMA, llm, use_cache=False) == complete
+
+
+def test_invalid_reply_gets_a_repair_only_retry():
+    llm = FakeListChatModel(responses=[json.dumps([TICKET])])
+    before = STRUCTURED_OUTPUT.value(schema="tickets", result="retried")
+
+    tickets = parse_or_repair('[{"titulo": "Add login"}]', TICKETS_SCHEMA, llm, use_cache=False)
+
+    assert tickets == [TICKET]
+    assert STRUCTURED_OUTPUT.value(schema="tickets", result="retried") == before + 1
+    with pytest.raises(StructuredOutputError, match="descripcion"):
+        parse_or_repair('[{"titulo": "Add login"}]', TICKETS_SCHEMA, llm=None)
+
+
+def test_code_generation_accepts_a_single_file_pair():
+    from server.agents.backend_agent import BackendAgent
+
+    agent = BackendAgent.__new__(BackendAgent)
+    agent.llm = None
+    single = '```json\n{"file_path": "server/api/auth.py", "file_content": "def login(): ..."}\n```'
+    assert agent._files_from_generation(single) == {"server/api/auth.py": "def login(): ..."}
+
+    failures = []
+    with pytest.raises(ValueError, match="file_path or file_content"):
+        agent._files_from_generation('{"file_path": "server/api/auth.py"}', on_failure=lambda: failures.append(1))
+    assert failures == [1]
@@ -0,0 +1,163 @@
+from __future__ import annotations
+import hashlib
+import hmac
+
+import pytest
+
+from server.utils.linear import verify_linear_webhook
+from server.utils.work_queue import QueueWorkerPool, WorkQueue
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return WorkQueue(str(tmp_path / "queue.sqlite3"), visibility_timeout=30, max_attempts=2, clock=clock)
+
+def test_claim_ack_and_dedupe(queue):
+    assert queue.enqueue("linear.issue", {"n": 1}, dedupe_key="delivery-1") is not None
+    assert queue.enqueue("linear.issue", {"n": 1}, dedupe_key="delivery-1") is None
+    message = queue.claim()
+    assert message.payload == {"n": 1} and message.attempts == 1
+    # Hidden while leased
+    assert queue.claim() is None
+    assert queue.ack(message)
+    assert queue.stats() == {"pending": 0, "in_flight": 0, "done": 1, "dead": 0}
+    # Still deduplicated after it is done
+    assert queue.enqueue("linear.issue", {"n": 1}, dedupe_key="delivery-1") is None
+
+def test_expired_lease_is_redelivered_then_dead_lettered(queue, clock):
+    queue.enqueue("linear.issue", {"n": 1})
+    first = queue.claim()
+    clock.now += 31
+    second = queue.claim()
+    assert second.id == first.id and second.attempts == 2
+    # The first worker lost its lease
+    assert not queue.ack(first)
+    clock.now += 31
+    assert queue.claim() is None
+    [dead] = queue.dead_letters()
+    assert dead["id"] == first.id and "Visibility timeout" in dead["error"]
+    assert queue.requeue(first.id)
+    assert queue.claim().attempts == 1
+
+def test_worker_retries_failures_until_dead_letter(queue, clock):
+    calls = []
+
+    def handler(payload):
+        calls.append(payload)
+        raise RuntimeError("Linear is down")
+
+    pool = QueueWorkerPool(queue, {"linear.issue": handler})
+    queue.enqueue("linear.issue", {"n": 1})
+    pool.process(queue.claim())
+    clock.now += 301
+    pool.process(queue.claim())
+    assert len(calls) == 2
+    assert queue.stats()["dead"] == 1
+    assert queue.dead_letters()[0]["error"] == "RuntimeError: Linear is down"
+
+    queue.enqueue("unknown", {})
+    pool.process(queue.claim())
+    assert queue.stats()["dead"] == 2
+
+def test_verify_linear_webhook():
+    body = b'{"type": "Issue"}'
+    signature = hmac.new(b"secret", body, hashlib.sha256).hexdigest()
+    assert verify_linear_webhook(body, signature, "secret")
+    assert not verify_linear_webhook(body, signature, "other-secret")
+    assert not verify_linear_webhook(body + b" ", signature, "secret")
+    assert verify_linear_webhook(body, signature, "secret", webhook_timestamp=1_000_000, now=1030)
+    assert not verify_linear_webhook(body, signature, "secret", webhook_timestamp=1_000_000, now=1100)
+
+class FakeLinear:
+    def get_viewer(self):
+        return {"id": "integration-user"}
+
+    def get_ticket(self, issue_id):
+        return {"id": issue_id, "identifier": "ENG-1", "labels": {"nodes": [{"name": "backend"}]}}
+
+class FailingAgent:
+    agent_type = "BackendAgent"
+
+    def process_ticket(self, issue):
+        return {"status": "error", "ticket": issue["identifier"], "error": "PR creation failed"}
+
+def test_issue_events_fail_with_the_agent_and_skip_own_changes(monkeypatch):
+    from server.agents import linear_events
+
+    monkeypatch.setattr(linear_events, "get_linear_api", FakeLinear)
+    monkeypatch.setattr(linear_events, "get_agent", lambda label: FailingAgent())
+    event = {"type": "Issue", "action": "create", "data": {"id": "issue-1"}, "actor": {"id": "someone"}}
+    # Raised, so the queue retries the message and dead-letters it after the last attempt
+    with pytest.raises(RuntimeError, match="PR creation failed"):
+        linear_events.handle_issue_event(event)
+
+    own = {**event, "actor": {"id": "integration-user"}}
+    assert linear_events.handle_issue_event(own)["reason"] == "own change"
+
+class FailingChain:
+    def run(self, **inputs):
+        raise TimeoutError("model timed out")
+
+class RecordingLinear:
+    def __init__(self):
+        self.comments = []
+
+    def add_comment(self, issue_id, body):
+        self.comments.append(body)
+
+def test_failure_comment_waits_for_the_last_attempt(queue, clock, monkeypatch):
+    from server.agents.backend_agent import BackendAgent
+
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "false")
+    agent = BackendAgent.__new__(BackendAgent)
+    agent.agent_type = "BackendAgent"
+    agent.linear_api = RecordingLinear()
+    agent.code_gen_chain = FailingChain()
+    agent._repo_context = lambda ticket: "(not available)"
+    ticket = {"id": "issue-1", "identifier": "ENG-1", "description": "Email login. AC: users can log in"}
+
+    def handler(payload):
+        result = agent._generate_code_and_create_pr(ticket)
+        raise RuntimeError(result["error"])
+
+    pool = QueueWorkerPool(queue, {"linear.issue": handler})
+    queue.enqueue("linear.issue", {"n": 1})
+    pool.process(queue.claim())
+    assert agent.linear_api.comments == []
+    clock.now += 301
+    pool.process(queue.claim())
+    assert len(agent.linear_api.comments) == 1 and "model timed out" in agent.linear_api.comments[0]
+
+    # Outside the queue nothing retries the call, so it comments right away
+    agent._generate_code_and_create_pr(ticket)
+    assert len(agent.linear_api.comments) == 2
+
+def test_worker_survives_a_failed_purge(queue, monkeypatch):
+    import sqlite3
+    import time
+
+    def locked():
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(queue, "purge_done", locked)
+    pool = QueueWorkerPool(queue, {"linear.issue": lambda payload: None}, workers=1, poll_interval=0.01)
+    pool.start()
+    try:
+        queue.enqueue("linear.issue", {"n": 1})
+        deadline = time.monotonic() + 5
+        while queue.stats()["done"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert queue.stats()["done"] == 1
+        assert all(thread.is_alive() for thread in pool._threads)
+    finally:
+        pool.stop()
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable
+from urllib.parse import urlparse
+
+from requests.structures import CaseInsensitiveDict
+
+# Record-and-replay of upstream interactions (Linear, GitHub, LLM).
+#
+# CASSETTE_MODE=record appends every request/response pair and its timing to
+# CASSETTE_PATH (JSON Lines); CASSETTE_MODE=replay serves them back without
+# touching the network, waiting the recorded time divided by CASSETTE_REPLAY_SPEED
+# (1 = original timing, 10 = ten times faster, 0 = no waiting).
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+
+class CassetteMiss(KeyError):
+    """
+    Raised in replay mode for a request that was never recorded.
+    """
+
+
+class RecordedError(ConnectionError):
+    """
+    Replays a transport error that happened while recording.
+    Subclasses ConnectionError so network_guard treats it as retryable, like the original.
+    """
+
+
+class RecordedResponse:
+    """
+    The parts of an HTTP response the clients read: status_code, headers, text and json().
+    """
+
+    def __init__(self, status_code: int, headers: dict, text: str):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.text = text
+
+    @property
+    def content(self) -> bytes:
+        return self.text.encode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+    @staticmethod
+    def serialize(response) -> dict:
+        headers = {k: v for k, v in dict(getattr(response, "headers", {}) or {}).items() if k.lower() != "set-cookie"}
+        return {"status_code": response.status_code, "headers": headers, "text": response.text}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RecordedResponse":
+        return cls(data["status_code"], data.get("headers"), data.get("text", ""))
+
+
+def _similarity(recorded, body) -> int:
+    if isinstance(recorded, dict) and isinstance(body, dict):
+        return sum(1 for key, value in body.items() if recorded.get(key) == value)
+    return int(recorded == body)
+
+
+class Cassette:
+    """
+    One cassette file. Interactions are matched on (service, request); a request
+    recorded several times is replayed in recording order, and the last recording
+    is reused once they run out.
+
+    Concurrent identical requests can get their responses in a different order
+    than when recording, so a later request may carry a value (e.g. a git SHA)
+    that was never recorded with it. Such a request falls back to the recorded
+    request on the same endpoint with the most equal body fields.
+    """
+
+    def __init__(self, path: str, mode: str, speed: float = 1.0):
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._interactions: dict[str, deque] = {}
+        self._last: dict[str, dict] = {}
+        self._by_endpoint: dict[str, list[dict]] = {}
+        self.stats = {"recorded": 0, "replayed": 0, "fuzzy": 0, "misses": 0}
+        if mode == MODE_REPLAY:
+            self._load()
+        elif mode == MODE_RECORD:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    @staticmethod
+    def request_key(service: str, request: dict) -> str:
+        raw = json.dumps({"service": service, "request": request}, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                interaction = json.loads(line)
+                self._interactions.setdefault(interaction["key"], deque()).append(interaction)
+                endpoint = self._endpoint(interaction["service"], interaction["request"])
+                self._by_endpoint.setdefault(endpoint, []).append(interaction)
+
+    @staticmethod
+    def _endpoint(service: str, request: dict) -> str:
+        return f"{service} {request.get('method')} {request.get('path')}"
+
+    def _closest(self, service: str, request: dict) -> dict | None:
+        candidates = self._by_endpoint.get(self._endpoint(service, request)) or []
+        scored = [(_similarity(c["request"].get("body"), request.get("body")), not c.get("used"), c) for c in candidates]
+        scored = [entry for entry in scored if entry[0] > 0]
+        if not scored:
+            return None
+        return max(scored, key=lambda entry: entry[:2])[2]
+
+    def record(self, service: str, request: dict, response: dict, elapsed: float):
+        line = json.dumps({
+            "key": self.request_key(service, request),
+            "service": service,
+            "request": request,
+            "response": response,
+            "elapsed": round(elapsed, 6),
+            "recorded_at": time.time(),
+        }, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.stats["recorded"] += 1
+
+    def lookup(self, service: str, request: dict) -> dict:
+        key = self.request_key(service, request)
+        with self._lock:
+            queue = self._interactions.get(key)
+            if queue:
+                interaction = self._last[key] = queue.popleft()
+            else:
+                interaction = self._last.get(key)
+            if interaction is None and "path" in request:
+                interaction = self._closest(service, request)
+                if interaction is not None:
+                    self.stats["fuzzy"] += 1
+            if interaction is None:
+                self.stats["misses"] += 1
+                raise CassetteMiss(f"No recorded {service} interaction for request {json.dumps(request, default=str)[:300]}")
+            interaction["used"] = True
+            self.stats["replayed"] += 1
+            return interaction
+
+    def replay_delay(self, interaction: dict) -> float:
+        return interaction.get("elapsed", 0) / self.speed if self.speed > 0 else 0.0
+
+    @staticmethod
+    def _replay_response(interaction: dict, deserialize: Callable[[dict], Any]):
+        response = interaction["response"]
+        if "error" in response:
+            raise RecordedError(response["error"])
+        return deserialize(response)
+
+    def play(self, service: str, request: dict, perform: Callable[[], Any],
+             serialize: Callable[[Any], dict] = RecordedResponse.serialize,
+             deserialize: Callable[[dict], Any] = RecordedResponse.from_dict):
+        """
+        Replays the recorded response to `request`, or calls `perform()` and records what it returns (or raises).
+        """
+        if self.mode == MODE_REPLAY:
+            interaction = self.lookup(service, request)
+            time.sleep(self.replay_delay(interaction))
+            return self._replay_response(interaction, deserialize)
+        started = time.perf_counter()
+        try:
+            result = perform()
+        except Exception as e:
+            self.record(service, request, {"error": f"{type(e).__name__}: {e}"}, time.perf_counter() - started)
+            raise
+        self.record(service, request, serialize(result), time.perf_counter() - started)
+        return result
+
+    async def aplay(self, service: str, request: dict, perform: Callable[[], Any],
+                    serialize: Callable[[Any], dict] = RecordedResponse.serialize,
+                    deserialize: Callable[[dict], Any] = RecordedResponse.from_dict):
+        """
+        Async variant of play(); `perform()` returns an awaitable.
+        """
+        if self.mode == MODE_REPLAY:
+            interaction = self.lookup(service, request)
+            await asyncio.sleep(self.replay_delay(interaction))
+            return self._replay_response(interaction, deserialize)
+        started = time.perf_counter()
+        try:
+            result = await perform()
+        except Exception as e:
+            self.record(service, request, {"error": f"{type(e).__name__}: {e}"}, time.perf_counter() - started)
+            raise
+        self.record(service, request, serialize(result), time.perf_counter() - started)
+        return result
+
+
+def http_request(method: str, url: str, body=None) -> dict:
+    """
+    The request fields interactions are matched on. Only the path is kept so a
+    cassette recorded against one host replays against another, and headers are
+    left out so credentials never reach the file.
+    """
+    return {"method": method.upper(), "path": urlparse(url).path or url, "body": body}
+
+
+_cassette: Cassette | None = None
+_cassette_loaded = False
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Cassette | None:
+    """
+    Returns the process-wide cassette, or None when CASSETTE_MODE is off (the default).
+    """
+    global _cassette, _cassette_loaded
+    if not _cassette_loaded:
+        with _cassette_lock:
+            if not _cassette_loaded:
+                mode = os.environ.get("CASSETTE_MODE", MODE_OFF).lower()
+                if mode in (MODE_RECORD, MODE_REPLAY):
+                    _cassette = Cassette(
+                        os.environ.get("CASSETTE_PATH", ".cache/cassettes/default.jsonl"),
+                        mode,
+                        speed=float(os.environ.get("CASSETTE_REPLAY_SPEED", "1")),
+                    )
+                _cassette_loaded = True
+    return _cassette
+
+
+def set_cassette(cassette: Cassette | None):
+    """
+    Installs `cassette` (or disables record/replay with None), overriding the env configuration.
+    """
+    global _cassette, _cassette_loaded
+    with _cassette_lock:
+        _cassette = cassette
+        _cassette_loaded = True
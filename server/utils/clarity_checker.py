@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import re
+import threading
+
+# Rule-based pre-filter that catches obviously unclear tickets before any LLM call.
+
+MIN_DESCRIPTION_LENGTH = 30
+
+# LLM calls a rejected ticket would otherwise cost: the sufficiency analysis and the clarifying question
+LLM_CALLS_PER_ANALYSIS = 2
+
+BACKEND_KEYWORDS = ("backend",)
+
+_ACCEPTANCE_CRITERIA_PATTERNS = (
+    re.compile(r"\bAC\s*:"),
+    re.compile(r"criterios? de aceptaci[oó]n", re.IGNORECASE),
+    re.compile(r"acceptance criteria", re.IGNORECASE),
+)
+
+_stats = {"checked": 0, "rejected": 0, "llm_calls_saved": 0}
+_stats_lock = threading.Lock()
+
+
+def _label_names(ticket: dict) -> list[str]:
+    """
+    Label names from a Linear issue ({"labels": {"nodes": [...]}}), a list of
+    labels, or a generated ticket's single "label" (also used when the issue
+    has no labels, e.g. because the workspace lacks a label of that name).
+    """
+    labels = ticket.get("labels")
+    if isinstance(labels, dict):
+        labels = labels.get("nodes")
+    if not labels and ticket.get("label"):
+        labels = [ticket["label"]]
+    names = []
+    for label in labels or []:
+        name = label.get("name") if isinstance(label, dict) else label
+        if name:
+            names.append(str(name).lower())
+    return names
+
+
+def analyze(ticket: dict) -> tuple[bool, list[str]]:
+    """
+    Checks a ticket against cheap structural rules.
+    Returns (is_clear, missing) where `missing` lists a message per failed rule.
+    """
+    title = (ticket.get("title") or ticket.get("titulo") or "").strip()
+    description = (ticket.get("description") or ticket.get("descripcion") or "").strip()
+    labels = _label_names(ticket)
+    missing = []
+
+    if not title:
+        missing.append("Falta el título.")
+
+    if len(description) < MIN_DESCRIPTION_LENGTH:
+        missing.append(f"La descripción es demasiado corta (mínimo {MIN_DESCRIPTION_LENGTH} caracteres).")
+
+    if not labels:
+        missing.append("Falta una etiqueta (por ejemplo 'frontend' o 'backend').")
+    elif any(keyword in title.lower() for keyword in BACKEND_KEYWORDS) and "backend" not in labels:
+        missing.append("El título menciona backend pero el ticket no tiene la etiqueta 'backend'.")
+
+    if not any(pattern.search(description) for pattern in _ACCEPTANCE_CRITERIA_PATTERNS):
+        missing.append("Falta el criterio de aceptación (por ejemplo introducido con 'AC:').")
+
+    return not missing, missing
+
+
+def prefilter(ticket: dict) -> dict | None:
+    """
+    Runs analyze() as the first stage of sufficiency analysis.
+    Returns a {"sufficient": False, "comment": ...} analysis for tickets that are
+    obviously unclear, or None when the ticket should go on to the LLM.
+    """
+    is_clear, missing = analyze(ticket)
+    with _stats_lock:
+        _stats["checked"] += 1
+        if not is_clear:
+            _stats["rejected"] += 1
+            _stats["llm_calls_saved"] += LLM_CALLS_PER_ANALYSIS
+    if is_clear:
+        return None
+    # Same language as the reasons from analyze()
+    comment = "Antes de empezar a trabajar en este ticket, por favor aclara lo siguiente:\n" + "\n".join(f"- {m}" for m in missing)
+    return {"sufficient": False, "comment": comment}
+
+
+def get_stats() -> dict:
+    """
+    Returns how many tickets were checked and rejected, and the LLM calls that saved.
+    """
+    with _stats_lock:
+        return dict(_stats)
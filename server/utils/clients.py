@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable
+
+from .github_api import GitHubAPI
+from .langchain_helpers import get_llm
+from .llm_router import TASK_DEFAULT
+from .linear_api import LinearAPI
+
+
+class Registry:
+    """
+    Thread-safe registry of lazily built, process-wide singletons.
+    Each instance is created by its factory on first use and shared afterwards.
+    A factory that raises is retried on the next call instead of being cached.
+    """
+
+    def __init__(self):
+        self._instances: dict[str, Any] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, factory: Callable[[], Any]):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        # One lock per name so a slow factory does not block unrelated lookups
+        with lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                instance = factory()
+                self._instances[name] = instance
+        return instance
+
+    def reset(self, name: str | None = None):
+        """
+        Forgets one instance, or all of them, so the next get() rebuilds it.
+        """
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+
+clients = Registry()
+
+
+def get_linear_api():
+    """
+    Returns the shared LinearAPI client.
+    """
+    return clients.get("linear_api", LinearAPI)
+
+
+def get_github_api():
+    """
+    Returns the shared GitHubAPI client.
+    """
+    return clients.get("github_api", GitHubAPI)
+
+
+def get_shared_llm(task: str = TASK_DEFAULT):
+    """
+    Returns the shared chat model built by get_llm(task), one per task.
+    """
+    return clients.get(f"llm:{task}", lambda: get_llm(task))
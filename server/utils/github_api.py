@@ -1,5 +1,94 @@
-from github import Github, GithubException
+from github import Github, GithubException, InputGitTreeElement
+from github.Requester import Requester
+import base64
+import json
 import os
+import requests
+import threading
+import time
+
+from .cassette import get_cassette, http_request
+from . import idempotency
+from .metrics import span
+
+# Seconds a base branch head is reused before it is fetched again
+BASE_SHA_TTL = float(os.environ.get("GITHUB_BASE_SHA_TTL", "30"))
+# REST endpoint; point it at GitHub Enterprise or a local stand-in
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+# PyGithub's client-side throttling between requests and between writes (its defaults: 0.25s and 1s)
+SECONDS_BETWEEN_REQUESTS = float(os.environ.get("GITHUB_SECONDS_BETWEEN_REQUESTS", "0.25"))
+SECONDS_BETWEEN_WRITES = float(os.environ.get("GITHUB_SECONDS_BETWEEN_WRITES", "1.0"))
+# Idempotency store scope of opened pull requests
+CREATE_PR_SCOPE = "github.create_pr"
+
+_recording_session = None
+_recording_session_lock = threading.Lock()
+
+def _get_recording_session(retry=None):
+    global _recording_session
+    with _recording_session_lock:
+        if _recording_session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(max_retries=retry if retry is not None else 0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _recording_session = session
+    return _recording_session
+
+class _ConnectionResponse:
+    # The httplib-style response PyGithub reads
+    def __init__(self, response):
+        self.status = response.status_code
+        self.headers = response.headers
+        self.text = response.text
+
+    def getheaders(self):
+        return list(self.headers.items())
+
+    def read(self):
+        return self.text
+
+class _CassetteHTTPSConnection:
+    """
+    PyGithub connection class that sends every request through the cassette,
+    recording it or serving the recorded response. Installed with
+    Requester.injectConnectionClasses when CASSETTE_MODE is record or replay.
+    """
+    protocol = "https"
+
+    def __init__(self, host, port=None, strict=False, timeout=None, retry=None, pool_size=None, **kwargs):
+        self.host = host
+        self.port = port or (443 if self.protocol == "https" else 80)
+        self.timeout = timeout
+        self.retry = retry
+        self.verify = kwargs.get("verify", True)
+
+    def request(self, verb, url, input, headers, stream=False):
+        self.verb, self.url, self.input, self.headers = verb, url, input, headers
+
+    def getresponse(self):
+        try:
+            body = json.loads(self.input) if isinstance(self.input, str) else self.input
+        except ValueError:
+            body = self.input
+
+        def perform():
+            return _get_recording_session(self.retry).request(
+                self.verb,
+                f"{self.protocol}://{self.host}:{self.port}{self.url}",
+                headers=self.headers,
+                data=self.input,
+                timeout=self.timeout,
+                verify=self.verify,
+                allow_redirects=False,
+            )
+        return _ConnectionResponse(get_cassette().play("github", http_request(self.verb, self.url, body), perform))
+
+    def close(self):
+        pass
+
+class _CassetteHTTPConnection(_CassetteHTTPSConnection):
+    protocol = "http"
 
 class GitHubAPI:
     def __init__(self):
@@ -8,56 +97,149 @@ class GitHubAPI:
 
         if not token or not repo_name:
             raise ValueError("GITHUB_TOKEN and GITHUB_REPO environment variables must be set.")
-            
-        self.gh = Github(token)
-        self.repo = self.gh.get_repo(repo_name)
+
+        if get_cassette() is not None:
+            Requester.injectConnectionClasses(_CassetteHTTPConnection, _CassetteHTTPSConnection)
+        self.gh = Github(
+            token,
+            base_url=GITHUB_API_URL,
+            seconds_between_requests=SECONDS_BETWEEN_REQUESTS,
+            seconds_between_writes=SECONDS_BETWEEN_WRITES,
+        )
+        # lazy=True skips the round trip that fetches the repo metadata; it is not needed to create PRs
+        self.repo = self.gh.get_repo(repo_name, lazy=True)
+        self.repo_name = repo_name
+        self._base_commits = {}
+        self._base_commits_lock = threading.Lock()
+
+    def get_base_commit(self, base_branch="main"):
+        """
+        Returns the head GitCommit of `base_branch`, cached for BASE_SHA_TTL seconds
+        so a batch of PRs from one run does not refetch it for every ticket.
+        """
+        with self._base_commits_lock:
+            cached = self._base_commits.get(base_branch)
+            if cached and cached[1] > time.monotonic():
+                return cached[0]
+        with span("github.base_commit"):
+            ref = self.repo.get_git_ref(f"heads/{base_branch}")
+            commit = self.repo.get_git_commit(ref.object.sha)
+        with self._base_commits_lock:
+            self._base_commits[base_branch] = (commit, time.monotonic() + BASE_SHA_TTL)
+        return commit
+
+    def invalidate_base_commit(self, base_branch=None):
+        with self._base_commits_lock:
+            if base_branch is None:
+                self._base_commits.clear()
+            else:
+                self._base_commits.pop(base_branch, None)
+
+    def get_tree(self, tree_sha):
+        """
+        Every entry of a tree, recursively, in one request: ([{"path", "type", "sha", "size"}, ...], truncated).
+        GitHub cuts off very large trees, in which case `truncated` is True.
+        """
+        with span("github.get_tree"):
+            tree = self.repo.get_git_tree(tree_sha, recursive=True)
+        entries = [{"path": entry.path, "type": entry.type, "sha": entry.sha, "size": entry.size} for entry in tree.tree]
+        return entries, bool(tree.raw_data.get("truncated"))
+
+    def get_blob_text(self, sha):
+        """
+        The content of a blob as text (undecodable bytes are replaced).
+        """
+        with span("github.get_blob"):
+            blob = self.repo.get_git_blob(sha)
+        if blob.encoding == "base64":
+            return base64.b64decode(blob.content).decode("utf-8", errors="replace")
+        return blob.content
 
     def create_pr(self, ticket_id, ticket_title, file_path, file_content, base_branch="main"):
+        return self.create_pr_files(ticket_id, ticket_title, {file_path: file_content}, base_branch)
+
+    def create_pr_files(self, ticket_id, ticket_title, files, base_branch="main", idempotency_key=None):
+        """
+        Opens a PR that adds or replaces every file in `files` ({path: content}) with a single commit.
+
+        Uses the Git Data API: the file contents go inline into one new tree (GitHub
+        creates the blobs), then one commit, one branch ref and the pull request.
+        With a cached base commit that is four calls regardless of the number of files.
+
+        The same PR (repo, ticket, title, files and base branch, or the same
+        `idempotency_key`) is only opened once; repeats return the first result.
+        """
+        if not idempotency.idempotency_enabled():
+            return self._create_pr_files(ticket_id, ticket_title, files, base_branch)
+        key = idempotency_key or idempotency.idempotency_key(self.repo_name, ticket_id, ticket_title, base_branch, sorted(files.items()))
+        return idempotency.get_idempotency_store().run(
+            CREATE_PR_SCOPE,
+            key,
+            lambda: self._create_pr_files(ticket_id, ticket_title, files, base_branch),
+            should_store=lambda result: result.get("success"),
+        )
+
+    def _point_branch(self, branch_name, sha):
+        """
+        Creates the branch at `sha`, or moves it there when an earlier, failed
+        attempt for the same ticket already created it.
+        """
+        try:
+            self.repo.create_git_ref(ref=f"refs/heads/{branch_name}", sha=sha)
+        except GithubException as e:
+            # 422 "Reference already exists"
+            if e.status != 422:
+                raise
+            print(f"[GitHub] Branch {branch_name} already exists, pointing it at {sha[:7]}")
+            self.repo.get_git_ref(f"heads/{branch_name}").edit(sha=sha, force=True)
+
+    def _create_pr_files(self, ticket_id, ticket_title, files, base_branch):
         try:
-            # 1. Create a new branch from the base branch
+            if not files:
+                raise ValueError("No files to commit.")
             branch_name = f"feature/{ticket_id}-{ticket_title.lower().replace(' ', '-')[:20]}"
+            commit_message = f"feat({ticket_id}): {ticket_title}"
+
+            # 1. Build one tree with all files on top of the base branch head
+            base_commit = self.get_base_commit(base_branch)
+            print(f"[GitHub] Creating tree with {len(files)} file(s) on {base_branch}@{base_commit.sha[:7]}")
+            elements = [
+                InputGitTreeElement(path=path, mode="100644", type="blob", content=content)
+                for path, content in files.items()
+            ]
+            with span("github.create_tree"):
+                tree = self.repo.create_git_tree(elements, base_commit.tree)
+
+            # 2. Commit it and point the new branch at the commit
+            with span("github.create_commit"):
+                commit = self.repo.create_git_commit(commit_message, tree, [base_commit])
             print(f"[GitHub] Creating branch: {branch_name}")
-            
-            source = self.repo.get_branch(base_branch)
-            self.repo.create_git_ref(ref=f"refs/heads/{branch_name}", sha=source.commit.sha)
+            with span("github.create_ref"):
+                self._point_branch(branch_name, commit.sha)
 
-            # 2. Create or update the file in the new branch
-            commit_message = f"feat({ticket_id}): {ticket_title}"
-            print(f"[GitHub] Creating file '{file_path}' in branch '{branch_name}'")
-            
-            try:
-                # Check if file exists to update it
-                contents = self.repo.get_contents(file_path, ref=branch_name)
-                self.repo.update_file(contents.path, commit_message, file_content, contents.sha, branch=branch_name)
-                print(f"[GitHub] Updated existing file: {file_path}")
-            except GithubException as e:
-                if e.status == 404:
-                    # File does not exist, create it
-                    self.repo.create_file(file_path, commit_message, file_content, branch=branch_name)
-                    print(f"[GitHub] Created new file: {file_path}")
-                else:
-                    raise
-            
             # 3. Create the pull request
             pr_title = f"feat({ticket_id}): {ticket_title}"
-            pr_body = f"### Ticket: {ticket_id}\n\nThis PR implements the solution for the ticket: **{ticket_title}**."
+            file_list = "\n".join(f"- `{path}`" for path in files)
+            pr_body = f"### Ticket: {ticket_id}\n\nThis PR implements the solution for the ticket: **{ticket_title}**.\n\n#### Files\n{file_list}"
             print(f"[GitHub] Creating Pull Request: '{pr_title}'")
-            
-            pr = self.repo.create_pull(
-                title=pr_title,
-                body=pr_body,
-                head=branch_name,
-                base=base_branch
-            )
-            
+
+            with span("github.create_pull"):
+                pr = self.repo.create_pull(
+                    title=pr_title,
+                    body=pr_body,
+                    head=branch_name,
+                    base=base_branch
+                )
+
             print(f"[GitHub] Successfully created PR: {pr.html_url}")
-            return {"success": True, "pr_url": pr.html_url}
+            return {"success": True, "pr_url": pr.html_url, "branch": branch_name, "commit_sha": commit.sha, "files": list(files)}
 
         except GithubException as e:
-            error_message = f"GitHub API error: {e.data.get('message', str(e))}"
+            # The cached base head may be what failed (e.g. force-pushed branch), so drop it
+            self.invalidate_base_commit(base_branch)
+            error_message = f"GitHub API error: {e.data.get('message', str(e)) if isinstance(e.data, dict) else str(e)}"
             print(f"[GitHub] {error_message}")
             return {"success": False, "error": error_message}
         except Exception as e:
             print(f"[GitHub] An unexpected error occurred: {str(e)}")
             return {"success": False, "error": str(e)}
-
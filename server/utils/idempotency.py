@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable
+
+from .metrics import CACHE_REQUESTS
+
+# Idempotency keys and a local store of the results of side-effecting calls
+# (Linear issue creation, agent runs, pull requests), so retries and client
+# resubmits return the first result instead of doing the work again.
+
+
+def idempotency_key(*parts) -> str:
+    """
+    Stable key for a call, derived from the job it belongs to and the content it acts on.
+    """
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def deterministic_uuid(key: str) -> str:
+    """
+    UUID derived from `key`, shaped as a v4 UUID because that is what Linear accepts for client-chosen ids.
+    """
+    return str(uuid.UUID(bytes=hashlib.sha256(key.encode("utf-8")).digest()[:16], version=4))
+
+
+class IdempotencyStore:
+    """
+    Results of completed calls by (scope, key), kept in a SQLite file for `ttl_seconds`.
+
+    run() serializes calls with the same key inside the process, so two workers
+    handed the same ticket don't both do the work.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 7 * 24 * 3600, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._local = threading.local()
+        # (scope, key) -> [lock, number of callers using it]
+        self._locks: dict[tuple, list] = {}
+        self._locks_lock = threading.Lock()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS idempotency ("
+            "scope TEXT NOT NULL, key TEXT NOT NULL, result TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (scope, key))"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, scope: str, key: str) -> Any | None:
+        row = self._connect().execute(
+            "SELECT result FROM idempotency WHERE scope = ? AND key = ? AND created_at > ?",
+            (scope, key, self.clock() - self.ttl_seconds),
+        ).fetchone()
+        CACHE_REQUESTS.inc(cache="idempotency", entity=scope, result="hit" if row else "miss")
+        return json.loads(row[0]) if row else None
+
+    def set(self, scope: str, key: str, result: Any):
+        conn = self._connect()
+        now = self.clock()
+        conn.execute(
+            "INSERT OR REPLACE INTO idempotency (scope, key, result, created_at) VALUES (?, ?, ?, ?)",
+            (scope, key, json.dumps(result, default=str), now),
+        )
+        conn.execute("DELETE FROM idempotency WHERE created_at <= ?", (now - self.ttl_seconds,))
+
+    def _acquire(self, scope: str, key: str):
+        with self._locks_lock:
+            entry = self._locks.setdefault((scope, key), [threading.Lock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+
+    def _release(self, scope: str, key: str):
+        with self._locks_lock:
+            entry = self._locks[(scope, key)]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[(scope, key)]
+        entry[0].release()
+
+    def run(self, scope: str, key: str, func: Callable[[], Any], should_store: Callable[[Any], bool] = bool) -> Any:
+        """
+        Returns the stored result for (scope, key), or calls `func()` and stores
+        its result if `should_store(result)`. Failures are not stored, so they are retried.
+        """
+        self._acquire(scope, key)
+        try:
+            stored = self.get(scope, key)
+            if stored is not None:
+                print(f"[Idempotency] Reusing the stored {scope} result for key {key[:12]}")
+                return stored
+            result = func()
+            if should_store(result):
+                self.set(scope, key, result)
+            return result
+        finally:
+            self._release(scope, key)
+
+    def clear(self):
+        self._connect().execute("DELETE FROM idempotency")
+
+    def stats(self) -> dict:
+        rows = self._connect().execute("SELECT scope, COUNT(*) FROM idempotency GROUP BY scope").fetchall()
+        return {"entries": dict(rows)}
+
+
+_store: IdempotencyStore | None = None
+_store_lock = threading.Lock()
+
+
+def idempotency_enabled() -> bool:
+    return os.environ.get("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    """
+    Returns the process-wide idempotency store, configured from env vars:
+    IDEMPOTENCY_STORE_PATH and IDEMPOTENCY_TTL_SECONDS.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = IdempotencyStore(
+                    os.environ.get("IDEMPOTENCY_STORE_PATH", ".cache/idempotency.sqlite3"),
+                    ttl_seconds=float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", str(7 * 24 * 3600))),
+                )
+    return _store
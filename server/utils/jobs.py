@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from .logging_utils import log_error
+from .metrics import correlation
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class Job:
+    """
+    State of one background job. Progress is published as an append-only list
+    of events, so any number of pollers or stream subscribers can follow it by
+    remembering the last event id they saw.
+    """
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.events: list[dict] = []
+        self._lock = threading.Lock()
+
+    def publish(self, event: str, data: Any = None):
+        with self._lock:
+            self.events.append({"id": len(self.events) + 1, "event": event, "data": data})
+
+    def events_after(self, last_id: int = 0) -> list[dict]:
+        with self._lock:
+            return self.events[last_id:]
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_COMPLETED, JOB_FAILED)
+
+    def to_dict(self, include_events: bool = False) -> dict:
+        with self._lock:
+            data = {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "result": self.result,
+                "error": self.error,
+                "last_event_id": len(self.events),
+            }
+            if include_events:
+                data["events"] = list(self.events)
+            return data
+
+
+class JobManager:
+    """
+    Runs jobs on a bounded background thread pool and keeps their state in
+    memory for `retention_seconds` after they finish.
+    """
+
+    def __init__(self, max_workers: int = 2, retention_seconds: float = 3600):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.retention_seconds = retention_seconds
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, target: Callable[..., Any], *args, **kwargs) -> Job:
+        """
+        Schedules `target(job, *args, **kwargs)`; its return value becomes the job result.
+        """
+        self._evict_expired()
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+        job.publish("status", {"status": JOB_QUEUED})
+        self.executor.submit(self._run, job, target, args, kwargs)
+        return job
+
+    def _run(self, job: Job, target, args, kwargs):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        job.publish("status", {"status": JOB_RUNNING})
+        try:
+            # Everything the job logs or times is tagged with its id
+            with correlation(job.id):
+                job.result = target(job, *args, **kwargs)
+            job.status = JOB_COMPLETED
+        except Exception as e:
+            job.error = str(e)
+            job.status = JOB_FAILED
+            log_error(
+                f"Background job {job.id} ({job.kind}) failed: {e}",
+                extra={"job_id": job.id, "traceback": traceback.format_exc()},
+                alert=True
+            )
+        finally:
+            job.finished_at = time.time()
+            job.publish("done", {"status": job.status, "error": job.error})
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_manager: JobManager | None = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """
+    Returns the process-wide job manager, sized by JOBS_MAX_WORKERS and JOBS_RETENTION_SECONDS.
+    """
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = JobManager(
+                    max_workers=int(os.environ.get("JOBS_MAX_WORKERS", "2")),
+                    retention_seconds=float(os.environ.get("JOBS_RETENTION_SECONDS", "3600")),
+                )
+    return _manager
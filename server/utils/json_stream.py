@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import json
+
+
+class JSONArrayStreamParser:
+    """
+    Incremental parser for a JSON array arriving in arbitrary text chunks.
+
+    Call `feed(chunk)` with each piece of text as it arrives; it returns the
+    top-level array elements that were completed by that chunk. Any prose or
+    code fences before the opening `[` are skipped. Only object and array
+    elements are emitted, which is what the LLM ticket prompts produce.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._element_start = None
+
+    def feed(self, chunk: str) -> list:
+        if self.done or not chunk:
+            return []
+        self._buffer += chunk
+        elements = []
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer):
+            char = buffer[pos]
+            if not self._started:
+                if char == "[":
+                    self._started = True
+                    self._depth = 1
+                pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 1:
+                    self._element_start = pos
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._element_start is not None:
+                    raw = buffer[self._element_start:pos + 1]
+                    self._element_start = None
+                    try:
+                        elements.append(json.loads(raw))
+                    except json.JSONDecodeError:
+                        # A malformed element is dropped; the rest of the array is still usable
+                        pass
+                elif self._depth == 0:
+                    self.done = True
+                    pos += 1
+                    break
+            pos += 1
+
+        # Drop consumed text so the buffer only holds the element in progress
+        keep_from = self._element_start if self._element_start is not None else pos
+        self._buffer = buffer[keep_from:]
+        if self._element_start is not None:
+            self._element_start = 0
+        self._pos = pos - keep_from
+        return elements
+
+
+def iter_json_array(chunks):
+    """
+    Yields each element of a streamed JSON array as soon as it is complete.
+    """
+    parser = JSONArrayStreamParser()
+    for chunk in chunks:
+        for element in parser.feed(chunk):
+            yield element
+        if parser.done:
+            break
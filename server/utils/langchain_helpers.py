@@ -1,18 +1,200 @@
 import os
+import time
+from typing import Any
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
 from langchain_openai import ChatOpenAI
+from .cassette import MODE_REPLAY, get_cassette
+from .llm_cache import get_llm_cache, llm_cache_enabled
+from .llm_router import TASK_DEFAULT, build_routed_model, watch_fallbacks
+from .llm_usage import attach_usage_tracking
 
-def get_llm():
+_llm_factory = None
+
+def set_llm_factory(factory):
+    """
+    Makes get_llm() build its models with `factory()` instead of ChatOpenAI (e.g. a
+    fake model for benchmarks), for every route. Pass None to restore the default.
     """
-    Returns a configured ChatOpenAI instance using env vars.
+    global _llm_factory
+    _llm_factory = factory
+
+class CassetteChatModel(BaseChatModel):
     """
+    Records the wrapped model's replies to the cassette, or replays them without
+    calling any model (see utils/cassette.py). Streams are recorded as their chunks.
+    """
+
+    model_name: str
+    temperature: float = 0.0
+    inner: Any = None
+    cassette: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def _request(self, messages) -> dict:
+        # A cassette records one setup, so replies are matched on the messages alone
+        return {"messages": [[m.type, m.content] for m in messages]}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text = self.cassette.play(
+            "llm",
+            self._request(messages),
+            lambda: _message_text(self.inner.invoke(messages, stop=stop)),
+            serialize=lambda text: {"text": text},
+            deserialize=lambda data: data["text"],
+        )
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        request = self._request(messages)
+        if self.cassette.mode == MODE_REPLAY:
+            interaction = self.cassette.lookup("llm", {**request, "stream": True})
+            chunks = interaction["response"]["chunks"] or [""]
+            # The recorded duration is spread over the chunks so time-to-first-ticket stays realistic
+            for chunk in chunks:
+                time.sleep(self.cassette.replay_delay(interaction) / len(chunks))
+                yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+            return
+        started = time.perf_counter()
+        chunks = []
+        for chunk in self.inner.stream(messages, stop=stop):
+            text = _message_text(chunk)
+            chunks.append(text)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+        self.cassette.record("llm", {**request, "stream": True}, {"chunks": chunks}, time.perf_counter() - started)
+
+
+def _build_llm(model_name="gpt-4o-mini", timeout=None):
+    if _llm_factory is not None:
+        return _llm_factory()
     return ChatOpenAI(
         temperature=0,
-        model_name="gpt-4o-mini",
-        openai_api_key=os.environ.get("OPENAI_API_KEY")
+        model_name=model_name,
+        openai_api_key=os.environ.get("OPENAI_API_KEY"),
+        # Bounds each attempt, so a call abandoned by the router does not run on for long
+        timeout=timeout,
+        # Streamed replies report token usage too (see utils/llm_usage.py)
+        stream_usage=True,
+    )
+
+def get_llm(task=TASK_DEFAULT):
+    """
+    Returns the chat model for `task` (classify, clarify, plan, codegen), routed to
+    the model configured for it with a fallback on timeout, see utils/llm_router.py.
+    In cassette record/replay mode the model is wrapped in a CassetteChatModel;
+    replay never builds the real model.
+    Every call's token usage and cost is recorded, see utils/llm_usage.py.
+    """
+    cassette = get_cassette()
+    if cassette is not None and cassette.mode == MODE_REPLAY:
+        return attach_usage_tracking(CassetteChatModel(model_name="cassette", cassette=cassette))
+    inner = build_routed_model(task, _build_llm)
+    if cassette is None:
+        return attach_usage_tracking(inner)
+    return attach_usage_tracking(
+        CassetteChatModel(model_name=inner.model_name, temperature=inner.temperature, inner=inner, cassette=cassette)
     )
 
 def get_github_token():
     """
     Returns the GitHub API token from environment variables.
     """
-    return os.environ.get("GITHUB_TOKEN")
\ No newline at end of file
+    return os.environ.get("GITHUB_TOKEN")
+
+def _model_key(llm) -> str:
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+    return f"{model}@{getattr(llm, 'temperature', None)}"
+
+
+def _message_text(message) -> str:
+    # llm.invoke returns an AIMessage; plain LLMs return a string
+    return message.content if hasattr(message, "content") else str(message)
+
+
+def run_chain(chain, use_cache=True, **inputs) -> str:
+    """
+    Runs an LLMChain, serving repeated (model, template, inputs) calls from the response cache.
+    Pass use_cache=False to always call the model. Replies from a route's fallback
+    model are not cached, since the key names the primary model.
+    """
+    if not (use_cache and llm_cache_enabled()):
+        return chain.run(**inputs)
+    cache = get_llm_cache()
+    model = _model_key(chain.llm)
+    key = cache.make_key(model, repr(chain.prompt), inputs)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    fallbacks = watch_fallbacks()
+    output = chain.run(**inputs)
+    if not fallbacks:
+        cache.set(key, output, model=model)
+    return output
+
+
+def predict(llm, prompt: str, use_cache=True, refresh=False) -> str:
+    """
+    Sends a plain prompt to the model and returns the text of its reply, cached like run_chain.
+    With refresh=True the model is always called and its reply replaces the cached one.
+    """
+    if not (use_cache and llm_cache_enabled()):
+        return _message_text(llm.invoke(prompt))
+    cache = get_llm_cache()
+    model = _model_key(llm)
+    key = cache.make_key(model, None, prompt)
+    cached = None if refresh else cache.get(key)
+    if cached is not None:
+        return cached
+    fallbacks = watch_fallbacks()
+    output = _message_text(llm.invoke(prompt))
+    if not fallbacks:
+        cache.set(key, output, model=model)
+    return output
+
+
+def forget(llm, prompt: str):
+    """
+    Drops the cached reply to `prompt` (from predict or stream), e.g. once it turned out to be unusable.
+    """
+    if llm_cache_enabled():
+        cache = get_llm_cache()
+        cache.delete(cache.make_key(_model_key(llm), None, prompt))
+
+
+def forget_chain(chain, **inputs):
+    """
+    Drops the cached reply of run_chain(chain, **inputs).
+    """
+    if llm_cache_enabled():
+        cache = get_llm_cache()
+        cache.delete(cache.make_key(_model_key(chain.llm), repr(chain.prompt), inputs))
+
+
+def stream(llm, prompt: str, use_cache=True):
+    """
+    Yields the reply to `prompt` as text chunks. A cached reply is yielded as a
+    single chunk; a fresh one is stored once the stream completes.
+    """
+    if not (use_cache and llm_cache_enabled()):
+        for chunk in llm.stream(prompt):
+            yield _message_text(chunk)
+        return
+    cache = get_llm_cache()
+    model = _model_key(llm)
+    key = cache.make_key(model, None, prompt)
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    fallbacks = watch_fallbacks()
+    for chunk in llm.stream(prompt):
+        text = _message_text(chunk)
+        parts.append(text)
+        yield text
+    if not fallbacks:
+        cache.set(key, "".join(parts), model=model)
@@ -1,4 +1,9 @@
+import hashlib
+import hmac
 import os
+import time
+
+from .logging_utils import logger
 
 def get_linear_api_key():
     """
@@ -9,9 +14,59 @@ def get_linear_api_key():
         os.environ.get("LINEAR_DEVELOPER_TOKEN")
     )
     masked = (key[-4:] if key else None)
-    print(f"[Linear] get_linear_api_key called. Key ends with: {masked}")
+    logger.debug("[Linear] get_linear_api_key called. Key ends with: %s", masked)
     return key
 
 def get_linear_api_url():
-    print("[Linear] get_linear_api_url called.")
-    return "https://api.linear.app/graphql" 
\ No newline at end of file
+    logger.debug("[Linear] get_linear_api_url called.")
+    return os.environ.get("LINEAR_API_URL", "https://api.linear.app/graphql")
+
+def get_linear_pool_size():
+    """
+    Returns the max number of pooled keep-alive connections to Linear.
+    """
+    return int(os.environ.get("LINEAR_POOL_SIZE", "10"))
+
+def get_linear_timeouts():
+    """
+    Returns the (connect, read) timeouts in seconds for Linear requests.
+    """
+    connect = float(os.environ.get("LINEAR_CONNECT_TIMEOUT", "5"))
+    read = float(os.environ.get("LINEAR_READ_TIMEOUT", "30"))
+    return connect, read
+
+def get_linear_bulk_chunk_size():
+    """
+    Returns how many issueCreate operations are packed into one bulk GraphQL request.
+    """
+    return int(os.environ.get("LINEAR_BULK_CHUNK_SIZE", "10"))
+
+def get_linear_page_size():
+    """
+    Returns how many nodes are requested per page when paginating Linear connections (Linear allows up to 250).
+    """
+    return int(os.environ.get("LINEAR_PAGE_SIZE", "50"))
+
+def get_linear_webhook_secret():
+    """
+    Returns the signing secret of the Linear webhook, or None if webhooks are not configured.
+    """
+    return os.environ.get("LINEAR_WEBHOOK_SECRET")
+
+def verify_linear_webhook(body: bytes, signature: str, secret: str, webhook_timestamp=None, tolerance_seconds: float = 60, now: float = None):
+    """
+    Checks the Linear-Signature header (hex HMAC-SHA256 of the raw body) and, when the
+    payload's webhookTimestamp (ms) is given, that it is at most `tolerance_seconds` old.
+    """
+    if not signature or not secret:
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, signature.strip()):
+        return False
+    if webhook_timestamp is not None:
+        now = time.time() if now is None else now
+        try:
+            return abs(now - float(webhook_timestamp) / 1000) <= tolerance_seconds
+        except (TypeError, ValueError):
+            return False
+    return True
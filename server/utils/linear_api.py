@@ -1,42 +1,134 @@
 from __future__ import annotations
 
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
 import requests
-from .linear import get_linear_api_key, get_linear_api_url
-import json
+from requests.adapters import HTTPAdapter
+from .linear import get_linear_api_key, get_linear_api_url, get_linear_pool_size, get_linear_timeouts, get_linear_bulk_chunk_size, get_linear_page_size
 from typing import Any
-from .logging_utils import network_guard, log_error
+from .logging_utils import network_guard, log_error, logger, lazy
+from .metadata_cache import MetadataCache, get_metadata_cache
+from .metrics import bind, span
+from .cassette import get_cassette, http_request
+from .idempotency import deterministic_uuid, get_idempotency_store, idempotency_enabled
+from .linear_queries import PROFILE_MINIMAL, PROFILE_STANDARD, bulk_issue_create, queries, record_payload
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+_async_clients: dict[Any, httpx.AsyncClient] = {}
+_prefetch_executor: ThreadPoolExecutor | None = None
+
+# Idempotency store scope of created issues
+CREATE_TICKET_SCOPE = "linear.create_ticket"
+
+
+def get_http_session() -> requests.Session:
+    """
+    Returns the process-wide pooled requests.Session used for Linear calls.
+    The session keeps connections alive so repeated GraphQL calls skip the TCP+TLS handshake.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = get_linear_pool_size()
+                session = requests.Session()
+                # Retries are handled by network_guard, so the adapter must not retry on its own
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Returns the pooled httpx.AsyncClient for the running event loop.
+    Clients are bound to the loop they were created on, so one is kept per loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        pool_size = get_linear_pool_size()
+        connect, read = get_linear_timeouts()
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read, connect=connect),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    """
+    Returns the shared pool that fetches the next page of a paginated Linear query
+    while the current one is being consumed.
+    """
+    global _prefetch_executor
+    if _prefetch_executor is None:
+        with _session_lock:
+            if _prefetch_executor is None:
+                _prefetch_executor = ThreadPoolExecutor(max_workers=get_linear_pool_size(), thread_name_prefix="linear-prefetch")
+    return _prefetch_executor
+
+
+def close_http_session():
+    """
+    Closes the shared sync session. A new one is created lazily on next use.
+    """
+    global _session, _prefetch_executor
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+        if _prefetch_executor is not None:
+            _prefetch_executor.shutdown(wait=False)
+            _prefetch_executor = None
 
-class LinearAPI:
-    def __init__(self):
+
+async def close_async_http_client():
+    """
+    Closes the pooled async client bound to the running event loop.
+    """
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def _collect(nodes) -> list:
+    return [node async for node in nodes]
+
+
+def _stage_name(operation) -> str:
+    # "_get_ticket_op" -> "linear.get_ticket"
+    return "linear." + operation.__name__.strip("_").removesuffix("_op")
+
+
+class _LinearOperations:
+    """
+    Transport-independent Linear operations shared by LinearAPI and AsyncLinearAPI.
+
+    Each `_*_op` method is a generator that yields a GraphQL payload, receives the
+    HTTP response for it (or has the transport error thrown into it) and returns
+    the parsed result. The sync and async clients only differ in how they post.
+    """
+
+    def __init__(self, cache: MetadataCache | None = None):
+        self.cache = cache or get_metadata_cache()
         self.api_key = get_linear_api_key()
         self.api_url = get_linear_api_url()
+        self.page_size = get_linear_page_size()
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
-    
-    @network_guard(max_retries=3, backoff_factor=0.75)
-    def _safe_post(self, *args, **kwargs):
-        return requests.post(*args, **kwargs)
 
-    def add_comment(self, ticket_id: str, body: str) -> dict:
-        """
-        Adds a comment to the specified Linear ticket (issue).
-        Returns the API response dict.
-        """
-        print(f"[Linear] Adding comment to ticket {ticket_id}: {body[:120]}...")
-        mutation = """
-        mutation IssueCommentCreate($input: CommentCreateInput!) {
-          commentCreate(input: $input) {
-            success
-            comment {
-              id
-              body
-              createdAt
-            }
-          }
-        }
-        """
+    def _add_comment_op(self, ticket_id: str, body: str, profile: str = PROFILE_MINIMAL):
+        logger.debug("[Linear] Adding comment to ticket %s: %s", ticket_id, lazy(lambda: body, 120))
+        mutation = queries.document("IssueCommentCreate", profile)
         variables = {
             "input": {
                 "issueId": ticket_id,
@@ -44,12 +136,8 @@ class LinearAPI:
             }
         }
         try:
-            response = self._safe_post(
-                self.api_url,
-                headers=self.headers,
-                json={"query": mutation, "variables": variables},
-            )
-            print(f"[Linear] add_comment response: {response.text[:500]}")
+            response = yield {"query": mutation, "variables": variables}
+            logger.debug("[Linear] add_comment response: %s", lazy(lambda: response.text, 500))
             return response.json().get("data", {}).get("commentCreate", {})
         except Exception as e:
             log_error(
@@ -59,86 +147,177 @@ class LinearAPI:
             )
             return {"success": False, "error": str(e)}
 
-    def create_ticket(self, team_id, title, description, assignee_id=None, label_ids=None):
-        print(f"[Linear] Creating ticket: team_id={team_id}, title={title}, assignee_id={assignee_id}, label_ids={label_ids}")
-        mutation = """
-        mutation IssueCreate($input: IssueCreateInput!) {
-          issueCreate(input: $input) {
-            success
-            issue {
-              id
-              identifier
-              title
-              description
-              assignee { id name email }
-              url
-              labels { nodes { id name } }
-            }
-          }
-        }
-        """
-        variables = {
-            "input": {
-                "teamId": team_id,
-                "title": title,
-                "description": description,
-            }
+    @staticmethod
+    def _issue_input(team_id, title, description, assignee_id=None, label_ids=None, idempotency_key=None) -> dict:
+        issue_input = {
+            "teamId": team_id,
+            "title": title,
+            "description": description,
         }
+        if idempotency_key:
+            # A retried create then carries the same id, which Linear refuses to create twice
+            issue_input["id"] = deterministic_uuid(idempotency_key)
         if assignee_id:
-            variables["input"]["assigneeId"] = assignee_id
+            issue_input["assigneeId"] = assignee_id
         if label_ids:
-            print(f"[Linear] label_ids type: {type(label_ids)}, value: {label_ids}")
             if isinstance(label_ids, str):
                 label_ids = [label_ids]
             elif isinstance(label_ids, list):
                 label_ids = [str(lid) for lid in label_ids]
-            variables["input"]["labelIds"] = label_ids
-        print(f"[Linear] Final variables for mutation: {variables}")
-        print(f"[Linear] Payload: {json.dumps({'query': mutation, 'variables': variables}, indent=2)}")
+            issue_input["labelIds"] = label_ids
+        return issue_input
+
+    @staticmethod
+    def _stored_creation(idempotency_key):
+        if not (idempotency_key and idempotency_enabled()):
+            return None
+        return get_idempotency_store().get(CREATE_TICKET_SCOPE, idempotency_key)
+
+    @staticmethod
+    def _store_creation(idempotency_key, result: dict):
+        if idempotency_key and idempotency_enabled() and result.get("success"):
+            get_idempotency_store().set(CREATE_TICKET_SCOPE, idempotency_key, result)
+
+    def _recover_creation_op(self, idempotency_key, failure: dict, profile: str = PROFILE_STANDARD):
+        """
+        After a failed create with an idempotency key, looks the issue up by its
+        deterministic id: an earlier attempt whose response was lost may have created it.
+        """
+        if not idempotency_key:
+            return failure
+        issue = yield from self._get_ticket_op(deterministic_uuid(idempotency_key), profile)
+        if not issue:
+            return failure
+        logger.info("[Linear] Issue %s already existed, reusing it", issue.get("identifier"))
+        return {"success": True, "issue": issue}
+
+    def _create_ticket_op(self, team_id, title, description, assignee_id=None, label_ids=None, idempotency_key=None,
+                          profile: str = PROFILE_STANDARD):
+        """
+        With an `idempotency_key`, repeated calls (and network_guard retries) create
+        the issue at most once and return the first result.
+        `profile` selects the issue fields returned, see utils/linear_queries.py.
+        """
+        stored = self._stored_creation(idempotency_key)
+        if stored is not None:
+            return stored
+        logger.debug("[Linear] Creating ticket: team_id=%s, title=%s, assignee_id=%s, label_ids=%s", team_id, title, assignee_id, label_ids)
+        mutation = queries.document("IssueCreate", profile)
+        variables = {"input": self._issue_input(team_id, title, description, assignee_id, label_ids, idempotency_key)}
+        logger.debug("[Linear] Final variables for mutation: %s", lazy(lambda: variables))
         try:
-            response = self._safe_post(
-                self.api_url,
-                headers=self.headers,
-                json={"query": mutation, "variables": variables},
-            )
-            print(f"[Linear] Response: {response.text[:500]}")
+            response = yield {"query": mutation, "variables": variables}
+            logger.debug("[Linear] Response: %s", lazy(lambda: response.text, 500))
             data = response.json()
-            return data["data"]["issueCreate"]
+            result = data["data"]["issueCreate"]
+            if not result:
+                raise ValueError((data.get("errors") or [{}])[0].get("message", "issueCreate returned no payload"))
         except Exception as e:
-            log_error(
-                f"Failed to create Linear ticket: {e}",
-                extra={"team_id": team_id, "title": title, "assignee_id": assignee_id, "label_ids": label_ids},
-                alert=True
-            )
-            return {"success": False, "error": str(e)}
+            result = yield from self._recover_creation_op(idempotency_key, {"success": False, "error": str(e)}, profile)
+            if not result.get("success"):
+                log_error(
+                    f"Failed to create Linear ticket: {e}",
+                    extra={"team_id": team_id, "title": title, "assignee_id": assignee_id, "label_ids": label_ids},
+                    alert=True
+                )
+        self._store_creation(idempotency_key, result)
+        return result
 
-    def get_team_id_by_key(self, team_key):
-        print(f"[Linear] Looking up team by key: {team_key}")
-        query = """
-        query {
-          teams {
-            nodes {
-              id
-              name
-              key
+    def _create_tickets_bulk_op(self, tickets: list[dict], chunk_size: int, profile: str = PROFILE_STANDARD):
+        """
+        Creates many issues with one aliased `issueCreate` mutation per chunk.
+        Each ticket dict takes the create_ticket keyword arguments. Returns one
+        result per ticket, in order, shaped like create_ticket's return value.
+        Tickets whose idempotency_key was already created are not sent again.
+        """
+        results = [self._stored_creation(ticket.get("idempotency_key")) for ticket in tickets]
+        pending = [index for index, result in enumerate(results) if result is None]
+        for start in range(0, len(pending), chunk_size):
+            indexes = pending[start:start + chunk_size]
+            chunk = [tickets[index] for index in indexes]
+            logger.debug("[Linear] Creating %d tickets in one request (offset %d)", len(chunk), start)
+            mutation = bulk_issue_create(len(chunk), profile)
+            variables = {
+                f"input{i}": self._issue_input(
+                    ticket["team_id"],
+                    ticket["title"],
+                    ticket.get("description", ""),
+                    ticket.get("assignee_id"),
+                    ticket.get("label_ids"),
+                    ticket.get("idempotency_key"),
+                )
+                for i, ticket in enumerate(chunk)
             }
-          }
-        }
+            chunk_results = []
+            try:
+                response = yield {"query": mutation, "variables": variables}
+                logger.debug("[Linear] Bulk create response: %s", lazy(lambda: response.text, 500))
+                body = response.json()
+                data = body.get("data") or {}
+                errors_by_alias = {}
+                for error in body.get("errors") or []:
+                    path = error.get("path") or []
+                    alias = path[0] if path else None
+                    errors_by_alias.setdefault(alias, error.get("message", "Unknown GraphQL error"))
+                for i in range(len(chunk)):
+                    payload = data.get(f"t{i}")
+                    if payload and payload.get("success"):
+                        chunk_results.append(payload)
+                    else:
+                        error = errors_by_alias.get(f"t{i}") or errors_by_alias.get(None) or "issueCreate did not succeed"
+                        chunk_results.append({"success": False, "error": error})
+            except Exception as e:
+                log_error(
+                    f"Failed to bulk create Linear tickets: {e}",
+                    extra={"offset": start, "count": len(chunk), "titles": [t.get("title") for t in chunk]},
+                    alert=True
+                )
+                chunk_results = [{"success": False, "error": str(e)} for _ in chunk]
+            for index, ticket, result in zip(indexes, chunk, chunk_results):
+                if not result.get("success"):
+                    result = yield from self._recover_creation_op(ticket.get("idempotency_key"), result, profile)
+                self._store_creation(ticket.get("idempotency_key"), result)
+                results[index] = result
+        return results
+
+    def _page_op(self, query: str, path: tuple, variables: dict | None, page_size: int, after: str | None):
         """
-        print(f"[Linear] Payload: {{'query': query}}")
+        Fetches one page of a connection queried with `$first`/`$after`.
+        `path` leads from `data` to the connection. Returns (nodes, pageInfo).
+        Errors are logged and re-raised so a failed page is never mistaken for the end of the collection.
+        """
+        payload = {"query": query, "variables": {**(variables or {}), "first": page_size, "after": after}}
         try:
-            response = self._safe_post(
-                self.api_url,
-                headers=self.headers,
-                json={"query": query},
+            response = yield payload
+            logger.debug("[Linear] Page of %s: %s", ".".join(path), lazy(lambda: response.text, 500))
+            body = response.json()
+            if body.get("errors"):
+                raise ValueError(f"GraphQL errors: {body['errors']}")
+            connection = body.get("data")
+            for key in path:
+                connection = (connection or {}).get(key)
+            connection = connection or {}
+            return connection.get("nodes") or [], connection.get("pageInfo") or {}
+        except Exception as e:
+            log_error(
+                f"Failed to fetch a page of Linear {'.'.join(path)}: {e}",
+                extra={"variables": variables, "after": after},
+                alert=True
             )
-            print(f"[Linear] Response: {response.text[:500]}")
-            data = response.json()
-            teams = data["data"]["teams"]["nodes"]
-            for team in teams:
-                if team["key"] == team_key:
-                    return team
-            return None
+            raise
+
+    TEAMS_QUERY = queries.document("Teams")
+    TEAM_MEMBERS_QUERY = queries.document("TeamMembers")
+    LABELS_QUERY = queries.document("IssueLabels")
+
+    def _get_team_id_by_key_op(self, team_key):
+        logger.debug("[Linear] Looking up team by key: %s", team_key)
+        query = queries.document("TeamByKey")
+        try:
+            response = yield {"query": query, "variables": {"key": team_key}}
+            logger.debug("[Linear] get_team_id_by_key response: %s", lazy(lambda: response.text, 500))
+            nodes = response.json()["data"]["teams"]["nodes"]
+            return nodes[0] if nodes else None
         except Exception as e:
             log_error(
                 f"Failed to get Linear team by key: {e}",
@@ -147,28 +326,13 @@ class LinearAPI:
             )
             return None
 
-    def get_user_id_by_email(self, email):
-        print(f"[Linear] Looking up user by email: {email}")
-        query = """
-        query UserByEmail($email: String!) {
-          users(filter: {email: {eq: $email}}) {
-            nodes {
-              id
-              name
-              email
-            }
-          }
-        }
-        """
+    def _get_user_id_by_email_op(self, email):
+        logger.debug("[Linear] Looking up user by email: %s", email)
+        query = queries.document("UserByEmail")
         variables = {"email": email}
-        print(f"[Linear] Payload: {{'query': query, 'variables': {variables}}}")
         try:
-            response = self._safe_post(
-                self.api_url,
-                headers=self.headers,
-                json={"query": query, "variables": variables},
-            )
-            print(f"[Linear] Response: {response.text[:500]}")
+            response = yield {"query": query, "variables": variables}
+            logger.debug("[Linear] Response: %s", lazy(lambda: response.text, 500))
             data = response.json()
             nodes = data["data"]["users"]["nodes"]
             return nodes[0] if nodes else None
@@ -180,89 +344,39 @@ class LinearAPI:
             )
             return None
 
-    def get_team_members(self, team_id):
-        """
-        Fetches all members for a given team ID.
-        """
-        print(f"[Linear] Fetching members for team_id='{team_id}'")
-        query = """
-        query TeamMembers($id: String!) {
-            team(id: $id) {
-                members {
-                    nodes {
-                        id
-                        name
-                        email
-                    }
-                }
-            }
-        }
-        """
+    def _get_viewer_op(self):
+        logger.debug("[Linear] Looking up the API key's user")
         try:
-            response = self.__raw_query(query, {"id": team_id})
-            print(f"[Linear] get_team_members response: {response}")
-            return response.get("data", {}).get("team", {}).get("members", {}).get("nodes", [])
+            response = yield {"query": queries.document("Viewer"), "variables": {}}
+            logger.debug("[Linear] get_viewer response: %s", lazy(lambda: response.text, 500))
+            return response.json()["data"]["viewer"]
         except Exception as e:
-            log_error(
-                f"Failed to fetch Linear team members: {e}",
-                extra={"team_id": team_id},
-                alert=True
-            )
-            return []
+            log_error(f"Failed to get the Linear API key's user: {e}", alert=True)
+            return None
 
-    def get_labels(self):
-        print(f"[Linear] Fetching all labels")
-        query = """
-        query {
-          issueLabels {
-            nodes {
-              id
-              name
-              color
-            }
-          }
-        }
-        """
+    def _get_label_by_name_op(self, name: str):
+        logger.debug("[Linear] Looking up label by name: %s", name)
+        query = queries.document("LabelByName")
         try:
-            response = self.__raw_query(query)
-            print(f"[Linear] get_labels response: {response}")
-            return response.get("data", {}).get("issueLabels", {}).get("nodes", [])
+            response = yield {"query": query, "variables": {"name": name}}
+            logger.debug("[Linear] get_label_by_name response: %s", lazy(lambda: response.text, 500))
+            nodes = response.json()["data"]["issueLabels"]["nodes"]
+            return nodes[0] if nodes else None
         except Exception as e:
             log_error(
-                f"Failed to fetch Linear labels: {e}",
+                f"Failed to get Linear label by name: {e}",
+                extra={"name": name},
                 alert=True
             )
-            return []
+            return None
 
-    def get_ticket(self, ticket_id: str) -> dict | None:
-        """
-        Fetches a single ticket (issue) by its Linear ID.
-        Returns the issue data dict, or None if not found/error.
-        """
-        print(f"[Linear] Fetching ticket by id: {ticket_id}")
-        query = """
-        query IssueById($id: String!) {
-          issue(id: $id) {
-            id
-            identifier
-            title
-            description
-            url
-            labels { nodes { id name } }
-            assignee { id name email }
-            state { id name type }
-            team { id name key }
-            createdAt
-            updatedAt
-            priority
-            comments { nodes { id body createdAt } }
-          }
-        }
-        """
+    def _get_ticket_op(self, ticket_id: str, profile: str = PROFILE_STANDARD):
+        logger.debug("[Linear] Fetching ticket by id: %s", ticket_id)
+        query = queries.document("IssueById", profile)
         variables = {"id": ticket_id}
         try:
-            response = self.__raw_query(query, variables)
-            print(f"[Linear] get_ticket response: {response}")
+            response = yield from self._raw_query_op(query, variables)
+            logger.debug("[Linear] get_ticket response: %s", lazy(lambda: response, 500))
             return response.get("data", {}).get("issue", None)
         except Exception as e:
             log_error(
@@ -272,18 +386,14 @@ class LinearAPI:
             )
             return None
 
-    def __raw_query(self, query, variables=None):
-        print(f"[Linear] __raw_query: query={query}, variables={variables}")
+    def _raw_query_op(self, query, variables=None):
+        logger.debug("[Linear] Raw query: query=%s, variables=%s", lazy(lambda: " ".join(query.split()), 300), lazy(lambda: variables))
         payload = {"query": query}
         if variables:
             payload["variables"] = variables
         try:
-            response = self._safe_post(
-                self.api_url,
-                headers=self.headers,
-                json=payload,
-            )
-            print(f"[Linear] __raw_query response: {response.text[:500]}")
+            response = yield payload
+            logger.debug("[Linear] Raw query response: %s", lazy(lambda: response.text, 500))
             return response.json()
         except Exception as e:
             log_error(
@@ -291,4 +401,254 @@ class LinearAPI:
                 extra={"query": query, "variables": variables},
                 alert=True
             )
-            return {"error": str(e)} 
\ No newline at end of file
+            return {"error": str(e)}
+
+
+class LinearAPI(_LinearOperations):
+    def __init__(self, session: requests.Session | None = None, cache: MetadataCache | None = None):
+        super().__init__(cache)
+        self.session = session or get_http_session()
+        self.timeout = get_linear_timeouts()
+
+    @network_guard(max_retries=3, backoff_factor=0.75, service="linear", graphql=True)
+    def _safe_post(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        cassette = get_cassette()
+        if cassette is not None:
+            return cassette.play("linear", http_request("POST", url, kwargs.get("json")), lambda: self.session.post(url, **kwargs))
+        return self.session.post(url, **kwargs)
+
+    def _execute(self, operation):
+        """
+        Drives an operation generator, posting every payload it yields.
+        """
+        with span(_stage_name(operation)):
+            try:
+                payload = next(operation)
+                while True:
+                    try:
+                        response = self._safe_post(self.api_url, headers=self.headers, json=payload)
+                    except Exception as e:
+                        payload = operation.throw(e)
+                    else:
+                        record_payload(payload, response, _stage_name(operation))
+                        payload = operation.send(response)
+            except StopIteration as stop:
+                return stop.value
+
+    def add_comment(self, ticket_id: str, body: str, profile: str = PROFILE_MINIMAL) -> dict:
+        """
+        Adds a comment to the specified Linear ticket (issue).
+        Returns the API response dict; the comment only has its id unless a larger `profile` is asked for.
+        """
+        return self._execute(self._add_comment_op(ticket_id, body, profile))
+
+    def create_ticket(self, team_id, title, description, assignee_id=None, label_ids=None, idempotency_key=None,
+                      profile: str = PROFILE_STANDARD):
+        """
+        Creates an issue. Calls with the same `idempotency_key` create it at most once
+        and return the first successful result. `profile` selects the issue fields returned.
+        """
+        return self._execute(self._create_ticket_op(team_id, title, description, assignee_id, label_ids, idempotency_key, profile))
+
+    def create_tickets_bulk(self, tickets: list[dict], chunk_size: int | None = None, profile: str = PROFILE_STANDARD) -> list[dict]:
+        """
+        Creates many tickets with aliased issueCreate mutations, `chunk_size` per request.
+        Each ticket dict has team_id, title, description and optionally assignee_id, label_ids and idempotency_key.
+        Returns per-ticket results in input order: {"success": True, "issue": {...}} or {"success": False, "error": "..."}.
+        """
+        if not tickets:
+            return []
+        return self._execute(self._create_tickets_bulk_op(tickets, chunk_size or get_linear_bulk_chunk_size(), profile))
+
+    def get_teams(self):
+        """
+        Fetches all teams visible to the API key. Raises if a page fails, so a partial list is never cached.
+        """
+        return self.cache.get_or_load("teams", "", lambda: list(self.iter_teams()))
+
+    def get_team_id_by_key(self, team_key):
+        return self.cache.get_or_load("team", team_key, lambda: self._execute(self._get_team_id_by_key_op(team_key)))
+
+    def get_user_id_by_email(self, email):
+        return self.cache.get_or_load("user", email, lambda: self._execute(self._get_user_id_by_email_op(email)))
+
+    def get_viewer(self):
+        """
+        The user the API key acts as ({"id", "name", "email"}), or None if it can't be fetched.
+        """
+        return self.cache.get_or_load("viewer", "", lambda: self._execute(self._get_viewer_op()))
+
+    def get_team_members(self, team_id):
+        """
+        Fetches all members for a given team ID. Raises if a page fails.
+        """
+        return self.cache.get_or_load("team_members", team_id, lambda: list(self.iter_team_members(team_id)))
+
+    def get_labels(self):
+        return self.cache.get_or_load("labels", "", lambda: list(self.iter_labels()))
+
+    def get_label_by_name(self, name: str):
+        """
+        Looks up one label by name (case-insensitive) with a server-side filter.
+        """
+        return self.cache.get_or_load("label", name.lower(), lambda: self._execute(self._get_label_by_name_op(name)))
+
+    def _iter_pages(self, query: str, path: tuple, variables: dict | None = None, page_size: int | None = None, prefetch: bool = True):
+        """
+        Yields every node of a connection, page by page. With `prefetch`, the next
+        page is requested in the background as soon as the current one arrives.
+        A failed page raises instead of ending the iteration early.
+        """
+        page_size = page_size or self.page_size
+
+        def fetch(after):
+            return self._execute(self._page_op(query, path, variables, page_size, after))
+
+        nodes, page_info = fetch(None)
+        while True:
+            after = page_info.get("endCursor")
+            has_next = bool(page_info.get("hasNextPage") and after)
+            next_page = get_prefetch_executor().submit(bind(fetch), after) if has_next and prefetch else None
+            try:
+                yield from nodes
+            except BaseException:
+                # Consumer stopped early (close/throw): drop the prefetched page if it has not started
+                if next_page is not None:
+                    next_page.cancel()
+                raise
+            if not has_next:
+                return
+            nodes, page_info = next_page.result() if next_page else fetch(after)
+
+    def iter_teams(self, page_size: int | None = None, prefetch: bool = True):
+        return self._iter_pages(self.TEAMS_QUERY, ("teams",), page_size=page_size, prefetch=prefetch)
+
+    def iter_team_members(self, team_id, page_size: int | None = None, prefetch: bool = True):
+        return self._iter_pages(self.TEAM_MEMBERS_QUERY, ("team", "members"), {"id": team_id}, page_size, prefetch)
+
+    def iter_labels(self, page_size: int | None = None, prefetch: bool = True):
+        return self._iter_pages(self.LABELS_QUERY, ("issueLabels",), page_size=page_size, prefetch=prefetch)
+
+    def get_ticket(self, ticket_id: str, profile: str = PROFILE_STANDARD) -> dict | None:
+        """
+        Fetches a single ticket (issue) by its Linear ID; its comments are only included with profile="full".
+        Returns the issue data dict, or None if not found/error.
+        """
+        return self._execute(self._get_ticket_op(ticket_id, profile))
+
+
+class AsyncLinearAPI(_LinearOperations):
+    """
+    Async counterpart of LinearAPI with the same methods, awaitable.
+    Requests go through a pooled httpx.AsyncClient so no worker thread is held while waiting on Linear.
+    """
+
+    def __init__(self, client: httpx.AsyncClient | None = None, cache: MetadataCache | None = None):
+        super().__init__(cache)
+        self._client = client
+        connect, read = get_linear_timeouts()
+        # Passed on every request, so an injected client can't run without one
+        self.timeout = httpx.Timeout(read, connect=connect)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or get_async_http_client()
+
+    @network_guard(max_retries=3, backoff_factor=0.75, service="linear", graphql=True)
+    async def _safe_post(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        cassette = get_cassette()
+        if cassette is not None:
+            return await cassette.aplay("linear", http_request("POST", url, kwargs.get("json")), lambda: self.client.post(url, **kwargs))
+        return await self.client.post(url, **kwargs)
+
+    async def _execute(self, operation):
+        """
+        Drives an operation generator, awaiting the post for every payload it yields.
+        """
+        with span(_stage_name(operation)):
+            try:
+                payload = next(operation)
+                while True:
+                    try:
+                        response = await self._safe_post(self.api_url, headers=self.headers, json=payload)
+                    except Exception as e:
+                        payload = operation.throw(e)
+                    else:
+                        record_payload(payload, response, _stage_name(operation))
+                        payload = operation.send(response)
+            except StopIteration as stop:
+                return stop.value
+
+    async def add_comment(self, ticket_id: str, body: str, profile: str = PROFILE_MINIMAL) -> dict:
+        return await self._execute(self._add_comment_op(ticket_id, body, profile))
+
+    async def create_ticket(self, team_id, title, description, assignee_id=None, label_ids=None, idempotency_key=None,
+                            profile: str = PROFILE_STANDARD):
+        return await self._execute(self._create_ticket_op(team_id, title, description, assignee_id, label_ids, idempotency_key, profile))
+
+    async def create_tickets_bulk(self, tickets: list[dict], chunk_size: int | None = None, profile: str = PROFILE_STANDARD) -> list[dict]:
+        if not tickets:
+            return []
+        return await self._execute(self._create_tickets_bulk_op(tickets, chunk_size or get_linear_bulk_chunk_size(), profile))
+
+    async def get_teams(self):
+        return await self.cache.aget_or_load("teams", "", lambda: _collect(self.iter_teams()))
+
+    async def get_team_id_by_key(self, team_key):
+        return await self.cache.aget_or_load("team", team_key, lambda: self._execute(self._get_team_id_by_key_op(team_key)))
+
+    async def get_user_id_by_email(self, email):
+        return await self.cache.aget_or_load("user", email, lambda: self._execute(self._get_user_id_by_email_op(email)))
+
+    async def get_viewer(self):
+        return await self.cache.aget_or_load("viewer", "", lambda: self._execute(self._get_viewer_op()))
+
+    async def get_team_members(self, team_id):
+        return await self.cache.aget_or_load("team_members", team_id, lambda: _collect(self.iter_team_members(team_id)))
+
+    async def get_labels(self):
+        return await self.cache.aget_or_load("labels", "", lambda: _collect(self.iter_labels()))
+
+    async def get_label_by_name(self, name: str):
+        return await self.cache.aget_or_load("label", name.lower(), lambda: self._execute(self._get_label_by_name_op(name)))
+
+    async def _iter_pages(self, query: str, path: tuple, variables: dict | None = None, page_size: int | None = None, prefetch: bool = True):
+        """
+        Async generator over every node of a connection; the next page is fetched
+        in a task while the current one is consumed. A failed page raises.
+        """
+        page_size = page_size or self.page_size
+
+        def fetch(after):
+            return self._execute(self._page_op(query, path, variables, page_size, after))
+
+        nodes, page_info = await fetch(None)
+        while True:
+            after = page_info.get("endCursor")
+            has_next = bool(page_info.get("hasNextPage") and after)
+            next_page = asyncio.ensure_future(fetch(after)) if has_next and prefetch else None
+            try:
+                for node in nodes:
+                    yield node
+            except BaseException:
+                # Consumer stopped early (aclose/cancel): drop the prefetched page
+                if next_page is not None:
+                    next_page.cancel()
+                raise
+            if not has_next:
+                return
+            nodes, page_info = await next_page if next_page else await fetch(after)
+
+    def iter_teams(self, page_size: int | None = None, prefetch: bool = True):
+        return self._iter_pages(self.TEAMS_QUERY, ("teams",), page_size=page_size, prefetch=prefetch)
+
+    def iter_team_members(self, team_id, page_size: int | None = None, prefetch: bool = True):
+        return self._iter_pages(self.TEAM_MEMBERS_QUERY, ("team", "members"), {"id": team_id}, page_size, prefetch)
+
+    def iter_labels(self, page_size: int | None = None, prefetch: bool = True):
+        return self._iter_pages(self.LABELS_QUERY, ("issueLabels",), page_size=page_size, prefetch=prefetch)
+
+    async def get_ticket(self, ticket_id: str, profile: str = PROFILE_STANDARD) -> dict | None:
+        return await self._execute(self._get_ticket_op(ticket_id, profile))
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import functools
+import re
+import threading
+
+from .metrics import registry
+
+# Named Linear GraphQL documents, minified once at import instead of being
+# rebuilt and re-sent with their indentation on every call. Operations that
+# return an issue or a comment take a field profile:
+#   minimal  - ids and links only (what the orchestrator keeps of a created ticket)
+#   standard - what the agents read: title, description, assignee, labels, state
+#   full     - everything, including the issue's comments
+
+PROFILE_MINIMAL = "minimal"
+PROFILE_STANDARD = "standard"
+PROFILE_FULL = "full"
+PROFILES = (PROFILE_MINIMAL, PROFILE_STANDARD, PROFILE_FULL)
+
+ISSUE_FIELDS = {
+    PROFILE_MINIMAL: "id identifier url",
+    PROFILE_STANDARD: """
+        id identifier title description url
+        assignee { id name email }
+        labels { nodes { id name } }
+        state { id name type }
+    """,
+    PROFILE_FULL: """
+        id identifier title description url
+        assignee { id name email }
+        labels { nodes { id name } }
+        state { id name type }
+        team { id name key }
+        createdAt updatedAt priority
+        comments { nodes { id body createdAt } }
+    """,
+}
+
+COMMENT_FIELDS = {
+    PROFILE_MINIMAL: "id",
+    PROFILE_STANDARD: "id body createdAt",
+    PROFILE_FULL: "id body createdAt updatedAt url user { id name }",
+}
+
+# Stands for the profile's field selection in a registered template
+FIELDS = "__FIELDS__"
+
+LINEAR_PAYLOAD_BYTES = registry.histogram(
+    "cosine_linear_payload_bytes", "Linear GraphQL request document and response sizes per operation.", ("operation", "direction"),
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576),
+)
+
+_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|[^\s"]+')
+_OPERATION_NAME = re.compile(r"(?:query|mutation)\s+(\w+)")
+
+
+def _is_word(char: str) -> bool:
+    return char.isalnum() or char in '_"'
+
+
+def minify(document: str) -> str:
+    """
+    Drops every whitespace that doesn't separate two names (string literals are kept as they are).
+    """
+    out = ""
+    for token in _TOKEN.findall(document):
+        if out and _is_word(out[-1]) and _is_word(token[0]):
+            out += " "
+        out += token
+    return out
+
+
+def operation_name(document: str) -> str | None:
+    match = _OPERATION_NAME.match(document)
+    return match.group(1) if match else None
+
+
+class QueryRegistry:
+    """
+    Minified documents by operation name and profile. A template registered
+    with `fields` gets that profile's selection in place of FIELDS.
+    """
+
+    def __init__(self):
+        self._documents: dict[tuple[str, str], str] = {}
+
+    def register(self, template: str, fields: dict[str, str] | None = None) -> str:
+        name = operation_name(template.strip())
+        if name is None:
+            raise ValueError("Registered documents must be named operations")
+        for profile in PROFILES:
+            selection = (fields or {}).get(profile, "")
+            self._documents[(name, profile)] = minify(template.replace(FIELDS, selection))
+        return name
+
+    def document(self, name: str, profile: str = PROFILE_STANDARD) -> str:
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown field profile '{profile}', expected one of {', '.join(PROFILES)}")
+        return self._documents[(name, profile)]
+
+    def names(self) -> list[str]:
+        return sorted({name for name, _ in self._documents})
+
+
+queries = QueryRegistry()
+
+queries.register(f"""
+mutation IssueCommentCreate($input: CommentCreateInput!) {{
+  commentCreate(input: $input) {{
+    success
+    comment {{ {FIELDS} }}
+  }}
+}}
+""", COMMENT_FIELDS)
+
+queries.register(f"""
+mutation IssueCreate($input: IssueCreateInput!) {{
+  issueCreate(input: $input) {{
+    success
+    issue {{ {FIELDS} }}
+  }}
+}}
+""", ISSUE_FIELDS)
+
+queries.register(f"""
+query IssueById($id: String!) {{
+  issue(id: $id) {{ {FIELDS} }}
+}}
+""", ISSUE_FIELDS)
+
+queries.register("""
+query Teams($first: Int!, $after: String) {
+  teams(first: $first, after: $after) {
+    nodes { id name key }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+""")
+
+queries.register("""
+query TeamMembers($id: String!, $first: Int!, $after: String) {
+  team(id: $id) {
+    members(first: $first, after: $after) {
+      nodes { id name email }
+      pageInfo { hasNextPage endCursor }
+    }
+  }
+}
+""")
+
+queries.register("""
+query IssueLabels($first: Int!, $after: String) {
+  issueLabels(first: $first, after: $after) {
+    nodes { id name color }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+""")
+
+queries.register("""
+query TeamByKey($key: String!) {
+  teams(filter: {key: {eq: $key}}, first: 1) {
+    nodes { id name key }
+  }
+}
+""")
+
+queries.register("""
+query UserByEmail($email: String!) {
+  users(filter: {email: {eq: $email}}) {
+    nodes { id name email }
+  }
+}
+""")
+
+queries.register("""
+query Viewer {
+  viewer { id name email }
+}
+""")
+
+queries.register("""
+query LabelByName($name: String!) {
+  issueLabels(filter: {name: {eqIgnoreCase: $name}}, first: 1) {
+    nodes { id name color }
+  }
+}
+""")
+
+
+@functools.lru_cache(maxsize=64)
+def bulk_issue_create(count: int, profile: str = PROFILE_STANDARD) -> str:
+    """
+    The aliased `issueCreate` mutation for `count` issues (t0..tN-1 with $input0..$inputN-1).
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown field profile '{profile}', expected one of {', '.join(PROFILES)}")
+    declarations = ", ".join(f"$input{i}: IssueCreateInput!" for i in range(count))
+    selections = " ".join(f"t{i}: issueCreate(input: $input{i}) {{ ...BulkIssueFields }}" for i in range(count))
+    return minify(f"""
+    mutation BulkIssueCreate({declarations}) {{ {selections} }}
+    fragment BulkIssueFields on IssuePayload {{ success issue {{ {ISSUE_FIELDS[profile]} }} }}
+    """)
+
+
+class _PayloadStats:
+    """
+    Calls and bytes sent and received per operation since startup.
+    """
+
+    def __init__(self):
+        self._stats: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation: str, request_bytes: int, response_bytes: int):
+        LINEAR_PAYLOAD_BYTES.observe(request_bytes, operation=operation, direction="request")
+        LINEAR_PAYLOAD_BYTES.observe(response_bytes, operation=operation, direction="response")
+        with self._lock:
+            stats = self._stats.setdefault(operation, {"calls": 0, "request_bytes": 0, "response_bytes": 0})
+            stats["calls"] += 1
+            stats["request_bytes"] += request_bytes
+            stats["response_bytes"] += response_bytes
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                operation: {**stats, "avg_response_bytes": round(stats["response_bytes"] / stats["calls"])}
+                for operation, stats in sorted(self._stats.items())
+            }
+
+
+payload_stats = _PayloadStats()
+
+
+def record_payload(payload: dict, response, fallback_name: str):
+    """
+    Records the sizes of one request's GraphQL document and its response body.
+    """
+    document = payload.get("query") or ""
+    content = getattr(response, "content", None) or b""
+    payload_stats.record(operation_name(document) or fallback_name, len(document), len(content))
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+from .metrics import CACHE_REQUESTS
+
+
+class LLMResponseCache:
+    """
+    Content-addressed store for LLM completions, kept in a SQLite file.
+
+    Entries are keyed on the model, the prompt template and the rendered
+    inputs, expire after `ttl_seconds`, and the least recently used ones are
+    evicted once the stored text exceeds `max_bytes`.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024, ttl_seconds: float = 7 * 24 * 3600,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        with self._lock:
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, model TEXT, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model: str, template: str, inputs) -> str:
+        raw = json.dumps({"model": model, "template": template, "inputs": inputs}, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        conn = self._connect()
+        now = self.clock()
+        row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is not None and row[1] + self.ttl_seconds > now:
+            conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            with self._lock:
+                self.hits += 1
+            CACHE_REQUESTS.inc(cache="llm", entity="response", result="hit")
+            return row[0]
+        if row is not None:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+        with self._lock:
+            self.misses += 1
+        CACHE_REQUESTS.inc(cache="llm", entity="response", result="miss")
+        return None
+
+    def set(self, key: str, value: str, model: str = None):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        conn = self._connect()
+        now = self.clock()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, model, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, value, size, now, now),
+        )
+        self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM llm_cache WHERE created_at + ? <= ?", (self.ttl_seconds, self.clock()))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at ASC").fetchall():
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def delete(self, key: str):
+        self._connect().execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connect().execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+        entries, total = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "bytes": total,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache: LLMResponseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def llm_cache_enabled() -> bool:
+    return os.environ.get("LLM_CACHE_ENABLED", "true").lower() == "true"
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """
+    Returns the process-wide LLM response cache, configured from env vars:
+    LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES and LLM_CACHE_TTL_SECONDS.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache(
+                    os.environ.get("LLM_CACHE_PATH", ".cache/llm_responses.sqlite3"),
+                    max_bytes=int(os.environ.get("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024))),
+                    ttl_seconds=float(os.environ.get("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+                )
+    return _cache
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextvars import ContextVar
+from typing import Any, Callable
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .metrics import bind, registry
+
+# Per-task model routing. Each task type sends its calls to a primary model and,
+# when that model takes longer than the route's timeout (or fails), to a fallback.
+# Routes are configured with env vars named after the task, e.g. for codegen:
+# LLM_ROUTE_CODEGEN_MODEL, LLM_ROUTE_CODEGEN_FALLBACK ("" for none),
+# LLM_ROUTE_CODEGEN_TIMEOUT (seconds, 0 for none) and LLM_ROUTE_CODEGEN_SLO_MS.
+
+TASK_DEFAULT = "default"
+TASK_CLASSIFY = "classify"
+TASK_CLARIFY = "clarify"
+TASK_PLAN = "plan"
+TASK_CODEGEN = "codegen"
+
+# task -> (model, fallback model, timeout in seconds, latency SLO in ms)
+DEFAULT_ROUTES = {
+    TASK_DEFAULT: ("gpt-4o-mini", None, None, None),
+    # Yes/no sufficiency checks: the smallest model does
+    TASK_CLASSIFY: ("gpt-4.1-nano", "gpt-4o-mini", 15.0, 5000),
+    TASK_CLARIFY: ("gpt-4o-mini", "gpt-4.1-nano", 20.0, 8000),
+    # Idea -> tickets, streamed to the client
+    TASK_PLAN: ("gpt-4o-mini", "gpt-4.1-mini", 60.0, 30000),
+    # Code generation needs the stronger model; a late reply falls back to the fast one
+    TASK_CODEGEN: ("gpt-4.1", "gpt-4o-mini", 120.0, 60000),
+}
+# How many recent calls per route the latency percentiles are computed over
+ROUTE_STATS_WINDOW = int(os.environ.get("LLM_ROUTE_STATS_WINDOW", "1000"))
+
+ROUTE_LATENCY = registry.histogram(
+    "cosine_llm_route_duration_seconds", "LLM call latency per route, model and outcome.", ("route", "model", "outcome"),
+    buckets=(0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300),
+)
+ROUTE_FALLBACKS = registry.counter("cosine_llm_route_fallbacks_total", "LLM calls handed to a route's fallback model.", ("route", "reason"))
+
+
+class Route:
+    def __init__(self, task: str, model: str, fallback: str | None = None, timeout: float | None = None, slo_ms: float | None = None):
+        self.task = task
+        self.model = model
+        self.fallback = fallback
+        self.timeout = timeout
+        self.slo_ms = slo_ms
+
+    def to_dict(self) -> dict:
+        return {"model": self.model, "fallback": self.fallback, "timeout_seconds": self.timeout, "slo_ms": self.slo_ms}
+
+
+def _env_float(name: str, default: float | None) -> float | None:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return float(value) or None
+
+
+def load_route(task: str) -> Route:
+    """
+    The route for `task` from its LLM_ROUTE_<TASK>_* env vars over DEFAULT_ROUTES.
+    Unknown tasks get the default route's settings.
+    """
+    model, fallback, timeout, slo_ms = DEFAULT_ROUTES.get(task, DEFAULT_ROUTES[TASK_DEFAULT])
+    prefix = f"LLM_ROUTE_{task.upper()}_"
+    model = os.environ.get(prefix + "MODEL") or model
+    fallback = os.environ.get(prefix + "FALLBACK", fallback) or None
+    return Route(task, model, fallback, _env_float(prefix + "TIMEOUT", timeout), _env_float(prefix + "SLO_MS", slo_ms))
+
+
+def _percentile(ordered: list[float], pct: float) -> float | None:
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class RouteStats:
+    """
+    Outcome counts and a window of recent end-to-end latencies (fallback included) for one route.
+    """
+
+    def __init__(self, window: int = ROUTE_STATS_WINDOW):
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._counts = {"calls": 0, "fallbacks": 0, "timeouts": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, fallback_reason: str | None = None, failed: bool = False):
+        with self._lock:
+            self._latencies.append(seconds * 1000)
+            self._counts["calls"] += 1
+            if fallback_reason:
+                self._counts["fallbacks"] += 1
+                if fallback_reason == "timeout":
+                    self._counts["timeouts"] += 1
+            if failed:
+                self._counts["errors"] += 1
+
+    def summary(self, route: Route) -> dict:
+        with self._lock:
+            ordered = sorted(self._latencies)
+            counts = dict(self._counts)
+        latency = {f"p{pct}": _percentile(ordered, pct) for pct in (50, 95, 99)}
+        latency["max"] = ordered[-1] if ordered else None
+        within_slo = None
+        if route.slo_ms and ordered:
+            within_slo = sum(1 for value in ordered if value <= route.slo_ms) / len(ordered)
+        return {**route.to_dict(), **counts, "latency_ms": latency, "within_slo": within_slo}
+
+
+_stats: dict[str, RouteStats] = {}
+_stats_lock = threading.Lock()
+# Primary calls run here so a call that outlives its route's timeout can be abandoned
+_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("LLM_ROUTER_THREADS", "32")), thread_name_prefix="llm-route")
+
+
+def get_route_stats(task: str) -> RouteStats:
+    with _stats_lock:
+        return _stats.setdefault(task, RouteStats())
+
+
+def route_stats() -> dict:
+    """
+    Configuration and latency stats of every route, keyed by task.
+    """
+    with _stats_lock:
+        tasks = sorted(set(DEFAULT_ROUTES) | set(_stats))
+    return {task: get_route_stats(task).summary(load_route(task)) for task in tasks}
+
+
+def reset_route_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _model_name(model) -> str:
+    return getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__
+
+
+# Routes answered by their fallback model since the caller's watch_fallbacks()
+_fallbacks: ContextVar[list | None] = ContextVar("llm_route_fallbacks", default=None)
+
+
+def watch_fallbacks() -> list[str]:
+    """
+    Starts collecting the routes whose calls, from here on in the current context,
+    are answered by their fallback model, and returns the list they are added to.
+    Lets callers keep a degraded reply out of the response cache, where it would
+    pass for the primary model's answer.
+    """
+    fallbacks: list[str] = []
+    _fallbacks.set(fallbacks)
+    return fallbacks
+
+
+class RoutedChatModel(BaseChatModel):
+    """
+    Sends calls to `primary`, and to `fallback` when the primary has not answered
+    within `timeout` seconds or raised. A stream falls back only while it has not
+    produced its first chunk; after that it is the primary's to finish.
+    The abandoned primary call is left to finish in the background (its client timeout bounds it).
+    """
+
+    route: str
+    model_name: str
+    temperature: float = 0.0
+    primary: Any = None
+    fallback: Any = None
+    timeout: float | None = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"route": self.route, "model_name": self.model_name, "fallback": _model_name(self.fallback) if self.fallback else None}
+
+    def _observe(self, model, outcome: str, started: float):
+        ROUTE_LATENCY.observe(time.perf_counter() - started, route=self.route, model=_model_name(model), outcome=outcome)
+
+    def _call_primary(self, func: Callable[[], Any]):
+        if not self.timeout or self.fallback is None:
+            return func()
+        return _executor.submit(bind(func)).result(timeout=self.timeout)
+
+    def _fall_back(self, reason: str, error: BaseException | None) -> str:
+        ROUTE_FALLBACKS.inc(route=self.route, reason=reason)
+        fallbacks = _fallbacks.get()
+        if fallbacks is not None:
+            fallbacks.append(self.route)
+        detail = f"took longer than {self.timeout}s" if reason == "timeout" else f"failed: {error}"
+        print(f"[LLMRouter] {self.route}: {self.model_name} {detail}, falling back to {_model_name(self.fallback)}")
+        return reason
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        stats = get_route_stats(self.route)
+        started = time.perf_counter()
+        model, reason = self.primary, None
+        try:
+            message = self._call_primary(lambda: self.primary.invoke(messages, stop=stop))
+            self._observe(self.primary, "ok", started)
+        except Exception as e:
+            if self.fallback is None:
+                self._observe(self.primary, "error", started)
+                stats.record(time.perf_counter() - started, failed=True)
+                raise
+            self._observe(self.primary, "timeout" if isinstance(e, FutureTimeout) else "error", started)
+            reason = self._fall_back("timeout" if isinstance(e, FutureTimeout) else "error", e)
+            model, fallback_started = self.fallback, time.perf_counter()
+            try:
+                message = self.fallback.invoke(messages, stop=stop)
+            except Exception:
+                self._observe(self.fallback, "error", fallback_started)
+                stats.record(time.perf_counter() - started, reason, failed=True)
+                raise
+            self._observe(self.fallback, "fallback", fallback_started)
+        stats.record(time.perf_counter() - started, reason)
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"model_name": _model_name(model)})
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        stats = get_route_stats(self.route)
+        started = time.perf_counter()
+        model, reason, failed = self.primary, None, True
+        try:
+            chunks = iter(self.primary.stream(messages, stop=stop))
+            try:
+                first = self._call_primary(lambda: next(chunks, None))
+            except Exception as e:
+                if self.fallback is None:
+                    self._observe(self.primary, "error", started)
+                    raise
+                self._observe(self.primary, "timeout" if isinstance(e, FutureTimeout) else "error", started)
+                reason = self._fall_back("timeout" if isinstance(e, FutureTimeout) else "error", e)
+                model, started_model = self.fallback, time.perf_counter()
+                chunks = iter(self.fallback.stream(messages, stop=stop))
+                first = next(chunks, None)
+            else:
+                started_model = started
+            if first is not None:
+                yield ChatGenerationChunk(message=first)
+            for chunk in chunks:
+                yield ChatGenerationChunk(message=chunk)
+            self._observe(model, "fallback" if reason else "ok", started_model)
+            failed = False
+        finally:
+            stats.record(time.perf_counter() - started, reason, failed=failed)
+
+
+def build_routed_model(task: str, build_model: Callable[[str, float | None], Any]) -> RoutedChatModel:
+    """
+    A RoutedChatModel for `task`, building its models with `build_model(model_name, timeout)`.
+    """
+    route = load_route(task)
+    primary = build_model(route.model, route.timeout)
+    fallback = build_model(route.fallback, None) if route.fallback else None
+    return RoutedChatModel(
+        route=task,
+        model_name=_model_name(primary),
+        temperature=getattr(primary, "temperature", None) or 0.0,
+        primary=primary,
+        fallback=fallback,
+        timeout=route.timeout,
+    )
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .metrics import get_correlation_id, registry
+
+# Token and cost accounting for every LLM call, broken down by model, agent and stage,
+# overall and per request/job correlation id.
+
+# USD per 1M (prompt, completion) tokens; override or extend with LLM_PRICING='{"model": [in, out]}'
+DEFAULT_PRICING = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1": (2.00, 8.00),
+}
+# How many correlation ids keep their own usage breakdown
+USAGE_RETENTION = int(os.environ.get("LLM_USAGE_RETENTION", "500"))
+
+LLM_TOKENS = registry.counter("cosine_llm_tokens_total", "LLM tokens by model, agent, stage and kind (prompt/completion).", ("model", "agent", "stage", "kind"))
+LLM_COST = registry.counter("cosine_llm_cost_usd_total", "Estimated LLM cost in USD.", ("model", "agent", "stage"))
+
+_scope: contextvars.ContextVar[tuple[str, str]] = contextvars.ContextVar("llm_usage_scope", default=("unknown", "unknown"))
+
+_encoding = None
+_encoding_loaded = False
+
+
+def get_encoding():
+    """
+    The tiktoken encoding, or None when tiktoken or its BPE files are unavailable.
+    tiktoken downloads the BPE files on first use, so offline this is None.
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = None
+        _encoding_loaded = True
+    return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Token count of `text`: exact with tiktoken when available, else ~4 characters per token.
+    """
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def load_pricing() -> dict:
+    pricing = dict(DEFAULT_PRICING)
+    override = os.environ.get("LLM_PRICING")
+    if override:
+        pricing.update({model: tuple(prices) for model, prices in json.loads(override).items()})
+    return pricing
+
+
+@contextlib.contextmanager
+def usage_scope(agent: str, stage: str):
+    """
+    Attributes the LLM calls made inside the block to `agent` and `stage`.
+    """
+    token = _scope.set((agent, stage))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def current_scope() -> tuple[str, str]:
+    return _scope.get()
+
+
+def _empty() -> dict:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "estimated_calls": 0}
+
+
+class UsageTracker:
+    def __init__(self, pricing: dict | None = None, retention: int = USAGE_RETENTION):
+        self.pricing = pricing if pricing is not None else load_pricing()
+        self.retention = retention
+        self._totals: dict[tuple, dict] = {}
+        self._by_correlation: OrderedDict[str, dict[tuple, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        # "gpt-4o-mini-2024-07-18" is priced as "gpt-4o-mini"
+        prices = self.pricing.get(model) or next(
+            (p for name, p in sorted(self.pricing.items(), key=lambda item: -len(item[0])) if model.startswith(name)),
+            (0.0, 0.0),
+        )
+        return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int, estimated: bool = False):
+        agent, stage = _scope.get()
+        key = (model, agent, stage)
+        cost = self.cost(model, prompt_tokens, completion_tokens)
+        correlation_id = get_correlation_id()
+        with self._lock:
+            buckets = [self._totals]
+            if correlation_id:
+                per_request = self._by_correlation.get(correlation_id)
+                if per_request is None:
+                    per_request = self._by_correlation[correlation_id] = {}
+                    while len(self._by_correlation) > self.retention:
+                        self._by_correlation.popitem(last=False)
+                buckets.append(per_request)
+            for bucket in buckets:
+                entry = bucket.setdefault(key, _empty())
+                entry["calls"] += 1
+                entry["prompt_tokens"] += prompt_tokens
+                entry["completion_tokens"] += completion_tokens
+                entry["cost_usd"] += cost
+                entry["estimated_calls"] += int(estimated)
+        LLM_TOKENS.inc(prompt_tokens, model=model, agent=agent, stage=stage, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, model=model, agent=agent, stage=stage, kind="completion")
+        LLM_COST.inc(cost, model=model, agent=agent, stage=stage)
+
+    def summary(self, correlation_id: str | None = None) -> dict | None:
+        """
+        Totals plus a per (model, agent, stage) breakdown, overall or for one correlation id.
+        """
+        with self._lock:
+            source = self._totals if correlation_id is None else self._by_correlation.get(correlation_id)
+            if source is None:
+                return None
+            entries = {key: dict(value) for key, value in source.items()}
+        total = _empty()
+        breakdown = []
+        for (model, agent, stage), entry in sorted(entries.items()):
+            for field in total:
+                total[field] += entry[field]
+            breakdown.append({"model": model, "agent": agent, "stage": stage, **entry, "cost_usd": round(entry["cost_usd"], 6)})
+        total["cost_usd"] = round(total["cost_usd"], 6)
+        return {**total, "by_stage": breakdown}
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback that records each call's token usage. Uses the usage the
+    provider reports and falls back to estimating from the prompt and reply text.
+    """
+
+    run_inline = True
+
+    def __init__(self, tracker: UsageTracker):
+        self.tracker = tracker
+        self._prompts: dict = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        text = "\n".join(str(m.content) for batch in messages for m in batch)
+        with self._lock:
+            self._prompts[run_id] = (text, (metadata or {}).get("ls_model_name"))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        with self._lock:
+            self._prompts[run_id] = ("\n".join(prompts), (metadata or {}).get("ls_model_name"))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._prompts.pop(run_id, None)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            prompt_text, model = self._prompts.pop(run_id, ("", None))
+        llm_output = response.llm_output or {}
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        # A routed call may have been answered by the fallback model, which the reply names
+        response_metadata = getattr(getattr(generation, "message", None), "response_metadata", None) or {}
+        model = llm_output.get("model_name") or response_metadata.get("model_name") or model or "unknown"
+        usage = llm_output.get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        message_usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+        if prompt_tokens is None and message_usage:
+            prompt_tokens = message_usage.get("input_tokens")
+            completion_tokens = message_usage.get("output_tokens")
+        estimated = prompt_tokens is None
+        if estimated:
+            prompt_tokens = estimate_tokens(prompt_text)
+            completion_tokens = estimate_tokens(generation.text if generation is not None else "")
+        self.tracker.record(model, prompt_tokens, completion_tokens or 0, estimated=estimated)
+
+
+_tracker: UsageTracker | None = None
+_handler: UsageCallbackHandler | None = None
+_tracker_lock = threading.Lock()
+
+
+def get_usage_tracker() -> UsageTracker:
+    global _tracker, _handler
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                _handler = UsageCallbackHandler(UsageTracker())
+                _tracker = _handler.tracker
+    return _tracker
+
+
+def attach_usage_tracking(llm):
+    """
+    Adds the shared usage callback to `llm` (once) and returns it.
+    """
+    get_usage_tracker()
+    callbacks = list(getattr(llm, "callbacks", None) or [])
+    if _handler not in callbacks:
+        llm.callbacks = callbacks + [_handler]
+    return llm
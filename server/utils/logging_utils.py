@@ -1,58 +1,335 @@
+import asyncio
+import atexit
+import functools
+import inspect
+import json
 import logging
+import logging.handlers
+import queue
 import requests
+import threading
 import time
 import os
 import traceback
 
+from .retry import (
+    CircuitOpenError,
+    RetryableError,
+    RetryPolicy,
+    classify_error,
+    classify_response,
+    get_service_guard,
+)
+from .metrics import NETWORK_FAILURES, RETRIES, get_correlation_id
+
 SLACK_WEBHOOK_URL = os.environ.get("SLACK_ALERT_WEBHOOK")
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Identical alerts within this many seconds are collapsed into one
+ALERT_DEDUP_WINDOW = float(os.environ.get("ALERT_DEDUP_WINDOW", "300"))
+# Max alerts delivered to Slack per minute; the rest are dropped and counted
+ALERT_RATE_LIMIT = int(os.environ.get("ALERT_RATE_LIMIT", "10"))
+ALERT_QUEUE_SIZE = 1000
+MAX_MESSAGE_CHARS = 500
+MAX_EXTRA_CHARS = 1500
 
-def log_error(message, extra=None, alert=True):
+logger = logging.getLogger("cosine")
+
+
+def _add_correlation_id(record):
+    record.correlation_id = get_correlation_id() or "-"
+    return True
+
+def _configure_logging():
     """
-    Log error in structured way and optionally send alert to Slack.
+    Sends the "cosine" logger through a QueueHandler so callers only enqueue
+    records; a QueueListener thread does the formatting and stdout writes.
+    """
+    if logger.handlers:
+        return
+    records = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s"))
+    listener = logging.handlers.QueueListener(records, stream_handler, respect_handler_level=True)
+    queue_handler = logging.handlers.QueueHandler(records)
+    # Runs in the calling thread, where the request/job correlation id is still set
+    queue_handler.addFilter(_add_correlation_id)
+    logger.addHandler(queue_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    listener.start()
+    atexit.register(listener.stop)
+
+_configure_logging()
+
+
+def truncate(value, limit=MAX_EXTRA_CHARS) -> str:
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more chars]"
+
+
+class lazy:
+    """
+    Defers building a log argument until the record is actually formatted,
+    e.g. logger.debug("Response: %s", lazy(lambda: response.text, 500)).
+    Nothing is computed when the level is disabled.
+    """
+
+    def __init__(self, func, limit=MAX_EXTRA_CHARS):
+        self.func = func
+        self.limit = limit
+
+    def __str__(self):
+        return truncate(self.func(), self.limit)
+
+
+class AlertDispatcher:
     """
-    logging.basicConfig(level=logging.ERROR)
-    error_payload = {
-        "level": "ERROR",
-        "message": message,
-        "extra": extra or {},
-    }
-    logging.error(error_payload)
-    if alert and SLACK_WEBHOOK_URL:
+    Delivers Slack alerts from a background thread. Identical alerts are
+    deduplicated within `dedup_window` seconds and delivery is capped at
+    `rate_limit` alerts per minute, so an error storm never blocks callers
+    or floods the channel.
+    """
+
+    def __init__(self, webhook_url, dedup_window=ALERT_DEDUP_WINDOW, rate_limit=ALERT_RATE_LIMIT, clock=time.monotonic):
+        self.webhook_url = webhook_url
+        self.dedup_window = dedup_window
+        self.rate_limit = rate_limit
+        self.clock = clock
+        self.queue = queue.Queue(maxsize=ALERT_QUEUE_SIZE)
+        self.stats = {"queued": 0, "sent": 0, "deduplicated": 0, "rate_limited": 0, "dropped": 0, "failed": 0}
+        self._last_seen = {}
+        self._suppressed = {}
+        self._sent_at = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, message, extra=None):
+        """
+        Queues an alert without blocking. Returns False if it was deduplicated or dropped.
+        """
+        now = self.clock()
+        with self._lock:
+            if len(self._last_seen) > ALERT_QUEUE_SIZE:
+                self._last_seen = {m: t for m, t in self._last_seen.items() if now - t < self.dedup_window}
+            last = self._last_seen.get(message)
+            if last is not None and now - last < self.dedup_window:
+                self._suppressed[message] = self._suppressed.get(message, 0) + 1
+                self.stats["deduplicated"] += 1
+                return False
+            self._last_seen[message] = now
+            suppressed = self._suppressed.pop(message, 0)
         try:
-            slack_payload = {
-                "text": f":rotating_light: *Backend Error Alert*\n\n*Message:* {message}\n*Extra:* ```{extra}```"
-            }
-            requests.post(SLACK_WEBHOOK_URL, json=slack_payload, timeout=5)
+            self.queue.put_nowait((message, extra, suppressed))
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped"] += 1
+            return False
+        with self._lock:
+            self.stats["queued"] += 1
+        self._ensure_worker()
+        return True
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+                    self._thread.start()
+
+    def _allow(self) -> bool:
+        now = self.clock()
+        with self._lock:
+            self._sent_at = [t for t in self._sent_at if now - t < 60]
+            if len(self._sent_at) >= self.rate_limit:
+                self.stats["rate_limited"] += 1
+                return False
+            self._sent_at.append(now)
+            return True
+
+    def _run(self):
+        while True:
+            message, extra, suppressed = self.queue.get()
+            try:
+                if self._allow():
+                    self._send(message, extra, suppressed)
+            finally:
+                self.queue.task_done()
+
+    def _send(self, message, extra, suppressed):
+        text = f":rotating_light: *Backend Error Alert*\n\n*Message:* {truncate(message, MAX_MESSAGE_CHARS)}"
+        if extra:
+            text += f"\n*Extra:* ```{truncate(extra)}```"
+        if suppressed:
+            text += f"\n_{suppressed} identical alert(s) suppressed in the last {int(self.dedup_window)}s_"
+        try:
+            requests.post(self.webhook_url, json={"text": text}, timeout=5)
+            with self._lock:
+                self.stats["sent"] += 1
         except Exception as e:
-            logging.error(f"Failed to send Slack alert: {e}")
+            with self._lock:
+                self.stats["failed"] += 1
+            logger.warning("Failed to send Slack alert: %s", e)
+
+
+_dispatcher = AlertDispatcher(SLACK_WEBHOOK_URL) if SLACK_WEBHOOK_URL else None
 
-def network_guard(max_retries=3, backoff_factor=0.75):
+
+def get_alert_stats():
+    if _dispatcher is None:
+        return {"enabled": False}
+    with _dispatcher._lock:
+        return {"enabled": True, **_dispatcher.stats}
+
+
+def log_error(message, extra=None, alert=True):
+    """
+    Log error in structured way and optionally send alert to Slack.
+    Both are queued, so this never waits on stdout or Slack.
+    """
+    if logger.isEnabledFor(logging.ERROR):
+        error_payload = {
+            "level": "ERROR",
+            "message": truncate(message, MAX_MESSAGE_CHARS),
+            "correlation_id": get_correlation_id(),
+            "extra": truncate(extra or {}),
+        }
+        logger.error("%s", json.dumps(error_payload, ensure_ascii=False, default=str))
+    if alert and _dispatcher is not None:
+        _dispatcher.submit(message, extra)
+
+def _check_response(guard, response, graphql=False):
+    """
+    Turns a retryable response (5xx, 429, rate-limited GraphQL with `graphql`) into a RetryableError.
+    Other responses, including 4xx, go back to the caller untouched.
+    """
+    classification = classify_response(response, graphql)
+    if classification is None:
+        return
+    if classification.reason == "GraphQL RATELIMITED" or getattr(response, "status_code", None) == 429:
+        guard.count("rate_limited")
+        if classification.retry_after and guard.limiter is not None:
+            # Hold back every caller of this service until the upstream window resets
+            guard.limiter.drain(classification.retry_after)
+    raise RetryableError(
+        f"Received {classification.reason}: {getattr(response, 'text', '')[:200]}",
+        response=response,
+        retry_after=classification.retry_after,
+        reason=classification.reason,
+    )
+
+def _next_wait(guard, policy, func, error, retries):
     """
-    Decorator to wrap network calls with try/catch, exponential backoff retries (for 429/5xx), and structured logging+alerting.
+    Records a failed attempt and returns how long to sleep before the next one,
+    or None when the error is fatal or retries are exhausted.
+    """
+    retryable = isinstance(error, RetryableError) or classify_error(error).retryable
+    if retryable:
+        guard.breaker.record_failure()
+        guard.count("failures")
+    else:
+        # A fatal error (bad input, auth, parsing) says nothing about the upstream's health
+        guard.breaker.record_success()
+    if not retryable or retries >= policy.max_retries:
+        if retryable:
+            NETWORK_FAILURES.inc(service=guard.name)
+        _log_final_failure(func, error, retries)
+        return None
+    guard.count("retries")
+    reason = error.reason if isinstance(error, RetryableError) else classify_error(error).reason
+    RETRIES.inc(service=guard.name, reason=reason)
+    sleep_time = policy.wait_time(retries, getattr(error, "retry_after", None))
+    logger.warning("Network call %s failed (attempt %d/%d), retrying in %.2fs: %s", func.__name__, retries + 1, policy.max_retries + 1, sleep_time, error)
+    return sleep_time
+
+def _log_final_failure(func, error, retries):
+    # Only the last failure alerts; request args are left out and only the tail of the traceback is kept
+    tb_tail = "".join(traceback.format_exc().splitlines(True)[-6:])
+    log_error(
+        f"Exception in network call {func.__name__}: {error}",
+        extra={"attempts": retries + 1, "traceback": tb_tail},
+        alert=True
+    )
+
+def network_guard(max_retries=3, backoff_factor=0.75, service="default", max_delay=20.0, graphql=False):
     """
+    Decorator to wrap network calls with retries and structured logging+alerting.
+
+    Transport errors and 5xx/429 replies are retried with full-jitter exponential
+    backoff, or after the wait the Retry-After/rate-limit headers ask for. With
+    `graphql`, so are replies carrying a RATELIMITED GraphQL error. Other errors
+    are raised at once. Calls to the same `service` share a token bucket and a
+    circuit breaker (see utils.retry).
+    Works on both regular functions and coroutine functions.
+    """
+    policy = RetryPolicy(max_retries=max_retries, base_delay=backoff_factor, max_delay=max_delay)
+
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                guard = get_service_guard(service)
+                retries = 0
+                while True:
+                    try:
+                        guard.breaker.before_call(service)
+                    except CircuitOpenError:
+                        guard.count("short_circuited")
+                        raise
+                    try:
+                        if guard.limiter is not None:
+                            delay = guard.limiter.reserve()
+                            if delay:
+                                await asyncio.sleep(delay)
+                        guard.count("calls")
+                        response = await func(*args, **kwargs)
+                        _check_response(guard, response, graphql)
+                    except Exception as e:
+                        sleep_time = _next_wait(guard, policy, func, e, retries)
+                        if sleep_time is None:
+                            raise
+                        await asyncio.sleep(sleep_time)
+                        retries += 1
+                        continue
+                    except BaseException:
+                        # Cancelled (e.g. the client went away): no verdict on the upstream, but a half-open trial must end
+                        guard.breaker.abandon_trial()
+                        raise
+                    guard.breaker.record_success()
+                    return response
+            return async_wrapper
+
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
+            guard = get_service_guard(service)
             retries = 0
-            while retries <= max_retries:
+            while True:
+                try:
+                    guard.breaker.before_call(service)
+                except CircuitOpenError:
+                    guard.count("short_circuited")
+                    raise
                 try:
+                    if guard.limiter is not None:
+                        delay = guard.limiter.reserve()
+                        if delay:
+                            time.sleep(delay)
+                    guard.count("calls")
                     response = func(*args, **kwargs)
-                    # Check for requests.Response object and HTTP error codes
-                    if hasattr(response, "status_code") and response.status_code in [429, 500, 502, 503, 504]:
-                        raise Exception(f"Received HTTP {response.status_code}: {getattr(response, 'text', '')[:200]}")
-                    return response
+                    _check_response(guard, response, graphql)
                 except Exception as e:
-                    tb = traceback.format_exc()
-                    log_error(
-                        f"Exception in network call {func.__name__}: {str(e)}",
-                        extra={"traceback": tb, "args": args, "kwargs": kwargs},
-                        alert=True
-                    )
-                    if retries < max_retries:
-                        sleep_time = backoff_factor * (2 ** retries)
-                        time.sleep(sleep_time)
-                        retries += 1
-                        continue
-                    else:
+                    sleep_time = _next_wait(guard, policy, func, e, retries)
+                    if sleep_time is None:
                         raise
+                    time.sleep(sleep_time)
+                    retries += 1
+                    continue
+                except BaseException:
+                    # Interrupted: no verdict on the upstream, but a half-open trial must end
+                    guard.breaker.abandon_trial()
+                    raise
+                guard.breaker.record_success()
+                return response
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from .metrics import CACHE_REQUESTS
+
+# Default time-to-live in seconds for each kind of Linear metadata.
+DEFAULT_TTLS = {
+    "teams": 300,
+    "team": 300,
+    "team_members": 120,
+    "labels": 300,
+    "label": 300,
+    "user": 600,
+    "viewer": 3600,
+}
+
+_MISS = object()
+
+
+class LRUBackend:
+    """
+    In-process LRU store. Entries are (value, expires_at) tuples.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return copy.deepcopy(entry[0]), entry[1]
+
+    def set(self, key: str, value, expires_at: float):
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(value), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix: str):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskBackend:
+    """
+    SQLite-backed store that several worker processes can share.
+    Values are stored as JSON, so only JSON-serializable metadata can be cached.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS metadata_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        conn = self._connect()
+        row = conn.execute("SELECT value, expires_at FROM metadata_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE metadata_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value, expires_at: float):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO metadata_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), expires_at, time.time()),
+        )
+        conn.execute(
+            "DELETE FROM metadata_cache WHERE key IN ("
+            "SELECT key FROM metadata_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def delete(self, key: str):
+        self._connect().execute("DELETE FROM metadata_cache WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix: str):
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        self._connect().execute("DELETE FROM metadata_cache WHERE key LIKE ? ESCAPE '\\'", (escaped + "%",))
+
+    def clear(self):
+        self._connect().execute("DELETE FROM metadata_cache")
+
+
+class MetadataCache:
+    """
+    TTL cache for Linear metadata (teams, labels, members, users) with
+    per-entity TTLs, explicit invalidation and hit/miss counters.
+    """
+
+    def __init__(self, backend=None, ttls: dict | None = None, clock: Callable[[], float] = time.time):
+        self.backend = backend or LRUBackend()
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.hits: dict[str, int] = {}
+        self.misses: dict[str, int] = {}
+
+    @staticmethod
+    def _key(entity: str, key) -> str:
+        return f"{entity}:{key}"
+
+    def _count(self, counters: dict, entity: str):
+        with self._lock:
+            counters[entity] = counters.get(entity, 0) + 1
+
+    def get(self, entity: str, key="", default=None):
+        entry = self.backend.get(self._key(entity, key))
+        if entry is not None and entry[1] > self.clock():
+            self._count(self.hits, entity)
+            CACHE_REQUESTS.inc(cache="metadata", entity=entity, result="hit")
+            return entry[0]
+        self._count(self.misses, entity)
+        CACHE_REQUESTS.inc(cache="metadata", entity=entity, result="miss")
+        return default
+
+    def set(self, entity: str, key, value):
+        ttl = self.ttls.get(entity, 60)
+        self.backend.set(self._key(entity, key), value, self.clock() + ttl)
+
+    def get_or_load(self, entity: str, key, loader: Callable[[], Any]):
+        """
+        Returns the cached value, or calls `loader` and caches its result.
+        Empty results are not cached so a failed lookup is retried on the next call.
+        """
+        value = self.get(entity, key, _MISS)
+        if value is not _MISS:
+            return value
+        value = loader()
+        if value:
+            self.set(entity, key, value)
+        return value
+
+    async def aget_or_load(self, entity: str, key, loader):
+        """
+        Async variant of get_or_load; `loader` returns an awaitable.
+        """
+        value = self.get(entity, key, _MISS)
+        if value is not _MISS:
+            return value
+        value = await loader()
+        if value:
+            self.set(entity, key, value)
+        return value
+
+    def invalidate(self, entity: str | None = None, key=None):
+        """
+        Drops one entry, every entry of an entity, or (with no arguments) everything.
+        """
+        if entity is None:
+            self.backend.clear()
+        elif key is None:
+            self.backend.delete_prefix(f"{entity}:")
+        else:
+            self.backend.delete(self._key(entity, key))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": type(self.backend).__name__,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+            }
+
+
+_cache: MetadataCache | None = None
+_cache_lock = threading.Lock()
+
+
+def _ttls_from_env() -> dict:
+    ttls = {}
+    for entity in DEFAULT_TTLS:
+        value = os.environ.get(f"METADATA_CACHE_TTL_{entity.upper()}")
+        if value:
+            ttls[entity] = float(value)
+    return ttls
+
+
+def get_metadata_cache() -> MetadataCache:
+    """
+    Returns the process-wide metadata cache, configured from env vars:
+    METADATA_CACHE_BACKEND ("lru" or "disk"), METADATA_CACHE_PATH,
+    METADATA_CACHE_MAX_ENTRIES and METADATA_CACHE_TTL_<ENTITY>.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                max_entries = int(os.environ.get("METADATA_CACHE_MAX_ENTRIES", "1024"))
+                if os.environ.get("METADATA_CACHE_BACKEND", "lru").lower() == "disk":
+                    path = os.environ.get("METADATA_CACHE_PATH", ".cache/linear_metadata.sqlite3")
+                    backend = DiskBackend(path, max_entries=max_entries)
+                else:
+                    backend = LRUBackend(max_entries=max_entries)
+                _cache = MetadataCache(backend, ttls=_ttls_from_env())
+    return _cache
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Callable
+
+# In-process metrics rendered in the Prometheus text format, plus per-request traces.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# How many correlation ids keep a trace, and how many spans each trace keeps
+TRACE_RETENTION = int(os.environ.get("METRICS_TRACE_RETENTION", "200"))
+TRACE_MAX_SPANS = int(os.environ.get("METRICS_TRACE_MAX_SPANS", "500"))
+
+_correlation_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("correlation_id", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: dict | None = None) -> str:
+    pairs = list(zip(labelnames, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count], sum
+        self._values: dict[tuple, tuple[list[int], float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry[0][-1] if entry else 0
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        lines = self.header()
+        for key, (counts, total) in values.items():
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': bound})} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': '+Inf'})} {counts[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_LATENCY = registry.histogram("cosine_stage_duration_seconds", "Time spent in each pipeline stage.", ("stage",))
+STAGE_FAILURES = registry.counter("cosine_stage_failures_total", "Pipeline stages that raised.", ("stage",))
+RETRIES = registry.counter("cosine_network_retries_total", "Network calls retried by network_guard.", ("service", "reason"))
+NETWORK_FAILURES = registry.counter("cosine_network_failures_total", "Network calls that failed after all retries.", ("service",))
+CACHE_REQUESTS = registry.counter("cosine_cache_requests_total", "Cache lookups by cache, entity and result (hit/miss).", ("cache", "entity", "result"))
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex
+
+
+def get_correlation_id() -> str | None:
+    return _correlation_id.get()
+
+
+@contextlib.contextmanager
+def correlation(correlation_id: str | None = None):
+    """
+    Tags everything inside the block (log lines, spans) with `correlation_id`.
+    """
+    token = _correlation_id.set(correlation_id or new_correlation_id())
+    try:
+        yield _correlation_id.get()
+    finally:
+        _correlation_id.reset(token)
+
+
+def bind(func: Callable) -> Callable:
+    """
+    Wraps `func` to run in a copy of the current context, so work handed to a
+    thread pool keeps the caller's correlation id.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+
+class _Traces:
+    """
+    Spans recorded per correlation id, for the most recent TRACE_RETENTION ids.
+    """
+
+    def __init__(self, retention: int = TRACE_RETENTION, max_spans: int = TRACE_MAX_SPANS):
+        self.retention = retention
+        self.max_spans = max_spans
+        self._traces: OrderedDict[str, deque] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, correlation_id: str, span: dict):
+        with self._lock:
+            spans = self._traces.get(correlation_id)
+            if spans is None:
+                spans = self._traces[correlation_id] = deque(maxlen=self.max_spans)
+                while len(self._traces) > self.retention:
+                    self._traces.popitem(last=False)
+            spans.append(span)
+
+    def get(self, correlation_id: str) -> list[dict] | None:
+        with self._lock:
+            spans = self._traces.get(correlation_id)
+            return list(spans) if spans is not None else None
+
+
+traces = _Traces()
+
+
+def record_span(stage: str, started_at: float, duration: float, error: BaseException | None = None):
+    STAGE_LATENCY.observe(duration, stage=stage)
+    if error is not None:
+        STAGE_FAILURES.inc(stage=stage)
+    correlation_id = _correlation_id.get()
+    if correlation_id:
+        traces.record(correlation_id, {
+            "stage": stage,
+            "started_at": started_at,
+            "duration_ms": round(duration * 1000, 2),
+            "thread": threading.current_thread().name,
+            "error": repr(error) if error is not None else None,
+        })
+
+
+@contextlib.contextmanager
+def span(stage: str):
+    """
+    Times the block as `stage`: observed in the stage histogram, counted as a
+    failure if it raises, and added to the current correlation id's trace.
+    """
+    started_at = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        record_span(stage, started_at, time.perf_counter() - started, error)
+
+
+def timed(stage: str):
+    """
+    Decorator form of span() for regular and coroutine functions.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
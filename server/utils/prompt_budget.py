@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import os
+
+from .llm_usage import current_scope, estimate_tokens, get_encoding, usage_scope
+from .metrics import registry
+
+# Token budgets for user-supplied text (ticket descriptions) placed in prompts.
+# Oversized text is truncated (keeping its head and tail) or summarized by the model.
+
+# Max tokens of a ticket description sent to the model; 0 disables the budget
+DESCRIPTION_TOKEN_BUDGET = int(os.environ.get("LLM_DESCRIPTION_TOKEN_BUDGET", "1500"))
+# "truncate" or "summarize"
+BUDGET_STRATEGY = os.environ.get("LLM_BUDGET_STRATEGY", "truncate").lower()
+# Share of the budget kept from the start of the text; the rest comes from its end,
+# where acceptance criteria usually are
+HEAD_SHARE = 0.75
+# Max tokens of the original text sent to the model to summarize
+SUMMARY_INPUT_TOKEN_LIMIT = int(os.environ.get("LLM_SUMMARY_INPUT_TOKEN_LIMIT", "12000"))
+
+TRUNCATION_MARKER = "\n[... {tokens} tokens truncated ...]\n"
+
+SUMMARIZE_PROMPT = """
+Summarize the following software ticket description in at most {max_tokens} tokens.
+Keep every requirement, acceptance criterion, file name, API and constraint; drop repetition and chatter.
+Respond with only the summary.
+
+Description:
+---
+{text}
+---
+"""
+
+BUDGET_APPLIED = registry.counter("cosine_prompt_budget_applied_total", "Texts cut down to fit a prompt token budget.", ("strategy",))
+
+
+def _split(text: str, head_tokens: int, tail_tokens: int) -> tuple[str, str, int]:
+    encoding = get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        dropped = len(tokens) - head_tokens - tail_tokens
+        tail = encoding.decode(tokens[-tail_tokens:]) if tail_tokens else ""
+        return encoding.decode(tokens[:head_tokens]), tail, dropped
+    # Same ~4 characters per token as estimate_tokens
+    head_chars, tail_chars = head_tokens * 4, tail_tokens * 4
+    tail = text[-tail_chars:] if tail_chars else ""
+    return text[:head_chars], tail, estimate_tokens(text[head_chars:len(text) - tail_chars])
+
+
+def truncate_to_budget(text: str, max_tokens: int) -> str:
+    """
+    Cuts `text` to about `max_tokens` tokens, keeping its start and end around a truncation marker.
+    """
+    if not text or estimate_tokens(text) <= max_tokens:
+        return text
+    head_tokens = max(1, int(max_tokens * HEAD_SHARE))
+    head, tail, dropped = _split(text, head_tokens, max(0, max_tokens - head_tokens))
+    return head.rstrip() + TRUNCATION_MARKER.format(tokens=dropped) + tail.lstrip()
+
+
+def _summarize(text: str, max_tokens: int, llm=None) -> str:
+    from .clients import get_shared_llm
+    from .langchain_helpers import predict
+    from .llm_router import TASK_CLARIFY
+
+    agent, _ = current_scope()
+    prompt = SUMMARIZE_PROMPT.strip().format(max_tokens=max_tokens, text=truncate_to_budget(text, SUMMARY_INPUT_TOKEN_LIMIT))
+    with usage_scope(agent, "summarize"):
+        return predict(llm or get_shared_llm(TASK_CLARIFY), prompt).strip()
+
+
+def fit_to_budget(text: str, max_tokens: int = None, strategy: str = None, llm=None) -> str:
+    """
+    Returns `text` unchanged if it fits in `max_tokens` (default LLM_DESCRIPTION_TOKEN_BUDGET),
+    otherwise a summary ("summarize") or a head-and-tail cut ("truncate").
+    A failed or still oversized summary falls back to truncation.
+    """
+    max_tokens = DESCRIPTION_TOKEN_BUDGET if max_tokens is None else max_tokens
+    if not text or max_tokens <= 0 or estimate_tokens(text) <= max_tokens:
+        return text
+    strategy = strategy or BUDGET_STRATEGY
+    if strategy == "summarize":
+        try:
+            summary = _summarize(text, max_tokens, llm)
+            if summary and estimate_tokens(summary) <= max_tokens:
+                BUDGET_APPLIED.inc(strategy="summarize")
+                return summary
+        except Exception as e:
+            print(f"[PromptBudget] Summarizing failed, truncating instead: {e}")
+    BUDGET_APPLIED.inc(strategy="truncate")
+    return truncate_to_budget(text, max_tokens)
@@ -14,6 +14,7 @@ Tu trabajo es mantener el flujo ágil, ordenado y documentado. Si un ticket no e
 IDEA_TO_TICKETS_PROMPT = """
 You are a senior project manager. Your task is to break down a high-level project idea into a series of smaller, actionable tickets.
 For each ticket, you must provide a clear title, a detailed description, and a single label: "frontend" or "backend".
+Every description must end with its acceptance criteria, introduced with "AC:".
 
 The output must be a valid JSON array of ticket objects. Do not include any other text or explanations outside of the JSON array.
 
@@ -21,12 +22,12 @@ Example Output:
 [
     {
         "titulo": "Implement User Authentication Endpoint",
-        "descripcion": "Create a FastAPI endpoint at /auth/token that accepts a username and password, validates them, and returns a JWT access token.",
+        "descripcion": "Create a FastAPI endpoint at /auth/token that accepts a username and password, validates them, and returns a JWT access token. AC: A valid username and password return a signed JWT; invalid credentials return 401.",
         "label": "backend"
     },
     {
         "titulo": "Design Login Page UI",
-        "descripcion": "Create a responsive login page component in React with fields for username and password, a submit button, and basic error handling display.",
+        "descripcion": "Create a responsive login page component in React with fields for username and password, a submit button, and basic error handling display. AC: Submitting the form calls /auth/token and failed logins show an error message.",
         "label": "frontend"
     }
 ]
@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import json
+import os
+import posixpath
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from .llm_usage import estimate_tokens
+from .metrics import CACHE_REQUESTS, bind, registry, span
+
+# Local index of the target repo the code-generation agents open PRs against:
+# its file tree and short summaries of its key files, per base-branch commit.
+# The tree comes from one recursive fetch and is only fetched again when the
+# branch moves; summaries are stored by blob SHA, so after a move only the key
+# files whose content changed are downloaded again. Builds run on a background
+# thread (started at app startup), never inside a code-generation call.
+
+# Tokens of repository context added to a code-generation prompt
+REPO_CONTEXT_TOKEN_BUDGET = int(os.environ.get("REPO_CONTEXT_TOKEN_BUDGET", "1200"))
+# Key files larger than this are listed but not summarized
+KEY_FILE_MAX_BYTES = int(os.environ.get("REPO_INDEX_KEY_FILE_MAX_BYTES", str(64 * 1024)))
+# Blobs downloaded per snapshot at most (the shallowest key files first)
+MAX_KEY_FILES = int(os.environ.get("REPO_INDEX_MAX_KEY_FILES", "40"))
+# Blobs downloaded at the same time while building a snapshot
+FETCH_THREADS = int(os.environ.get("REPO_INDEX_FETCH_THREADS", "4"))
+SUMMARY_MAX_LINES = 12
+SUMMARY_MAX_LINE_CHARS = 160
+
+KEY_FILE_NAMES = {
+    "readme.md", "package.json", "pyproject.toml", "requirements.txt", "setup.py", "setup.cfg", "tsconfig.json",
+    "dockerfile", "main.py", "app.py", "models.py", "routes.py", "urls.py", "settings.py", "schemas.py",
+    "index.ts", "index.tsx", "index.js", "main.ts", "main.tsx", "app.tsx", "app.jsx", "app.ts", "app.js",
+}
+SKIPPED_DIRS = {"node_modules", ".git", "dist", "build", "vendor", "__pycache__", ".venv", "venv", ".next", "coverage"}
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "should", "must", "when", "are", "can", "will",
+    "not", "all", "into", "new", "add", "use", "user", "users", "file", "files", "ticket", "able",
+}
+
+REPO_INDEX_REFRESHES = registry.counter(
+    "cosine_repo_index_refreshes_total", "Repository index lookups by outcome.", ("result",)
+)
+
+_WORDS = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+
+def _words(text: str) -> set[str]:
+    return {word.lower() for word in _WORDS.findall(text) if len(word) >= 3} - _STOPWORDS
+
+
+def _depth(path: str) -> int:
+    return path.count("/")
+
+
+def is_key_file(path: str, size: int | None) -> bool:
+    if any(part in SKIPPED_DIRS for part in path.split("/")[:-1]):
+        return False
+    return posixpath.basename(path).lower() in KEY_FILE_NAMES and _depth(path) <= 3 and (size or 0) <= KEY_FILE_MAX_BYTES
+
+
+def _clip(lines: list[str]) -> str:
+    return "\n".join(line.strip()[:SUMMARY_MAX_LINE_CHARS] for line in lines[:SUMMARY_MAX_LINES])
+
+
+def summarize_file(path: str, text: str) -> str:
+    """
+    A few lines saying what a key file holds: top-level definitions for
+    code, name/scripts/dependencies for package.json, headings for markdown,
+    else its first non-empty lines. Built locally, without the LLM.
+    """
+    name = posixpath.basename(path).lower()
+    lines = text.splitlines()
+    if name == "package.json":
+        try:
+            package = json.loads(text)
+        except ValueError:
+            package = None
+        if isinstance(package, dict):
+            summary = [f"name: {package.get('name', '')}"]
+            for key in ("scripts", "dependencies", "devDependencies"):
+                if isinstance(package.get(key), dict) and package[key]:
+                    summary.append(f"{key}: {', '.join(sorted(package[key]))}")
+            return _clip(summary)
+    if name.endswith(".py"):
+        summary = [line for line in lines if re.match(r"(class |def |async def |@\w*(app|router)\.)", line)]
+        return _clip([line.rstrip(":") for line in summary])
+    if name.endswith((".ts", ".tsx", ".js", ".jsx")):
+        return _clip([line for line in lines if line.startswith("export ")])
+    if name.endswith(".md"):
+        return _clip([line for line in lines if line.startswith("#")])
+    return _clip([line for line in lines if line.strip() and not line.lstrip().startswith("#")])
+
+
+@dataclass
+class RepoSnapshot:
+    """
+    The indexed tree of one branch at one commit.
+    """
+
+    repo: str
+    branch: str
+    commit_sha: str
+    files: dict[str, int] = field(default_factory=dict)
+    summaries: dict[str, str] = field(default_factory=dict)
+    truncated: bool = False
+
+    def context(self, query: str, token_budget: int = REPO_CONTEXT_TOKEN_BUDGET,
+                extensions: tuple[str, ...] = ()) -> str:
+        """
+        The parts of the snapshot most relevant to `query` (a ticket), within
+        `token_budget` tokens: the paths that share words with the query, a
+        directory outline, and the summaries of the key files, best matches first.
+        Files with one of `extensions` rank above the rest.
+        """
+        if token_budget <= 0 or not self.files:
+            return ""
+        wanted = _words(query)
+        scores = {}
+        for path in self.files:
+            # Words in a key file's summary count half as much as words in its path
+            matches = len(wanted & _words(path)) + 0.5 * len(wanted & _words(self.summaries.get(path, "")))
+            scores[path] = matches + (0.5 if matches and extensions and path.endswith(extensions) else 0)
+
+        ranked = sorted((path for path in self.files if scores[path] > 0), key=lambda p: (-scores[p], _depth(p), p))
+        directories: dict[str, int] = {}
+        for path in self.files:
+            directory = posixpath.dirname(path)
+            if directory and _depth(directory) < 2 and not any(part in SKIPPED_DIRS for part in directory.split("/")):
+                directories[directory] = directories.get(directory, 0) + 1
+        keyed = sorted(self.summaries, key=lambda p: (-scores.get(p, 0), _depth(p), p))
+
+        blocks = [f"Repository {self.repo} ({self.branch} @ {self.commit_sha[:7]}), {len(self.files)} files"
+                  + (" (tree truncated)" if self.truncated else "")]
+        blocks.extend(f"Related: {path}" for path in ranked[:30])
+        if directories:
+            blocks.append("Directories: " + ", ".join(f"{d}/ ({n})" for d, n in sorted(directories.items())))
+        blocks.extend(f"{path}:\n{self.summaries[path]}" for path in keyed if self.summaries[path])
+
+        used, kept = 0, []
+        for block in blocks:
+            tokens = estimate_tokens(block) + 1
+            if used + tokens > token_budget:
+                continue
+            kept.append(block)
+            used += tokens
+        return "\n".join(kept)
+
+
+class RepoIndex:
+    """
+    Snapshots of repo branches kept in a SQLite file and in memory. A
+    snapshot is reused while the branch head is the same commit. When the head
+    moves, it is rebuilt from one recursive tree fetch on a background thread,
+    and callers get the previous snapshot (or None) until the new one is ready.
+    """
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.clock = clock
+        self._snapshots: dict[tuple[str, str], RepoSnapshot] = {}
+        self._building: dict[tuple[str, str], tuple[str, Future]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="repo-index")
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                "repo TEXT NOT NULL, branch TEXT NOT NULL, commit_sha TEXT NOT NULL, truncated INTEGER NOT NULL, "
+                "built_at REAL NOT NULL, PRIMARY KEY (repo, branch))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "repo TEXT NOT NULL, branch TEXT NOT NULL, path TEXT NOT NULL, sha TEXT NOT NULL, size INTEGER, "
+                "PRIMARY KEY (repo, branch, path))"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS summaries (sha TEXT PRIMARY KEY, summary TEXT NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def snapshot(self, github, branch: str = "main", wait: bool = False) -> RepoSnapshot | None:
+        """
+        The snapshot of `branch`. `github` is a GitHubAPI (or anything with
+        repo_name, get_base_commit, get_tree and get_blob_text). If the branch
+        has moved since the last build, a rebuild is started in the background and
+        the previous snapshot is returned meanwhile (None if there is none yet).
+        With `wait`, the rebuild runs to completion first.
+        """
+        key = (github.repo_name, branch)
+        commit = github.get_base_commit(branch)
+        current = self._snapshots.get(key)
+        if current is None:
+            current = self._load(key)
+            if current is not None:
+                with self._lock:
+                    current = self._snapshots.setdefault(key, current)
+        if current is not None and current.commit_sha == commit.sha:
+            REPO_INDEX_REFRESHES.inc(result="unchanged")
+            return current
+        future = self._schedule(github, key, commit)
+        if wait:
+            return future.result()
+        REPO_INDEX_REFRESHES.inc(result="stale" if current is not None else "cold")
+        return current
+
+    def warm(self, github_factory: Callable[[], Any], branch: str = "main") -> Future:
+        """
+        Builds the snapshot of `branch` in the background, e.g. at startup so the
+        first code generation finds it ready. The client is built on that thread too.
+        """
+        def start():
+            try:
+                self.snapshot(github_factory(), branch)
+            except Exception as e:
+                print(f"[RepoIndex] Could not start indexing {branch}: {e}")
+
+        return self._builder.submit(bind(start))
+
+    def _schedule(self, github, key: tuple[str, str], commit) -> Future:
+        with self._lock:
+            building = self._building.get(key)
+            if building is not None and building[0] == commit.sha:
+                return building[1]
+            future = self._builder.submit(bind(self._build), github, key, commit)
+            self._building[key] = (commit.sha, future)
+            return future
+
+    def _build(self, github, key: tuple[str, str], commit) -> RepoSnapshot:
+        try:
+            with span("repo_index.refresh"):
+                snapshot = self._refresh(github, key, commit)
+            with self._lock:
+                self._snapshots[key] = snapshot
+            REPO_INDEX_REFRESHES.inc(result="refreshed")
+            return snapshot
+        except Exception as e:
+            print(f"[RepoIndex] Indexing {key[0]}@{key[1]} failed: {e}")
+            raise
+        finally:
+            with self._lock:
+                if self._building.get(key, (None,))[0] == commit.sha:
+                    del self._building[key]
+
+    def _load(self, key: tuple[str, str]) -> RepoSnapshot | None:
+        conn = self._connect()
+        row = conn.execute("SELECT commit_sha, truncated FROM snapshots WHERE repo = ? AND branch = ?", key).fetchone()
+        if row is None:
+            return None
+        snapshot = RepoSnapshot(*key, row[0], truncated=bool(row[1]))
+        for path, size, summary in conn.execute(
+            "SELECT f.path, f.size, s.summary FROM files f LEFT JOIN summaries s ON s.sha = f.sha "
+            "WHERE f.repo = ? AND f.branch = ?", key
+        ):
+            snapshot.files[path] = size
+            if summary is not None:
+                snapshot.summaries[path] = summary
+        return snapshot
+
+    def _summarize(self, github, entry: dict) -> str | None:
+        try:
+            return summarize_file(entry["path"], github.get_blob_text(entry["sha"]))
+        except Exception as e:
+            # Left out of this snapshot and fetched again by the next build
+            print(f"[RepoIndex] Could not summarize {entry['path']}: {e}")
+            return None
+
+    def _refresh(self, github, key: tuple[str, str], commit) -> RepoSnapshot:
+        entries, truncated = github.get_tree(commit.tree.sha)
+        blobs = [entry for entry in entries if entry["type"] == "blob"]
+        snapshot = RepoSnapshot(*key, commit.sha, {entry["path"]: entry["size"] for entry in blobs}, truncated=truncated)
+        key_files = sorted((e for e in blobs if is_key_file(e["path"], e["size"])), key=lambda e: (_depth(e["path"]), e["path"]))
+
+        conn = self._connect()
+        missing = []
+        for entry in key_files[:MAX_KEY_FILES]:
+            row = conn.execute("SELECT summary FROM summaries WHERE sha = ?", (entry["sha"],)).fetchone()
+            CACHE_REQUESTS.inc(cache="repo_index", entity="summary", result="hit" if row else "miss")
+            if row is None:
+                missing.append(entry)
+            else:
+                snapshot.summaries[entry["path"]] = row[0]
+        # Only the key files whose content changed are downloaded, several at a time
+        if missing:
+            with ThreadPoolExecutor(max_workers=FETCH_THREADS, thread_name_prefix="repo-index-blob") as pool:
+                summaries = list(pool.map(bind(lambda entry: self._summarize(github, entry)), missing))
+            for entry, summary in zip(missing, summaries):
+                if summary is not None:
+                    conn.execute("INSERT OR REPLACE INTO summaries (sha, summary) VALUES (?, ?)", (entry["sha"], summary))
+                    snapshot.summaries[entry["path"]] = summary
+
+        with self._lock:
+            conn.execute("BEGIN")
+            conn.execute("DELETE FROM files WHERE repo = ? AND branch = ?", key)
+            conn.executemany(
+                "INSERT INTO files (repo, branch, path, sha, size) VALUES (?, ?, ?, ?, ?)",
+                [(*key, entry["path"], entry["sha"], entry["size"]) for entry in blobs],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshots (repo, branch, commit_sha, truncated, built_at) VALUES (?, ?, ?, ?, ?)",
+                (*key, commit.sha, int(truncated), self.clock()),
+            )
+            conn.execute("COMMIT")
+        return snapshot
+
+    def context(self, github, query: str, branch: str = "main", token_budget: int = REPO_CONTEXT_TOKEN_BUDGET,
+                extensions: tuple[str, ...] = (), wait: bool = False) -> str:
+        """
+        RepoSnapshot.context of the current snapshot; "" while the first one is being built.
+        """
+        snapshot = self.snapshot(github, branch, wait=wait)
+        return snapshot.context(query, token_budget, extensions) if snapshot is not None else ""
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        snapshots = [
+            {"repo": repo, "branch": branch, "commit_sha": sha, "truncated": bool(truncated), "built_at": built_at}
+            for repo, branch, sha, truncated, built_at in conn.execute(
+                "SELECT repo, branch, commit_sha, truncated, built_at FROM snapshots ORDER BY repo, branch"
+            )
+        ]
+        files, = conn.execute("SELECT COUNT(*) FROM files").fetchone()
+        summaries, = conn.execute("SELECT COUNT(*) FROM summaries").fetchone()
+        return {"snapshots": snapshots, "files": files, "summaries": summaries}
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            for table in ("snapshots", "files", "summaries"):
+                conn.execute(f"DELETE FROM {table}")
+            self._snapshots.clear()
+
+
+_index: RepoIndex | None = None
+_index_lock = threading.Lock()
+
+
+def repo_index_enabled() -> bool:
+    return os.environ.get("REPO_INDEX_ENABLED", "true").lower() == "true"
+
+
+def get_repo_index() -> RepoIndex:
+    """
+    Returns the process-wide repository index, stored at REPO_INDEX_PATH.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = RepoIndex(os.environ.get("REPO_INDEX_PATH", ".cache/repo_index.sqlite3"))
+    return _index
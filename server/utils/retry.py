@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Callable
+
+# Statuses worth retrying; any other 4xx is the caller's fault and is returned as is
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# GraphQL error codes that mean "slow down", even inside an HTTP 200/400 response
+RATE_LIMIT_ERROR_CODES = {"RATELIMITED"}
+# Transport errors from requests, httpx, urllib3 and the stdlib that are safe to retry
+RETRYABLE_ERROR_NAMES = {
+    "ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout", "TimeoutError",
+    "TimeoutException", "TransportError", "NetworkError", "RemoteProtocolError",
+    "ChunkedEncodingError", "ProtocolError", "ConnectionResetError",
+}
+# Never wait longer than this for a single retry, whatever the headers say
+MAX_RETRY_WAIT = float(os.environ.get("MAX_RETRY_WAIT", "60"))
+
+
+class RetryableError(Exception):
+    """
+    Raised by network_guard for a response that should be retried (5xx, 429/408,
+    rate-limited GraphQL), so it goes through the same retry path as a transport
+    error. It only reaches the caller once the retries are exhausted.
+    """
+
+    def __init__(self, message: str, response=None, retry_after: float | None = None, reason: str = "retryable"):
+        super().__init__(message)
+        self.response = response
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised without calling the upstream while its circuit breaker is open.
+    """
+
+
+class Classification:
+    def __init__(self, retryable: bool, reason: str, retry_after: float | None = None):
+        self.retryable = retryable
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _header(response, name):
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return headers.get(name)
+    except Exception:
+        return None
+
+
+def retry_after_from_headers(response, now: float | None = None) -> float | None:
+    """
+    Seconds to wait according to Retry-After or the rate-limit reset headers
+    Linear (X-RateLimit-*-Reset, epoch ms) and GitHub (X-RateLimit-Reset, epoch s) send.
+    """
+    now = time.time() if now is None else now
+    retry_after = _header(response, "Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            parsed = email.utils.parsedate_to_datetime(retry_after)
+            if parsed is not None:
+                return max(0.0, parsed.timestamp() - now)
+    for remaining_name, reset_name in (
+        ("X-RateLimit-Requests-Remaining", "X-RateLimit-Requests-Reset"),
+        ("X-RateLimit-Complexity-Remaining", "X-RateLimit-Complexity-Reset"),
+        ("X-RateLimit-Remaining", "X-RateLimit-Reset"),
+    ):
+        remaining = _header(response, remaining_name)
+        reset = _header(response, reset_name)
+        if remaining is None or reset is None:
+            continue
+        try:
+            if int(float(remaining)) > 0:
+                continue
+            reset_at = float(reset)
+        except ValueError:
+            continue
+        # Linear reports milliseconds, GitHub seconds
+        if reset_at > 1e11:
+            reset_at /= 1000
+        return max(0.0, reset_at - now)
+    return None
+
+
+def _graphql_error_codes(response) -> set:
+    # Only parse a body that mentions a rate-limit code; the caller parses the rest itself
+    text = getattr(response, "text", None)
+    if isinstance(text, str) and not any(code in text for code in RATE_LIMIT_ERROR_CODES):
+        return set()
+    try:
+        body = response.json()
+    except Exception:
+        return set()
+    if not isinstance(body, dict):
+        return set()
+    codes = set()
+    for error in body.get("errors") or []:
+        if isinstance(error, dict):
+            code = (error.get("extensions") or {}).get("code")
+            if code:
+                codes.add(code)
+    return codes
+
+
+def classify_response(response, graphql: bool = False) -> Classification | None:
+    """
+    Returns None for a response that should be handed back to the caller, or a
+    Classification when it is a failure. Only 5xx, 429/408 and, with `graphql`,
+    rate-limited GraphQL responses are retryable.
+    """
+    status = getattr(response, "status_code", None)
+    if status is None:
+        return None
+    if status in RETRYABLE_STATUS_CODES:
+        return Classification(True, f"HTTP {status}", retry_after_from_headers(response))
+    if graphql and status < 500 and _graphql_error_codes(response) & RATE_LIMIT_ERROR_CODES:
+        return Classification(True, "GraphQL RATELIMITED", retry_after_from_headers(response))
+    return None
+
+
+def classify_error(error: BaseException) -> Classification:
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if names & RETRYABLE_ERROR_NAMES:
+        return Classification(True, type(error).__name__)
+    return Classification(False, type(error).__name__)
+
+
+class RetryPolicy:
+    """
+    Full-jitter exponential backoff: each wait is uniform in [0, min(max_delay, base_delay * 2**attempt)].
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.75, max_delay: float = 20.0, rng: random.Random | None = None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng or random.Random()
+
+    def backoff(self, attempt: int) -> float:
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def wait_time(self, attempt: int, retry_after: float | None = None) -> float:
+        """
+        Header-driven wait when the upstream gave one, jittered backoff otherwise.
+        """
+        if retry_after is not None:
+            return min(retry_after, MAX_RETRY_WAIT)
+        return self.backoff(attempt)
+
+
+class TokenBucket:
+    """
+    Client-side rate limiter: `rate` requests per second with bursts up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated_at = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes a token and returns how long the caller must wait before using it.
+        """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def drain(self, seconds: float):
+        """
+        Empties the bucket for `seconds`, e.g. after the upstream said to back off.
+        """
+        with self._lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+            self.updated_at = self.clock()
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and fails fast for
+    `recovery_timeout` seconds; then lets one trial call through (half-open)
+    and closes again if it succeeds.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self, name: str = "upstream"):
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.recovery_timeout:
+                    raise CircuitOpenError(f"Circuit for {name} is open; failing fast")
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    raise CircuitOpenError(f"Circuit for {name} is half-open; trial call in progress")
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def abandon_trial(self):
+        """
+        Frees the half-open trial slot of a call that ended without an outcome
+        (cancelled or interrupted), so the next call can be the trial instead.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+class ServiceGuard:
+    """
+    Rate limiter and circuit breaker shared by every call to one upstream service.
+    """
+
+    def __init__(self, name: str, limiter: TokenBucket | None, breaker: CircuitBreaker):
+        self.name = name
+        self.limiter = limiter
+        self.breaker = breaker
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "rate_limited": 0, "short_circuited": 0}
+        self._lock = threading.Lock()
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.breaker.state, **self.stats}
+
+
+_services: dict[str, ServiceGuard] = {}
+_services_lock = threading.Lock()
+
+
+def get_service_guard(name: str) -> ServiceGuard:
+    """
+    Returns the guard for `name`, configured from RATE_LIMIT_<NAME>_PER_SEC,
+    RATE_LIMIT_<NAME>_BURST, CIRCUIT_<NAME>_FAILURES and CIRCUIT_<NAME>_RESET_SECONDS.
+    """
+    with _services_lock:
+        guard = _services.get(name)
+        if guard is None:
+            prefix = name.upper()
+            rate = float(os.environ.get(f"RATE_LIMIT_{prefix}_PER_SEC", "0"))
+            burst = os.environ.get(f"RATE_LIMIT_{prefix}_BURST")
+            limiter = TokenBucket(rate, float(burst) if burst else None) if rate > 0 else None
+            breaker = CircuitBreaker(
+                failure_threshold=int(os.environ.get(f"CIRCUIT_{prefix}_FAILURES", "5")),
+                recovery_timeout=float(os.environ.get(f"CIRCUIT_{prefix}_RESET_SECONDS", "30")),
+            )
+            guard = _services[name] = ServiceGuard(name, limiter, breaker)
+        return guard
+
+
+def get_service_stats() -> dict:
+    with _services_lock:
+        guards = list(_services.values())
+    return {guard.name: guard.snapshot() for guard in guards}
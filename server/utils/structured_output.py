@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+from typing import Annotated, Any, Callable
+
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError, model_validator
+
+from .llm_usage import current_scope, usage_scope
+from .metrics import registry
+
+# Schema-validated JSON replies from the LLM. A reply is parsed as-is, then with a
+# local repair (code fences, prose around the JSON, trailing commas, a reply cut off
+# mid-string), and only if both fail is the model asked again - with just the
+# validation error and its own reply, not the original prompt. Schemas built with
+# close_truncated=False (generated code) are never completed locally: a cut-off
+# reply goes straight to the model, since closing it would ship half a file.
+
+# Model round trips allowed to fix a reply that could not be repaired locally
+MAX_REPAIR_ATTEMPTS = int(os.environ.get("LLM_MAX_REPAIR_ATTEMPTS", "1"))
+# Validation errors listed in a repair prompt
+MAX_REPORTED_ERRORS = 5
+
+STRUCTURED_OUTPUT = registry.counter(
+    "cosine_llm_structured_output_total",
+    "Structured LLM replies by schema and result (valid/repaired/retried/failed).", ("schema", "result"),
+)
+PARSE_FAILURES = registry.counter("cosine_llm_parse_failures_total", "LLM replies that failed to parse or validate.", ("schema",))
+
+REPAIR_PROMPT = """
+Your previous reply could not be used: {error}
+
+Reply again with only the corrected JSON, no other text, matching this JSON schema:
+{schema}
+
+Previous reply:
+{reply}
+"""
+
+
+class StructuredOutputError(ValueError):
+    """
+    Raised when a reply does not contain JSON matching the expected schema.
+    """
+
+
+class TicketSpec(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    titulo: str = Field(min_length=1)
+    descripcion: str
+    label: str
+
+
+class SufficiencyVerdict(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    index: int
+    sufficient: bool
+    question: str = ""
+
+
+class GeneratedFile(BaseModel):
+    file_path: str = Field(min_length=1)
+    file_content: str = Field(min_length=1)
+
+
+class CodeGeneration(BaseModel):
+    files: Annotated[list[GeneratedFile], Field(min_length=1)]
+
+    @model_validator(mode="before")
+    @classmethod
+    def _single_file(cls, data):
+        # Older prompts asked for one top-level file_path/file_content pair
+        if isinstance(data, dict) and "files" not in data and "file_path" in data:
+            return {"files": [data]}
+        return data
+
+
+class Schema:
+    """
+    The expected shape of a reply: a name for metrics and a type pydantic validates against.
+    With close_truncated=False, a reply that was cut off is rejected instead of being
+    closed locally (open strings, dropped trailing elements).
+    """
+
+    def __init__(self, name: str, type_: Any, close_truncated: bool = True):
+        self.name = name
+        self.close_truncated = close_truncated
+        self.adapter = TypeAdapter(type_)
+        self.json_schema = self.adapter.json_schema()
+        self.is_array = self.json_schema.get("type") == "array"
+
+    def validate(self, data: Any) -> Any:
+        # Models sometimes wrap the array that was asked for in an object, e.g. {"tickets": [...]}
+        if self.is_array and isinstance(data, dict) and len(data) == 1:
+            (value,) = data.values()
+            if isinstance(value, list):
+                data = value
+        return self.adapter.dump_python(self.adapter.validate_python(data))
+
+    def is_valid(self, data: Any) -> bool:
+        try:
+            self.validate(data)
+            return True
+        except ValidationError:
+            return False
+
+
+TICKETS_SCHEMA = Schema("tickets", Annotated[list[TicketSpec], Field(min_length=1)])
+TICKET_SCHEMA = Schema("ticket", TicketSpec)
+VERDICTS_SCHEMA = Schema("sufficiency_verdicts", list[SufficiencyVerdict])
+# A closed-off file would be broken code, and a dropped one a silently incomplete PR
+CODE_GENERATION_SCHEMA = Schema("code_generation", CodeGeneration, close_truncated=False)
+
+_FENCE_OPENING = re.compile(r"```[a-zA-Z]*[ \t]*\n?")
+_CLOSERS = {"[": "]", "{": "}"}
+
+
+def strip_fences(text: str) -> str:
+    """
+    The body of a ```json code fence around the reply. Fences inside the JSON
+    (e.g. in generated file contents) are left alone.
+    """
+    start = text.find("```")
+    first_value = min((i for i in (text.find("{"), text.find("[")) if i != -1), default=len(text))
+    if start == -1 or start > first_value:
+        return text
+    body = text[_FENCE_OPENING.match(text, start).end():]
+    end = body.rfind("```")
+    return body[:end] if end != -1 else body
+
+
+def _drop_trailing_comma(out: list[str]):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def _close(out: list[str], stack: list[str], in_string: bool, escape: bool) -> str:
+    text = "".join(out)
+    if in_string:
+        text = (text[:-1] if escape else text) + '"'
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    elif text.endswith(":"):
+        text += " null"
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: str, array: bool | None = None, close_truncated: bool = True) -> str | None:
+    """
+    Best-effort fix of a JSON reply: drops code fences and any prose around the
+    first array (or object) and trailing commas, and closes strings, objects and
+    arrays left open by a reply that was cut off. A cut-off reply keeps only the
+    objects of its arrays that were complete, so a half-written ticket is dropped.
+    Returns None when the text holds no JSON value, or, with close_truncated=False,
+    when the reply ends before its JSON value does.
+    """
+    text = strip_fences(text)
+    openers = "[{" if array is None else ("[" if array else "{")
+    start = next((i for i, char in enumerate(text) if char in openers), None)
+    if start is None:
+        return None
+    out: list[str] = []
+    stack: list[str] = []
+    in_string = escape = False
+    # (length of out, open closers) after the last complete element, and after the last complete object in an array
+    safe = element_end = None
+    for char in text[start:]:
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char in "]}":
+            if char not in stack:
+                continue
+            _drop_trailing_comma(out)
+            # A missing closer is filled in, e.g. [{"a": 1] -> [{"a": 1}]
+            while stack:
+                closer = stack.pop()
+                out.append(closer)
+                if closer == char:
+                    break
+            if not stack:
+                return "".join(out)
+            safe = (len(out), list(stack))
+            if char == "}" and stack[-1] == "]":
+                element_end = safe
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "[{":
+            stack.append(_CLOSERS[char])
+        elif char == ",":
+            safe = (len(out), list(stack))
+        out.append(char)
+    if not close_truncated:
+        return None
+    if element_end is not None:
+        length, open_closers = element_end
+        return _close(out[:length], open_closers, False, False)
+    candidate = _close(out, stack, in_string, escape)
+    try:
+        json.loads(candidate, strict=False)
+        return candidate
+    except ValueError:
+        pass
+    if safe is None:
+        return candidate
+    length, open_closers = safe
+    return _close(out[:length], open_closers, False, False)
+
+
+def _describe(error: ValidationError) -> str:
+    problems = [
+        f"{'.'.join(str(part) for part in item['loc']) or '<root>'}: {item['msg']}"
+        for item in error.errors()[:MAX_REPORTED_ERRORS]
+    ]
+    more = error.error_count() - len(problems)
+    return "; ".join(problems) + (f" (and {more} more)" if more > 0 else "")
+
+
+def parse_structured(text: str, schema: Schema) -> tuple[Any, bool]:
+    """
+    Returns (validated value, whether the JSON needed a local repair).
+    Raises StructuredOutputError with a description of what is wrong.
+    """
+    repaired = False
+    try:
+        data = json.loads(strip_fences(text).strip(), strict=False)
+    except ValueError:
+        fixed = repair_json(text, schema.is_array, schema.close_truncated)
+        if fixed is None:
+            kind = "array" if schema.is_array else "object"
+            if not schema.close_truncated:
+                raise StructuredOutputError(f"the reply contains no complete JSON {kind}, it may have been cut off")
+            raise StructuredOutputError(f"the reply contains no JSON {kind}")
+        try:
+            data = json.loads(fixed, strict=False)
+        except ValueError as e:
+            raise StructuredOutputError(f"the reply is not valid JSON ({e})")
+        repaired = True
+    try:
+        return schema.validate(data), repaired
+    except ValidationError as e:
+        raise StructuredOutputError(f"the JSON does not match the {schema.name} schema: {_describe(e)}")
+
+
+def parse_or_repair(reply: str, schema: Schema, llm=None, use_cache=True, max_repairs: int = None,
+                    on_failure: Callable[[], None] | None = None) -> Any:
+    """
+    Parses `reply` against `schema`, asking `llm` to fix it (up to `max_repairs`
+    times) when it can't be repaired locally. Raises StructuredOutputError if it never
+    validates, after calling `on_failure` (e.g. to drop `reply` from the response cache).
+    Repair replies that don't validate are never left in the cache.
+    """
+    from .langchain_helpers import forget, predict
+
+    max_repairs = MAX_REPAIR_ATTEMPTS if max_repairs is None else max_repairs
+    if llm is None:
+        max_repairs = 0
+    prompt = None
+    for attempt in range(max_repairs + 1):
+        try:
+            value, repaired = parse_structured(reply, schema)
+        except StructuredOutputError as e:
+            PARSE_FAILURES.inc(schema=schema.name)
+            if prompt is not None and use_cache:
+                forget(llm, prompt)
+            if attempt == max_repairs:
+                STRUCTURED_OUTPUT.inc(schema=schema.name, result="failed")
+                if on_failure is not None:
+                    on_failure()
+                raise
+            error = e
+        else:
+            result = "retried" if attempt else ("repaired" if repaired else "valid")
+            STRUCTURED_OUTPUT.inc(schema=schema.name, result=result)
+            return value
+        print(f"[StructuredOutput] {schema.name} reply unusable ({error}), asking the model to fix it")
+        agent, stage = current_scope()
+        prompt = REPAIR_PROMPT.strip().format(error=error, schema=json.dumps(schema.json_schema), reply=reply)
+        with usage_scope(agent, f"{stage}.repair"):
+            reply = predict(llm, prompt, use_cache=use_cache)
+
+
+def generate_structured(llm, prompt: str, schema: Schema, use_cache=True, max_repairs: int = None) -> Any:
+    """
+    Sends `prompt` and returns its reply validated against `schema`, see parse_or_repair.
+    A reply that never validates is dropped from the cache, so the next call asks the model again.
+    """
+    from .langchain_helpers import forget, predict
+
+    return parse_or_repair(
+        predict(llm, prompt, use_cache=use_cache), schema, llm, use_cache=use_cache, max_repairs=max_repairs,
+        on_failure=(lambda: forget(llm, prompt)) if use_cache else None,
+    )
+
+
+def parse_boolean(text: str) -> bool | None:
+    """
+    A true/false reply, tolerating quotes, code fences and trailing punctuation. None if it is neither.
+    """
+    word = strip_fences(text).strip().strip("`'\".!").strip().lower()
+    return {"true": True, "false": False, "yes": True, "no": False}.get(word)
@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextvars import ContextVar
+from typing import Any, Callable
+
+from .logging_utils import log_error
+from .metrics import correlation, registry
+from .retry import RetryPolicy
+
+# Durable work queue in a SQLite file, drained by a pool of worker threads.
+#
+# Delivery is at-least-once: a claimed message is hidden for `visibility_timeout`
+# seconds and comes back if its worker neither acks nor nacks it in time (e.g. the
+# process died). Failed messages are retried with backoff until `max_attempts`,
+# then kept as dead letters for inspection and manual requeueing.
+
+STATUS_READY = "ready"
+STATUS_DONE = "done"
+STATUS_DEAD = "dead"
+
+QUEUE_MESSAGES = registry.counter("cosine_queue_messages_total", "Work queue messages by outcome.", ("kind", "result"))
+QUEUE_WAIT = registry.histogram("cosine_queue_wait_seconds", "Time from enqueue to first claim.", ("kind",))
+
+# (attempt, max_attempts) of the message being handled, see last_attempt()
+_delivery: ContextVar[tuple[int, int] | None] = ContextVar("work_queue_delivery", default=None)
+
+
+def last_attempt() -> bool:
+    """
+    False while a handler runs a delivery that is retried if it fails, True otherwise
+    (including outside the queue). Side effects that must not repeat on every retry,
+    such as failure comments, are held back until the last attempt.
+    """
+    delivery = _delivery.get()
+    return delivery is None or delivery[0] >= delivery[1]
+
+
+class QueueMessage:
+    """
+    A claimed message. `lease_id` identifies this delivery; ack/nack with a stale lease are ignored.
+    """
+
+    def __init__(self, id: int, kind: str, payload: Any, attempts: int, lease_id: str, enqueued_at: float):
+        self.id = id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+        self.lease_id = lease_id
+        self.enqueued_at = enqueued_at
+
+
+class WorkQueue:
+    """
+    Message store with visibility timeouts, retries and a dead-letter status.
+
+    `dedupe_key` makes enqueueing idempotent: a message with a key that is
+    already queued, done (within `done_retention_seconds`) or dead is dropped.
+    """
+
+    def __init__(self, path: str, visibility_timeout: float = 900, max_attempts: int = 5,
+                 done_retention_seconds: float = 24 * 3600, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.done_retention_seconds = done_retention_seconds
+        self.clock = clock
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS work_queue ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, dedupe_key TEXT UNIQUE, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, available_at REAL NOT NULL, lease_id TEXT, "
+            "enqueued_at REAL NOT NULL, finished_at REAL, last_error TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS work_queue_available ON work_queue (status, available_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, kind: str, payload: Any, dedupe_key: str | None = None, delay: float = 0) -> int | None:
+        """
+        Stores a message and returns its id, or None if `dedupe_key` was already enqueued.
+        """
+        now = self.clock()
+        cursor = self._connect().execute(
+            "INSERT OR IGNORE INTO work_queue (kind, dedupe_key, payload, status, available_at, enqueued_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, dedupe_key, json.dumps(payload, default=str), STATUS_READY, now + delay, now),
+        )
+        if cursor.rowcount == 0:
+            QUEUE_MESSAGES.inc(kind=kind, result="duplicate")
+            return None
+        QUEUE_MESSAGES.inc(kind=kind, result="enqueued")
+        return cursor.lastrowid
+
+    def claim(self) -> QueueMessage | None:
+        """
+        Leases the oldest available message for `visibility_timeout` seconds, or returns None.
+        A message whose last allowed attempt timed out is dead-lettered instead.
+        """
+        conn = self._connect()
+        now = self.clock()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                row = conn.execute(
+                    "SELECT id, kind, payload, attempts, enqueued_at FROM work_queue "
+                    "WHERE status = ? AND available_at <= ? ORDER BY available_at, id LIMIT 1",
+                    (STATUS_READY, now),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                message_id, kind, payload, attempts, enqueued_at = row
+                if attempts >= self.max_attempts:
+                    conn.execute(
+                        "UPDATE work_queue SET status = ?, lease_id = NULL, finished_at = ?, last_error = ? WHERE id = ?",
+                        (STATUS_DEAD, now, "Visibility timeout expired on the last attempt", message_id),
+                    )
+                    QUEUE_MESSAGES.inc(kind=kind, result="dead_lettered")
+                    continue
+                lease_id = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE work_queue SET attempts = attempts + 1, lease_id = ?, available_at = ? WHERE id = ?",
+                    (lease_id, now + self.visibility_timeout, message_id),
+                )
+                conn.execute("COMMIT")
+                break
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if attempts == 0:
+            QUEUE_WAIT.observe(now - enqueued_at, kind=kind)
+        return QueueMessage(message_id, kind, json.loads(payload), attempts + 1, lease_id, enqueued_at)
+
+    def ack(self, message: QueueMessage) -> bool:
+        """
+        Marks the message done. False if its lease expired and another delivery owns it now.
+        """
+        cursor = self._connect().execute(
+            "UPDATE work_queue SET status = ?, lease_id = NULL, finished_at = ?, last_error = NULL WHERE id = ? AND lease_id = ?",
+            (STATUS_DONE, self.clock(), message.id, message.lease_id),
+        )
+        if cursor.rowcount:
+            QUEUE_MESSAGES.inc(kind=message.kind, result="acked")
+        return bool(cursor.rowcount)
+
+    def nack(self, message: QueueMessage, error: str, delay: float = 0, dead_letter: bool = False) -> bool:
+        """
+        Makes the message available again after `delay` seconds, or dead-letters it
+        when `dead_letter` is set or it has used up its attempts.
+        """
+        now = self.clock()
+        if dead_letter or message.attempts >= self.max_attempts:
+            cursor = self._connect().execute(
+                "UPDATE work_queue SET status = ?, lease_id = NULL, finished_at = ?, last_error = ? WHERE id = ? AND lease_id = ?",
+                (STATUS_DEAD, now, error, message.id, message.lease_id),
+            )
+            result = "dead_lettered"
+        else:
+            cursor = self._connect().execute(
+                "UPDATE work_queue SET lease_id = NULL, available_at = ?, last_error = ? WHERE id = ? AND lease_id = ?",
+                (now + delay, error, message.id, message.lease_id),
+            )
+            result = "retried"
+        if cursor.rowcount:
+            QUEUE_MESSAGES.inc(kind=message.kind, result=result)
+        return bool(cursor.rowcount)
+
+    def requeue(self, message_id: int) -> bool:
+        """
+        Moves a dead letter back to the queue with a fresh set of attempts.
+        """
+        cursor = self._connect().execute(
+            "UPDATE work_queue SET status = ?, attempts = 0, available_at = ?, finished_at = NULL WHERE id = ? AND status = ?",
+            (STATUS_READY, self.clock(), message_id, STATUS_DEAD),
+        )
+        return bool(cursor.rowcount)
+
+    def dead_letters(self, limit: int = 50) -> list[dict]:
+        rows = self._connect().execute(
+            "SELECT id, kind, payload, attempts, enqueued_at, finished_at, last_error FROM work_queue "
+            "WHERE status = ? ORDER BY finished_at DESC LIMIT ?",
+            (STATUS_DEAD, limit),
+        ).fetchall()
+        return [
+            {"id": row[0], "kind": row[1], "payload": json.loads(row[2]), "attempts": row[3],
+             "enqueued_at": row[4], "dead_at": row[5], "error": row[6]}
+            for row in rows
+        ]
+
+    def purge_done(self) -> int:
+        cursor = self._connect().execute(
+            "DELETE FROM work_queue WHERE status = ? AND finished_at < ?",
+            (STATUS_DONE, self.clock() - self.done_retention_seconds),
+        )
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        now = self.clock()
+        conn = self._connect()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM work_queue GROUP BY status").fetchall())
+        in_flight = conn.execute(
+            "SELECT COUNT(*) FROM work_queue WHERE status = ? AND lease_id IS NOT NULL AND available_at > ?",
+            (STATUS_READY, now),
+        ).fetchone()[0]
+        return {
+            "pending": counts.get(STATUS_READY, 0) - in_flight,
+            "in_flight": in_flight,
+            "done": counts.get(STATUS_DONE, 0),
+            "dead": counts.get(STATUS_DEAD, 0),
+        }
+
+
+class QueueWorkerPool:
+    """
+    Threads that claim messages and run `handlers[message.kind](payload)`.
+    A handler that returns acks the message; one that raises gets it retried
+    with jittered backoff. Messages of unknown kinds are dead-lettered.
+    """
+
+    def __init__(self, queue: WorkQueue, handlers: dict[str, Callable[[Any], Any]], workers: int = 2,
+                 poll_interval: float = 1.0, retry_policy: RetryPolicy | None = None):
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retry_policy = retry_policy or RetryPolicy(base_delay=5.0, max_delay=300.0)
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self):
+        self._stop.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"queue-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self):
+        last_purge = 0.0
+        while not self._stop.is_set():
+            try:
+                message = self.queue.claim()
+            except Exception as e:
+                log_error(f"Work queue claim failed: {e}", extra={"path": self.queue.path})
+                message = None
+            if message is None:
+                if time.monotonic() - last_purge > 600:
+                    last_purge = time.monotonic()
+                    try:
+                        self.queue.purge_done()
+                    except Exception as e:
+                        # e.g. "database is locked"; the purge runs again on the next interval
+                        log_error(f"Work queue purge failed: {e}", extra={"path": self.queue.path})
+                self._stop.wait(self.poll_interval)
+                continue
+            self.process(message)
+
+    def process(self, message: QueueMessage):
+        handler = self.handlers.get(message.kind)
+        if handler is None:
+            self.queue.nack(message, f"No handler for message kind '{message.kind}'", dead_letter=True)
+            return
+        # Everything the handler logs or times is tagged with the delivery
+        with correlation(f"queue-{message.id}-{message.attempts}"):
+            delivery = _delivery.set((message.attempts, self.queue.max_attempts))
+            try:
+                handler(message.payload)
+            except Exception as e:
+                self.queue.nack(message, f"{type(e).__name__}: {e}", delay=self.retry_policy.backoff(message.attempts - 1))
+                log_error(
+                    f"Work queue message {message.id} ({message.kind}) failed on attempt {message.attempts}: {e}",
+                    extra={"message_id": message.id, "attempts": message.attempts, "traceback": traceback.format_exc()},
+                    alert=message.attempts >= self.queue.max_attempts,
+                )
+                return
+            finally:
+                _delivery.reset(delivery)
+        if not self.queue.ack(message):
+            print(f"[WorkQueue] Message {message.id} was redelivered before it finished (visibility timeout too short?)")
+
+
+_queue: WorkQueue | None = None
+_queue_lock = threading.Lock()
+
+
+def get_work_queue() -> WorkQueue:
+    """
+    Returns the process-wide work queue, configured from env vars:
+    WORK_QUEUE_PATH, WORK_QUEUE_VISIBILITY_TIMEOUT and WORK_QUEUE_MAX_ATTEMPTS.
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = WorkQueue(
+                    os.environ.get("WORK_QUEUE_PATH", ".cache/work_queue.sqlite3"),
+                    visibility_timeout=float(os.environ.get("WORK_QUEUE_VISIBILITY_TIMEOUT", "900")),
+                    max_attempts=int(os.environ.get("WORK_QUEUE_MAX_ATTEMPTS", "5")),
+                )
+    return _queue